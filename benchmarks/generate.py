@@ -0,0 +1,162 @@
+"""Generate a synthetic drink setup for benchmarks
+
+Creates a drink repository with a configurable number of objects spread over
+kinds and targets, a bare base repository with remote branches for automerge,
+a fake home directory with some untracked files, and a drinkrc.
+
+Usage:
+
+    uv run python benchmarks/generate.py DIR [--objects N] [--targets N] ...
+"""
+
+import argparse
+import os
+import random
+import subprocess
+from pathlib import Path
+
+BY_TARGET = "by-target"
+MASTERBRANCH = "main"
+# The target the benchmark runs as
+LOCAL_TARGET = "target0"
+
+# Environment for git, so the benchmark does not depend on the user's setup
+GIT_ENV = {
+    "GIT_AUTHOR_NAME": "Bench",
+    "GIT_AUTHOR_EMAIL": "bench@example.com",
+    "GIT_COMMITTER_NAME": "Bench",
+    "GIT_COMMITTER_EMAIL": "bench@example.com",
+    "GIT_CONFIG_NOSYSTEM": "1",
+    "GIT_MERGE_AUTOEDIT": "no",
+}
+
+
+class Layout:
+    """Paths of a generated benchmark setup below root"""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.home = root / "home"
+        self.drinkdir = self.home / "git" / "drink"
+        self.base = root / "base.git"
+        self.drinkrc = self.home / ".drinkrc"
+
+
+def git(repo: Path, *args: str, **kwargs):
+    env = dict(os.environ, **GIT_ENV)
+    return subprocess.run(
+        ["git", "-C", str(repo), *args],
+        check=True,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        **kwargs,
+    )
+
+
+def object_paths(objects: int, targets: int, depth: int, rng: random.Random):
+    """Return repository paths for objects, roughly 10% bin, 10% zfunc and the
+    rest deep, partly dotified conf trees. A third of them are global."""
+    for i in range(objects):
+        r = rng.random()
+        if rng.random() < 0.33:
+            prefix = Path()
+        else:
+            prefix = Path(BY_TARGET) / f"target{rng.randrange(targets)}"
+        if r < 0.1:
+            yield Path("bin") / prefix / f"tool{i}"
+        elif r < 0.2:
+            yield Path("zfunc") / prefix / f"_func{i}"
+        else:
+            parts = [f"dot.app{i % 50}"]
+            for d in range(rng.randrange(depth)):
+                parts.append(f"sub{d}" if rng.random() < 0.7 else f"dot.sub{d}")
+            yield Path("conf") / prefix / Path(*parts) / f"file{i}"
+
+
+def generate(
+    root: Path,
+    objects: int = 10000,
+    targets: int = 200,
+    depth: int = 5,
+    remotes: int = 20,
+    untracked: int = 200,
+    seed: int = 1,
+) -> Layout:
+    rng = random.Random(seed)
+    lay = Layout(root)
+    for d in ["bin", ".zfunc"]:
+        (lay.home / d).mkdir(parents=True)
+    lay.drinkdir.mkdir(parents=True)
+    # Make sure every target exists at least once
+    paths = [Path("bin") / BY_TARGET / f"target{t}" / "hostinfo" for t in range(targets)]
+    paths += object_paths(objects - len(paths), targets, depth, rng)
+    for p in paths:
+        f = lay.drinkdir / p
+        f.parent.mkdir(parents=True, exist_ok=True)
+        f.write_text(f"# {p}\n" * rng.randrange(1, 40))
+    git(lay.drinkdir, "init", "-q", "-b", MASTERBRANCH)
+    git(lay.drinkdir, "add", "-A")
+    git(lay.drinkdir, "commit", "-q", "-m", "generated")
+
+    # Remote branches for automerge: half of them have nothing new
+    subprocess.run(["git", "init", "-q", "--bare", str(lay.base)], check=True)
+    git(lay.drinkdir, "remote", "add", "base", str(lay.base))
+    git(
+        lay.drinkdir,
+        "config",
+        "remote.base.fetch",
+        f"+refs/remotes/*/{MASTERBRANCH}:refs/remotes/*/{MASTERBRANCH}",
+    )
+    for r in range(1, remotes + 1):
+        branch = f"target{r}"
+        git(lay.drinkdir, "checkout", "-q", "-b", branch, MASTERBRANCH)
+        if r % 2:
+            p = lay.drinkdir / "bin" / BY_TARGET / branch / "hostinfo"
+            p.write_text(f"changed on {branch}\n")
+            git(lay.drinkdir, "commit", "-q", "-a", "-m", f"change on {branch}")
+        git(lay.drinkdir, "push", "-q", "base", f"{branch}:refs/remotes/{branch}/main")
+        git(lay.drinkdir, "checkout", "-q", MASTERBRANCH)
+        git(lay.drinkdir, "branch", "-q", "-D", branch)
+
+    for i in range(untracked):
+        d = lay.home / rng.choice(["bin", ".zfunc", "."])
+        name = f".untracked{i}" if d == lay.home else f"untracked{i}"
+        (d / name).write_text("untracked\n")
+
+    lay.drinkrc.write_text(
+        f"TARGET={LOCAL_TARGET}\n"
+        f"DRINKDIR={lay.drinkdir}\n"
+        "DRINKBASE=base\n"
+        f"MASTERBRANCH={MASTERBRANCH}\n"
+    )
+    return lay
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--objects", type=int, default=10000)
+    parser.add_argument("--targets", type=int, default=200)
+    parser.add_argument("--depth", type=int, default=5, help="max conf tree depth")
+    parser.add_argument("--remotes", type=int, default=20)
+    parser.add_argument("--untracked", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("dir", type=Path)
+    add_arguments(parser)
+    args = parser.parse_args()
+    lay = generate(
+        args.dir,
+        args.objects,
+        args.targets,
+        args.depth,
+        args.remotes,
+        args.untracked,
+        args.seed,
+    )
+    print(f"HOME={lay.home}")
+
+
+if __name__ == "__main__":
+    main()
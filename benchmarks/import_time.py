@@ -0,0 +1,71 @@
+"""Import time regression benchmark
+
+Measures how long it takes to import pydrink.drink, on top of the bare
+interpreter startup, and checks that none of the expensive modules that are
+only needed for help, readme, the git menu or coloured output get imported.
+
+Usage:
+
+    uv run python benchmarks/import_time.py [--runs N] [--max-ms MS]
+
+Exits with 1 if the import is slower than allowed or if a heavy module is
+loaded at import time.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+# Modules that must not be loaded just by importing pydrink.drink
+HEAVY_MODULES = ["rich", "rich_argparse", "importlib.metadata", "inspect"]
+
+
+def timed_run(code: str) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=SRC)
+    return time.perf_counter() - start
+
+
+def median_ms(code: str, runs: int) -> float:
+    return statistics.median(timed_run(code) for _ in range(runs)) * 1000
+
+
+def heavy_modules_loaded() -> list[str]:
+    code = (
+        "import sys, pydrink.drink;"
+        f"print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], check=True, cwd=SRC, capture_output=True
+    )
+    return out.stdout.decode().split()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=15)
+    parser.add_argument("--max-ms", type=float, default=60.0)
+    args = parser.parse_args()
+
+    base = median_ms("pass", args.runs)
+    full = median_ms("import pydrink.drink", args.runs)
+    cost = full - base
+    print(f"interpreter: {base:6.1f} ms")
+    print(f"pydrink:     {full:6.1f} ms (+{cost:.1f} ms)")
+    ret = 0
+    if loaded := heavy_modules_loaded():
+        print(f"REGRESSION: loaded at import time: {', '.join(loaded)}")
+        ret = 1
+    if cost > args.max_ms:
+        print(f"REGRESSION: import takes longer than {args.max_ms} ms")
+        ret = 1
+    return ret
+
+
+if __name__ == "__main__":
+    sys.exit(main())
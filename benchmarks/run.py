@@ -0,0 +1,205 @@
+"""Benchmark suite for pydrink
+
+Generates a synthetic drink setup (see generate.py) and times the main code
+paths on it, with empty drink caches ("cold") and again after a first run
+("warm"). Results are written as JSON. With --compare, the results are
+checked against a stored baseline and regressions are reported.
+
+Usage:
+
+    uv run python benchmarks/run.py [--objects N ...] [--output FILE]
+    uv run python benchmarks/run.py --compare benchmarks/baseline.json
+
+Exits with 1 if a regression was found.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from generate import GIT_ENV, Layout, add_arguments, generate  # noqa: E402
+
+
+@contextmanager
+def silenced():
+    """Redirect stdout and stderr, including those of child processes"""
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved = os.dup(1), os.dup(2)
+    with open(os.devnull, "w") as devnull:
+        os.dup2(devnull.fileno(), 1)
+        os.dup2(devnull.fileno(), 2)
+        try:
+            yield
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(saved[0], 1)
+            os.dup2(saved[1], 2)
+            os.close(saved[0])
+            os.close(saved[1])
+
+
+def timed(fn: Callable, repeat: int = 1) -> float:
+    """Return the median run time of fn in seconds"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with silenced():
+            fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def run_suite(lay: Layout, repeat: int) -> dict[str, float]:
+    os.environ["HOME"] = str(lay.home)
+    os.environ["XDG_CACHE_HOME"] = str(lay.root / "cache")
+    os.environ["XDG_STATE_HOME"] = str(lay.root / "state")
+    os.environ.update(GIT_ENV)
+
+    # Imported late, so nothing is evaluated before HOME is set
+    import pydrink.log
+    from pydrink import git
+    from pydrink.cache import LINK_STATE, StateCache
+    from pydrink.config import Config
+    from pydrink.drink import link_all, link_and_prune, prune, show_untracked_files
+    from pydrink.ledger import Ledger
+    from pydrink.obj import DrinkObject
+
+    pydrink.log.QUIET = True
+    c = Config(lay.drinkrc)
+    r: dict[str, float] = {}
+
+    r["inventory"] = timed(lambda: git.get_inventory(c), repeat)
+    r["link_all.cold"] = timed(lambda: link_all(c))
+    r["link_all.warm"] = timed(lambda: link_all(c), repeat)
+    inv = git.get_inventory(c)
+    r["prune.cold"] = timed(lambda: prune(c, inv, Ledger(c)))
+    ledger = Ledger(c)
+    ledger.rebuild(inv, "")
+    r["prune.warm"] = timed(lambda: prune(c, inv, ledger), repeat)
+
+    def clear_caches():
+        StateCache(LINK_STATE).clear()
+        Ledger(c).save()
+
+    clear_caches()
+    r["link_and_prune.cold"] = timed(lambda: link_and_prune(c))
+    r["link_and_prune.warm"] = timed(lambda: link_and_prune(c), repeat)
+
+    r["show_untracked_files"] = timed(lambda: show_untracked_files(c), repeat)
+
+    r["get_changed_files.clean"] = timed(lambda: git.get_changed_files(c), repeat)
+    changed = [o.p for o in inv][::100]
+    for p in changed:
+        with open(p, "a") as f:
+            f.write("changed\n")
+    r["get_changed_files.dirty"] = timed(lambda: git.get_changed_files(c), repeat)
+    subprocess.run(["git", "-C", str(c.drinkdir), "checkout", "-q", "--", "."])
+
+    def import_untracked():
+        for f in (lay.home / "bin").glob("untracked*"):
+            DrinkObject.import_object(c, Path(f.name), "bin", "global")
+
+    r["import_object"] = timed(import_untracked)
+    subprocess.run(["git", "-C", str(c.drinkdir), "clean", "-q", "-f", "--", "bin"])
+
+    r["automerge.cold"] = timed(lambda: git.automerge(c))
+    r["automerge.warm"] = timed(lambda: git.automerge(c))
+    return r
+
+
+def compare(
+    results: dict, baseline: dict, threshold: float, min_delta: float
+) -> list[str]:
+    """Return the names of all results that are slower than the baseline by
+    more than threshold (relative) and min_delta seconds (absolute)"""
+    regressions = []
+    for name, t in results.items():
+        if (base := baseline.get(name)) is None:
+            continue
+        ratio = t / base if base else 1.0
+        mark = ""
+        if ratio > 1 + threshold and t - base > min_delta:
+            mark = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<26} {base * 1000:9.1f} ms -> {t * 1000:9.1f} ms{mark}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    parser.add_argument("--repeat", type=int, default=5, help="runs of warm cases")
+    parser.add_argument("--output", type=Path, help="write results as JSON")
+    parser.add_argument("--compare", type=Path, help="baseline results JSON")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="relative slowdown that counts as regression",
+    )
+    parser.add_argument(
+        "--min-ms",
+        type=float,
+        default=1.0,
+        help="ignore slowdowns smaller than this",
+    )
+    args = parser.parse_args()
+
+    root = Path(tempfile.mkdtemp(prefix="drink-bench-"))
+    try:
+        start = time.perf_counter()
+        lay = generate(
+            root,
+            args.objects,
+            args.targets,
+            args.depth,
+            args.remotes,
+            args.untracked,
+            args.seed,
+        )
+        print(f"generated setup in {time.perf_counter() - start:.1f} s")
+        results = run_suite(lay, args.repeat)
+    finally:
+        shutil.rmtree(root)
+
+    report = {
+        "meta": {
+            "objects": args.objects,
+            "targets": args.targets,
+            "depth": args.depth,
+            "remotes": args.remotes,
+            "python": platform.python_version(),
+        },
+        "results": results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        if baseline["meta"] != report["meta"]:
+            print("WARNING: baseline was recorded with different parameters")
+        min_delta = args.min_ms / 1000
+        if compare(results, baseline["results"], args.threshold, min_delta):
+            return 1
+    else:
+        for name, t in results.items():
+            print(f"{name:<26} {t * 1000:9.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any, Optional
+import hashlib
+import json
+import os
+
+from pydrink.config import Config, KINDS
+from pydrink.log import debug, warn
+from pydrink.refs import git_dir, read_head
+
+CACHE_DIRNAME = "pydrink"
+# Cache file names
+LINK_STATE = "link-state.json"
+PROMPT_INDEX = "prompt-index.json"
+LEDGER = "ledger.json"
+COMPARE = "compare.json"
+CONFIG = "config.json"
+COMPLETE = "complete.json"
+
+
+def cache_dir() -> Path:
+    """Return the directory where drink keeps its caches"""
+    if xdgch := os.getenv("XDG_CACHE_HOME"):
+        return Path(xdgch) / CACHE_DIRNAME
+    return Path.home() / ".cache" / CACHE_DIRNAME
+
+
+def state_dir() -> Path:
+    """Return the directory where drink keeps state that is more than a cache,
+    but can still be rebuilt if it gets lost"""
+    if xdgsh := os.getenv("XDG_STATE_HOME"):
+        return Path(xdgsh) / CACHE_DIRNAME
+    return Path.home() / ".local" / "state" / CACHE_DIRNAME
+
+
+def stat_key(p: Path) -> Optional[list[int]]:
+    """Return what identifies the current version of a file for caching
+    purposes, or None if it does not exist"""
+    try:
+        st = p.stat()
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _checksum(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class StateCache:
+    """A small JSON file that persists state between drink runs
+
+    The first line of the file holds a checksum of the rest, so a truncated or
+    otherwise damaged file is detected and treated like a missing one.
+    """
+
+    def __init__(self, name: str, directory: Optional[Path] = None):
+        self.path = (directory or cache_dir()) / name
+
+    def load(self) -> Optional[Any]:
+        """Return the cached data, or None if there is no usable cache"""
+        try:
+            with open(self.path) as f:
+                checksum = f.readline().rstrip("\n")
+                text = f.read()
+            if checksum != _checksum(text):
+                raise ValueError("checksum mismatch")
+            return json.loads(text)
+        except FileNotFoundError:
+            debug(f"no cache in {self.path}")
+        except (OSError, ValueError) as e:
+            warn(f"Ignoring corrupt cache {self.path}: {e}")
+        return None
+
+    def save(self, data: Any):
+        """Write data to the cache. Errors are not fatal, they only cost the
+        benefit of the cache."""
+        tmp = self.path.with_suffix(".tmp")
+        text = json.dumps(data)
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp, "w") as f:
+                f.write(_checksum(text) + "\n" + text)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            warn(f"Could not write cache {self.path}: {e}")
+
+    def clear(self):
+        self.path.unlink(missing_ok=True)
+
+
+def link_fingerprint(c: Config, link_dirs: Iterable[Path] = ()) -> dict[str, Any]:
+    """Return everything that can change the outcome of "drink -l"
+
+    Links below the kind directories, e. g. in ~/.config/app, are only noticed
+    through their own directories, which have to be given as link_dirs.
+    Computing this needs only stat calls, no git process.
+    """
+    gitdir = git_dir(c.drinkdir)
+    return {
+        "drinkdir": str(c.drinkdir),
+        "target": c.target,
+        "head": read_head(c.drinkdir),
+        "index": stat_key(gitdir / "index"),
+        "config": dict(c.config),
+        "kinddirs": {k: stat_key(c.kindDir(k)) for k in KINDS},
+        "linkdirs": {str(d): stat_key(d) for d in sorted(set(link_dirs))},
+    }
@@ -0,0 +1,45 @@
+from pathlib import Path
+from typing import Any, Optional
+import hashlib
+import json
+import os
+import socket
+
+from pydrink.cache import state_dir
+from pydrink.config import Config
+from pydrink.log import debug
+
+# How long a client waits for the daemon before doing the work itself
+CLIENT_TIMEOUT = 0.5
+# Largest response a client accepts
+MAX_RESPONSE = 1 << 24
+
+
+def socket_path(c: Config) -> Path:
+    """Return the path of the socket the daemon for this DRINKDIR listens on"""
+    if rundir := os.getenv("XDG_RUNTIME_DIR"):
+        base = Path(rundir) / "pydrink"
+    else:
+        base = state_dir()
+    digest = hashlib.sha1(str(c.drinkdir).encode()).hexdigest()[:12]
+    return base / f"drink-{digest}.sock"
+
+
+def query(c: Config, name: str, **args: Any) -> Optional[Any]:
+    """Ask a running drink daemon, see pydrink.daemon. Return None if there is
+    no daemon or it could not answer, so the caller can do the work itself."""
+    request = json.dumps(dict(args, query=name)).encode() + b"\n"
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.settimeout(CLIENT_TIMEOUT)
+            s.connect(str(socket_path(c)))
+            s.sendall(request)
+            with s.makefile("rb") as f:
+                response = json.loads(f.readline(MAX_RESPONSE))
+    except (OSError, ValueError) as e:
+        debug("no answer from daemon: %s", e)
+        return None
+    if not response.get("ok"):
+        debug("daemon could not answer %s: %s", name, response.get("error"))
+        return None
+    return response["result"]
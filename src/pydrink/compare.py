@@ -0,0 +1,113 @@
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Optional
+import mmap
+import os
+
+from pydrink.cache import COMPARE, StateCache
+from pydrink.config import Config
+from pydrink.gitindex import IndexEntry, blob_id, is_modified
+from pydrink.log import debug
+from pydrink.prompt import cached_index
+
+# Number of threads that compare files in parallel
+COMPARE_WORKERS = 8
+# Files at least this large are compared memory-mapped, chunk by chunk
+MMAP_THRESHOLD = 1 << 20
+MMAP_CHUNK = 1 << 20
+# Number of results kept in the cache between runs
+CACHE_ENTRIES = 20000
+
+
+def _stat_id(st: os.stat_result) -> str:
+    return f"{st.st_ino}:{st.st_mtime_ns}:{st.st_size}"
+
+
+def same_bytes(a: Path, b: Path, size: int) -> bool:
+    """Compare two files of the given size byte by byte"""
+    with open(a, "rb") as fa, open(b, "rb") as fb:
+        if size < MMAP_THRESHOLD:
+            return fa.read() == fb.read()
+        ma = mmap.mmap(fa.fileno(), 0, access=mmap.ACCESS_READ)
+        mb = mmap.mmap(fb.fileno(), 0, access=mmap.ACCESS_READ)
+        with ma, mb:
+            for pos in range(0, size, MMAP_CHUNK):
+                end = pos + MMAP_CHUNK
+                if ma[pos:end] != mb[pos:end]:
+                    return False
+    return True
+
+
+class ContentComparer:
+    """Tells whether files in $HOME have the same content as drink objects
+
+    Files of different size are rejected right away. If the object is
+    unchanged in the worktree, the blob id from the index stands for its
+    content, so only the file in $HOME has to be read and hashed. Otherwise
+    both files are compared directly, large ones memory-mapped.
+
+    Results are cached by inode, mtime and size of both files, in memory and
+    between runs.
+    """
+
+    def __init__(self, c: Config):
+        self.config = c
+        self._cache = StateCache(COMPARE)
+        self._results: dict[str, bool] = self._cache.load() or {}
+        self._index: Optional[dict[str, IndexEntry]] = None
+        self._index_mtime: Optional[int] = None
+
+    def _load_index(self) -> dict[str, IndexEntry]:
+        if self._index is None:
+            entries, self._index_mtime = cached_index(self.config)
+            self._index = {
+                e.name: e for e in entries if not e.stage and not e.ignore
+            }
+        return self._index
+
+    def _index_entry(self, repopath: Path) -> Optional[IndexEntry]:
+        """Return the index entry of repopath, if the worktree file is known to
+        match it"""
+        name = str(repopath.relative_to(self.config.drinkdir))
+        e = self._load_index().get(name)
+        if e is None or is_modified(self.config.drinkdir, e, self._index_mtime):
+            return None
+        return e
+
+    def same(self, path: Path, repopath: Path) -> bool:
+        """Tell if the file at path has the same content as the object at
+        repopath"""
+        try:
+            st, st_repo = os.stat(path), os.stat(repopath)
+        except OSError:
+            return False
+        if st.st_size != st_repo.st_size:
+            return False
+        key = f"{_stat_id(st)}|{_stat_id(st_repo)}"
+        if (result := self._results.get(key)) is not None:
+            return result
+        if (e := self._index_entry(repopath)) is not None:
+            debug("comparing %s to blob %s", path, e.oid)
+            result = blob_id(path) == e.oid
+        else:
+            debug("comparing %s to %s", path, repopath)
+            result = same_bytes(path, repopath, st.st_size)
+        self._results[key] = result
+        return result
+
+    def compare_all(
+        self, pairs: Iterable[tuple[Path, Path]], workers: int = COMPARE_WORKERS
+    ) -> list[bool]:
+        """Compare many (path, repopath) in parallel. Later calls of same() for
+        them are answered from memory."""
+        # Read the index before the threads need it
+        self._load_index()
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(lambda p: self.same(*p), pairs))
+
+    def save(self):
+        """Keep the results for the next run"""
+        results = list(self._results.items())[-CACHE_ENTRIES:]
+        self._cache.save(dict(results))
@@ -0,0 +1,71 @@
+from typing import Any
+import os
+import sys
+
+from pydrink.cache import COMPLETE, StateCache, stat_key
+from pydrink.config import Config, KINDS, config_files
+from pydrink.obj import GLOBAL_TARGET
+
+# Everything in here runs on every TAB in the shell, so it must not import
+# rich or set up argparse, and should not crawl the drink repository.
+
+CONTEXTS = ("kinds", "targets", "variables", "importable")
+
+
+def completion_key(c: Config) -> Any:
+    """Return what the completions depend on. New targets show up as changed
+    mtimes of the by-target directories. The values of all variables are
+    included, as they can also come from the environment."""
+    return [
+        [[str(f), stat_key(f)] for f in c.files],
+        [stat_key(d) for d in c.by_target_roots.values()],
+        str(c.home),
+        dict(c.config),
+    ]
+
+
+def completion_data(c: Config) -> dict[str, Any]:
+    targets = {GLOBAL_TARGET}
+    for d in c.by_target_roots.values():
+        try:
+            targets.update(e.name for e in os.scandir(d) if e.is_dir())
+        except OSError:
+            pass
+    return {
+        "kinds": list(KINDS),
+        "targets": sorted(targets),
+        "variables": sorted(c.config),
+        "importable": {k: str(c.kindDir(k)) for k in KINDS},
+    }
+
+
+def completions(c: Config, context: str, arg: str = "") -> list[str]:
+    """Return the completions for context. For "importable", that is the
+    directory files of kind arg are imported from."""
+    if context not in CONTEXTS:
+        raise ValueError(f"no completions for {context}")
+    cache = StateCache(COMPLETE)
+    key = completion_key(c)
+    cached = cache.load()
+    if cached and cached["key"] == key:
+        data = cached["data"]
+    else:
+        data = completion_data(c)
+        cache.save({"key": key, "data": data})
+    if context == "importable":
+        return [data["importable"].get(arg, str(c.home))]
+    return data[context]
+
+
+def complete_main(args: list[str]) -> int:
+    """drink --complete CONTEXT [ARG]"""
+    if not args or not (files := config_files()):
+        return 2
+    try:
+        c = Config.load(files)
+        result = completions(c, args[0], *args[1:2])
+    except Exception:
+        return 1
+    if result:
+        sys.stdout.write("\n".join(result) + "\n")
+    return 0
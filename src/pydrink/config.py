@@ -1,9 +1,10 @@
 import os
+from collections.abc import Iterable, Mapping
+from enum import Enum
 from pathlib import Path
 from pydrink.log import debug, err, notice
-from typing import Any
-from configparser import ConfigParser
-import platform
+from types import MappingProxyType
+from typing import Any, Optional
 
 CONFIG_FILENAME = "drinkrc"
 
@@ -23,6 +24,11 @@ VARNAMES = {
     "BINDIR": "bin",
     "ZFUNCDIR": ".zfunc",
     "CONFDIR": ".",
+    # "yes" links whole directories that belong to a single target, see
+    # pydrink.fold
+    "FOLD": "no",
+    # How objects are deployed, see parse_deploy()
+    "DEPLOY": "symlink",
     # used by _drink completion
     "SUPPORTED_KINDS": f"'{' '.join(sorted(KINDS.keys()))}'",
 }
@@ -31,20 +37,137 @@ VARNAMES = {
 BY_TARGET = "by-target"
 
 
+class Deploy(Enum):
+    """How an object is put into its link directory"""
+
+    Symlink = "symlink"
+    Hardlink = "hardlink"
+    Copy = "copy"
+
+
+# Configuration file shared by all users, overridden by the user's own
+SYSTEM_CONFIG = Path("/etc") / CONFIG_FILENAME
+
+
+def env_name(var: str) -> str:
+    """Return the environment variable that overrides the configuration
+    variable var, e. g. DRINKDIR or DRINK_TARGET"""
+    return var if var.startswith("DRINK") else f"DRINK_{var}"
+
+
+def config_files() -> list[Path]:
+    """Return all existing configuration files, in the order they are applied.
+    Later files override earlier ones."""
+    candidates = [
+        SYSTEM_CONFIG,
+        Path.home() / ("." + CONFIG_FILENAME),
+        Path.home() / ".config" / CONFIG_FILENAME,
+    ]
+    if xdgch := os.getenv("XDG_CONFIG_HOME"):
+        candidates.append(Path(xdgch) / CONFIG_FILENAME)
+    files: list[Path] = []
+    for f in candidates:
+        if f.exists() and f not in files:
+            files.append(f)
+    return files
+
+
+def parse_files(files: Iterable[Path]) -> dict[str, str]:
+    """Return the variables set in drinkrc files, later files overriding
+    earlier ones"""
+    from configparser import ConfigParser
+
+    values = {}
+    for f in files:
+        debug(f"Reading configuration from {f}")
+        ini = ConfigParser()
+        with open(f) as cf:
+            # Unfortunately the python ini parser wants a section header
+            # although it is not strictly necessary for ini files. We need to
+            # add the section header to make configparser happy.
+            ini.read_string("[drink]\n" + cf.read())
+        for v in VARNAMES:
+            if v in ini["drink"]:
+                # For backwards compatibility allow values to be in double
+                # quotes. (This used to be shell syntax)
+                values[v] = ini["drink"][v].strip('"')
+    return values
+
+
+def parse_deploy(
+    spec: str,
+) -> tuple[Deploy, dict[str, Deploy], list[tuple[str, Deploy]]]:
+    """Parse the value of DEPLOY into the default strategy, the strategies per
+    kind and per object
+
+    DEPLOY is a whitespace separated list of strategies: symlink, hardlink or
+    copy. Without a prefix, a strategy is the default. With a prefix and "=",
+    it applies to a kind, e. g. "zfunc=copy", or to the objects whose path
+    relative to DRINKDIR matches a pattern, e. g. "conf/dot.zshrc=hardlink".
+    Patterns match from the right, like pathlib.PurePath.match(). Objects
+    take the last pattern they match, then the strategy of their kind.
+    """
+    default = Deploy.Symlink
+    kinds: dict[str, Deploy] = {}
+    patterns: list[tuple[str, Deploy]] = []
+    for entry in spec.split():
+        what, _, how = entry.rpartition("=")
+        try:
+            strategy = Deploy(how)
+        except ValueError:
+            raise ValueError(f"DEPLOY: unknown strategy {how}") from None
+        if not what:
+            default = strategy
+        elif what in KINDS:
+            kinds[what] = strategy
+        else:
+            patterns.append((what, strategy))
+    return default, kinds, patterns
+
+
 class Config:
     """The Config class holds the drink configuration and can update its
-    default values from a configuration file in drinkrc format.
+    default values from configuration files in drinkrc format.
+
+    A Config is an immutable snapshot: everything derived from the variables,
+    like DRINKDIR, the kind directories and the home directory, is resolved
+    once when it is created.
 
-    This configuration file is in shell format and is sourced several times.
+    Values come from, in increasing precedence: the defaults, the given
+    configuration files and environment variables (see env_name()).
     """
 
-    def __init__(self, f: Path):
+    __slots__ = (
+        "configFileName",
+        "files",
+        "config",
+        "home",
+        "drinkdir",
+        "target",
+        "_values",
+        "_kind_dirs",
+        "_kind_dirs_rel",
+        "by_target_roots",
+        "_deploy",
+        "_frozen",
+    )
+
+    def __init__(
+        self,
+        *files: Path,
+        values: Optional[Mapping[str, str]] = None,
+        env: Mapping[str, str] = os.environ,
+    ):
         """Initialize Config
 
         Parameters
         ----------
-        f: str
-            Filename to load. Must be a string with the full path.
+        files: pathlib.Path
+            Configuration files to load, later ones overriding earlier ones.
+        values: dict
+            The already parsed contents of files, if known.
+        env: dict
+            The environment to take overrides from.
 
         Returns
         -------
@@ -55,54 +178,77 @@ class Config:
         >>> c = Config(pathlib.Path.home() / '.drinkrc')
         >>> val = c['TARGET']
         """
-        self.configFileName = f
-        self.config = VARNAMES
-        # Override the defaults from config file
-        debug(f"Reading configuration from {f}")
-        self.sourceConfigFile(f)
-
-    def sourceConfigFile(self, f: Path):
-        """Read a drink configuration file and populate the config object"""
-        ini = ConfigParser()
-        with open(f) as cf:
-            # Unfortunately the python ini parser wants a section header
-            # although it is not strictly necessary for ini files. We need to
-            # add the section header to make configparser happy.
-            ini.read_string("[drink]\n" + cf.read())
+        self.files = files
+        self.configFileName = files[-1] if files else None
+        if values is None:
+            values = parse_files(files)
+        config = dict(VARNAMES, **values)
         for v in VARNAMES:
-            try:
-                # For backwards compatibility allow values to be in double
-                # quotes. (This used to be shell syntax)
-                self.config[v] = ini["drink"][v].strip('"')
-            except KeyError:
-                debug(f"using default value for {v}")
+            if (override := env.get(env_name(v))) is not None:
+                debug(f"{v} overridden by environment")
+                config[v] = override
+        self.config = MappingProxyType(config)
+        self.home = Path.home()
+        self.drinkdir = self.home / config["DRINKDIR"]
+        self.target = config["TARGET"]
+        self._values: dict[str, Any] = dict(config, DRINKDIR=self.drinkdir)
+        self._kind_dirs_rel = {k: Path(config[v]) for k, v in KINDS.items()}
+        self._kind_dirs = {k: self.home / d for k, d in self._kind_dirs_rel.items()}
+        self.by_target_roots = {k: self.drinkdir / k / BY_TARGET for k in KINDS}
+        self._deploy = parse_deploy(config["DEPLOY"])
+        self._frozen = True
+
+    def __setattr__(self, name: str, value: Any):
+        if getattr(self, "_frozen", False):
+            raise AttributeError("Config is immutable")
+        super().__setattr__(name, value)
+
+    @classmethod
+    def load(cls, files: list[Path]) -> "Config":
+        """Return the configuration from files, reusing the result of the last
+        run if none of them has changed"""
+        from pydrink.cache import CONFIG, StateCache, stat_key
+
+        key = [[str(f), stat_key(f)] for f in files]
+        state = StateCache(CONFIG)
+        cached = state.load()
+        if cached and cached["key"] == key:
+            debug("using cached configuration")
+            return cls(*files, values=cached["values"])
+        values = parse_files(files)
+        state.save({"key": key, "values": values})
+        return cls(*files, values=values)
 
     def __getitem__(self, item: str) -> Any:
-        if item == "DRINKDIR":
-            if not Path(self.config[item]).is_absolute():
-                return Path.home() / self.config[item]
-            else:
-                return Path(self.config[item])
-        return self.config[item]
+        return self._values[item]
 
-    @property
-    def drinkdir(self) -> Path:
-        return self["DRINKDIR"]
+    def flag(self, var: str) -> bool:
+        """Return the value of a yes/no variable"""
+        return str(self._values[var]).lower() in ("1", "yes", "true", "on")
+
+    def deploy(self, kind: str, repopath: str) -> Deploy:
+        """Return how the object of kind at repopath, relative to DRINKDIR, is
+        deployed"""
+        default, kinds, patterns = self._deploy
+        if patterns:
+            p = Path(repopath)
+            for pattern, strategy in reversed(patterns):
+                if p.match(pattern):
+                    return strategy
+        return kinds.get(kind, default)
 
     def kindDir(self, kind: str, relative=False) -> Path:
         """Return the symlink directory for a given kind
         with relative=True return relative path (e. g. "bin").
         """
-        d = self.config[KINDS[kind]]
         if relative:
-            return Path(d)
-        return Path.home() / d
+            return self._kind_dirs_rel[kind]
+        return self._kind_dirs[kind]
 
     def managedTargets(self):
         # All possible values of target as of now
-        dd = Path(self["DRINKDIR"])
         target_glob = "*/" + BY_TARGET + "/*"
-        mt = set([x.name for x in dd.glob(target_glob)])
+        mt = set([x.name for x in self.drinkdir.glob(target_glob)])
         debug(mt)
         return mt
 
@@ -111,6 +257,8 @@ class Config:
 
     @classmethod
     def create_drinkrc(cls) -> int:
+        import platform
+
         if xdgch := os.getenv("XDG_CONFIG_HOME"):
             new_drinkrc = Path(xdgch) / CONFIG_FILENAME
         else:
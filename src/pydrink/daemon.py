@@ -0,0 +1,363 @@
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Optional
+import ctypes
+import json
+import os
+import selectors
+import signal
+import socket
+import struct
+
+from pydrink import git
+from pydrink.cache import link_fingerprint
+from pydrink.client import query, socket_path
+from pydrink.config import Config, KINDS
+from pydrink.gitbackend import backend
+from pydrink.gitindex import changed_files
+from pydrink.inventory import Inventory
+from pydrink.log import debug, err, notice, warn
+from pydrink.obj import DrinkObject, ObjectState
+from pydrink.prompt import cached_index, format_prompt_info
+from pydrink.refs import git_dir, resolve_ref
+
+# inotify event bits, see inotify(7)
+IN_MODIFY = 0x2
+IN_ATTRIB = 0x4
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ONLYDIR = 0x1000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = (
+    IN_MODIFY
+    | IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+    | IN_ONLYDIR
+)
+# wd, mask, cookie, length of the name that follows
+EVENT = struct.Struct("iIII")
+# Files in the git directory whose change invalidates everything
+GIT_STATE_FILES = {"index", "HEAD", "packed-refs", "MERGE_HEAD"}
+# Seconds between checks whether the daemon should stop
+SELECT_TIMEOUT = 1.0
+
+
+class Inotify:
+    """Minimal binding of the Linux inotify API through ctypes"""
+
+    def __init__(self):
+        libc = ctypes.CDLL(None, use_errno=True)
+        # Raises AttributeError where there is no inotify
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+    def add_watch(self, path: Path, mask: int = WATCH_MASK) -> int:
+        wd = self._add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), str(path))
+        return wd
+
+    def read(self) -> list[tuple[int, int, str]]:
+        """Return all pending events as (wd, mask, name)"""
+        try:
+            data = os.read(self.fd, 1 << 16)
+        except BlockingIOError:
+            return []
+        events = []
+        pos = 0
+        while pos < len(data):
+            wd, mask, _, length = EVENT.unpack_from(data, pos)
+            pos += EVENT.size
+            end = pos + length
+            events.append((wd, mask, os.fsdecode(data[pos:end].rstrip(b"\0"))))
+            pos = end
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class DaemonState:
+    """Everything the daemon keeps in memory
+
+    Every part is computed when it is asked for, and kept until a change
+    invalidates it. Link states are refreshed per link directory.
+    """
+
+    def __init__(self, c: Config):
+        self.config = c
+        self._inv: Optional[Inventory] = None
+        self._by_dir: dict[Path, list[DrinkObject]] = {}
+        self._changed: Optional[list[str]] = None
+        self._branches: Optional[list[str]] = None
+        self._prompt: Optional[tuple[str, int]] = None
+        self._stale_dirs: set[Path] = set()
+
+    def invalidate_all(self):
+        self._inv = None
+        self.invalidate_worktree()
+        self.invalidate_refs()
+
+    def invalidate_worktree(self):
+        self._changed = None
+        self._prompt = None
+
+    def invalidate_refs(self):
+        self._branches = None
+        self._prompt = None
+
+    def invalidate_links(self, d: Path):
+        self._stale_dirs.add(d)
+
+    def inventory(self) -> Inventory:
+        if self._inv is None:
+            debug("daemon: reading inventory")
+            self._inv = git.get_inventory(self.config)
+            self._by_dir = defaultdict(list)
+            for o in self._inv:
+                self._by_dir[o.get_linkpath().parent].append(o)
+            self._stale_dirs.clear()
+        elif self._stale_dirs:
+            for d in self._stale_dirs:
+                debug("daemon: refreshing links in %s", d)
+                self._inv.forget(d)
+                for o in self._by_dir.get(d, []):
+                    o.state = o.detect_state(self._inv.is_linked(o))
+            self._stale_dirs.clear()
+        return self._inv
+
+    def link_dirs(self) -> set[Path]:
+        """Return the directories objects are linked into"""
+        self.inventory()
+        return set(self._by_dir)
+
+    def changed(self) -> list[str]:
+        if self._changed is None:
+            self._changed = git.get_changed_files(self.config)
+        return self._changed
+
+    def branches(self) -> list[str]:
+        if self._branches is None:
+            self._branches = git.get_branches(self.config)
+        return self._branches
+
+    def prompt(self) -> tuple[str, int]:
+        """Return the current head ref and the number of changed objects, as
+        used for the prompt info"""
+        if self._prompt is None:
+            c = self.config
+            ref = f"refs/heads/{c['MASTERBRANCH']}"
+            current = resolve_ref(git_dir(c.drinkdir), ref) or ""
+            entries, mtime = cached_index(c)
+            self._prompt = current, len(changed_files(c.drinkdir, entries, mtime))
+        return self._prompt
+
+
+class Daemon:
+    """Answers queries about a drink repository over a Unix socket
+
+    Requests and responses are single lines of JSON. A request names the
+    query and its arguments, e. g. {"query": "prompt-info", "headref": "..."}.
+    The response is {"ok": true, "result": ...} or {"ok": false, "error": ...}.
+
+    DRINKDIR, its git directory and all link directories are watched with
+    inotify, so answers are usually served from memory. Where inotify is not
+    available, cheap stat checks decide what to recompute.
+    """
+
+    def __init__(self, c: Config, path: Optional[Path] = None):
+        self.config = c
+        self.path = path or socket_path(c)
+        self.state = DaemonState(c)
+        self.running = False
+        self._inotify: Optional[Inotify] = None
+        self._watches: dict[int, tuple[Path, str]] = {}
+        self._watched: set[Path] = set()
+        self._fingerprint: Any = None
+        self.queries: dict[str, Callable[..., Any]] = {
+            "ping": lambda: "pong",
+            "changed": self.state.changed,
+            "edited": self.edited,
+            "branches": self.state.branches,
+            "pending": self.pending,
+            "prompt-info": self.prompt_info,
+        }
+
+    def pending(self) -> list[str]:
+        """Return the objects "drink -l" would link"""
+        inv = self.state.inventory()
+        return [str(o.p) for o in inv if o.state == ObjectState.ManagedPending]
+
+    def edited(self) -> list[str]:
+        """Return the copies that have been edited in place, like "drink -c"
+        shows them. Those are outside of what is watched, so they are looked
+        at every time."""
+        from pydrink.deploy import edited_copies
+        from pydrink.ledger import Ledger
+
+        return [str(link) for link, _ in edited_copies(Ledger.load(self.config))]
+
+    def prompt_info(self, headref: str = "") -> list[str]:
+        current, num_changed = self.state.prompt()
+        return [current, format_prompt_info(current, num_changed, headref)]
+
+    def _watch(self, d: Path, role: str):
+        if self._inotify is None or d in self._watched:
+            return
+        try:
+            wd = self._inotify.add_watch(d)
+        except OSError as e:
+            debug("cannot watch %s: %s", d, e)
+            return
+        self._watches[wd] = (d, role)
+        self._watched.add(d)
+
+    def _watch_tree(self, d: Path, role: str):
+        for root, dirs, _ in os.walk(d):
+            dirs[:] = [x for x in dirs if x != ".git"]
+            self._watch(Path(root), role)
+
+    def _watch_links(self):
+        for d in self.state.link_dirs() | {self.config.kindDir(k) for k in KINDS}:
+            self._watch(d, "links")
+
+    def _handle_events(self):
+        assert self._inotify is not None
+        for wd, mask, name in self._inotify.read():
+            if mask & IN_Q_OVERFLOW:
+                warn("inotify queue overflow, rereading everything")
+                self.state.invalidate_all()
+                continue
+            if (watch := self._watches.get(wd)) is None:
+                continue
+            d, role = watch
+            if mask & IN_IGNORED:
+                del self._watches[wd]
+                self._watched.discard(d)
+                continue
+            if role == "git":
+                if name in GIT_STATE_FILES:
+                    self.state.invalidate_all()
+            elif role == "refs":
+                self.state.invalidate_refs()
+            elif role == "worktree":
+                self.state.invalidate_worktree()
+            elif role == "links":
+                self.state.invalidate_links(d)
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                if role in ("refs", "worktree"):
+                    self._watch_tree(d / name, role)
+
+    def _poll(self):
+        """Without inotify, recompute what could have changed"""
+        fingerprint = link_fingerprint(self.config)
+        if fingerprint != self._fingerprint:
+            self.state.invalidate_all()
+            self._fingerprint = fingerprint
+        # Changes of files in the worktree leave no other trace
+        self.state.invalidate_worktree()
+
+    def answer(self, request: dict[str, Any]) -> dict[str, Any]:
+        if self._inotify is None:
+            self._poll()
+        name = request.pop("query", None)
+        if (fn := self.queries.get(name)) is None:
+            return {"ok": False, "error": f"unknown query {name}"}
+        try:
+            result = fn(**request)
+        except Exception as e:
+            return {"ok": False, "error": str(e)}
+        # The inventory might have been reread, with new link directories
+        self._watch_links()
+        return {"ok": True, "result": result}
+
+    def _handle_client(self, conn: socket.socket):
+        with conn:
+            conn.settimeout(SELECT_TIMEOUT)
+            try:
+                with conn.makefile("rb") as f:
+                    request = json.loads(f.readline())
+                debug("daemon: %s", request)
+                response = self.answer(request)
+                conn.sendall(json.dumps(response).encode() + b"\n")
+            except (OSError, ValueError, AttributeError) as e:
+                debug("daemon: bad request: %s", e)
+
+    def serve(self) -> int:
+        """Serve queries until stop() is called"""
+        if query(self.config, "ping") is not None:
+            err(f"A drink daemon is already listening on {self.path}")
+            return 1
+        try:
+            self._inotify = Inotify()
+        except (OSError, AttributeError) as e:
+            warn(f"inotify is not available ({e}), checking for changes on every query")
+        self.path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        self.path.unlink(missing_ok=True)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sel = selectors.DefaultSelector()
+        try:
+            server.bind(str(self.path))
+            os.chmod(self.path, 0o600)
+            server.listen()
+            server.setblocking(False)
+            sel.register(server, selectors.EVENT_READ, "client")
+            if self._inotify is not None:
+                sel.register(self._inotify.fd, selectors.EVENT_READ, "inotify")
+            gitdir = git_dir(self.config.drinkdir)
+            self._watch(gitdir, "git")
+            self._watch_tree(gitdir / "refs", "refs")
+            self._watch_tree(self.config.drinkdir, "worktree")
+            self._watch_links()
+            notice(f"drink daemon listening on {self.path}")
+            self.running = True
+            while self.running:
+                for key, _ in sel.select(timeout=SELECT_TIMEOUT):
+                    if key.data == "inotify":
+                        self._handle_events()
+                    else:
+                        conn, _ = server.accept()
+                        self._handle_client(conn)
+        finally:
+            sel.close()
+            server.close()
+            self.path.unlink(missing_ok=True)
+            if self._inotify is not None:
+                self._inotify.close()
+        return 0
+
+    def stop(self):
+        self.running = False
+
+
+def run_daemon(c: Config) -> int:
+    """Run a daemon in the foreground until it receives SIGTERM or SIGINT"""
+    # Results of git must never be reused based on the index alone, as the
+    # daemon runs for a long time.
+    backend(c).memoize = False
+    daemon = Daemon(c)
+
+    def stop(signum, frame):
+        daemon.stop()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    return daemon.serve()
@@ -0,0 +1,105 @@
+from collections.abc import Iterator
+from pathlib import Path
+import os
+
+from pydrink.cache import stat_key
+from pydrink.config import Deploy
+from pydrink.gitindex import blob_id
+from pydrink.inventory import Inventory
+from pydrink.ledger import Deployed, Ledger
+from pydrink.log import debug, err, verbose, warn
+from pydrink.obj import ObjectState
+from pydrink.plan import LinkPlan
+
+# With DEPLOY, objects can be copied or hardlinked into place instead of being
+# symlinked, e. g. where $HOME is on NFS and every symlink into DRINKDIR costs
+# another lookup whenever the file is read. Copies do not follow the
+# repository by themselves, so the ledger keeps the blob id of what was
+# deployed. "drink -l" then replaces only the copies whose object has changed,
+# and neither it nor pruning touches a copy that has been edited in place.
+
+
+def is_edited(link: Path, d: Deployed) -> bool:
+    """Tell if the file at link has been changed since it was deployed"""
+    if (st := stat_key(link)) is None or st == d.stat:
+        return False
+    return blob_id(link) != d.blob
+
+
+def is_current(ledger: Ledger, link: Path, d: Deployed, how: Deploy) -> bool:
+    """Tell if the copy or hardlink at link is still what deploying its object
+    as how would create. Outdated stat information in the ledger is updated,
+    so the files are not hashed again next time."""
+    if d.how != how:
+        return False
+    if how == Deploy.Hardlink:
+        try:
+            same = os.path.samefile(link, d.repopath)
+        except OSError:
+            return False
+        # Edits through the hardlink went into the object as well
+        if same and (st := stat_key(link)) != d.stat:
+            ledger.copies[link] = d._replace(blob=blob_id(link), stat=st, repo_stat=st)
+        return same
+    if (st := stat_key(d.repopath)) == d.repo_stat:
+        return True
+    if blob_id(d.repopath) != d.blob:
+        return False
+    ledger.copies[link] = d._replace(repo_stat=st)
+    return True
+
+
+def plan_deploys(inv: Inventory, ledger: Ledger, plan: LinkPlan) -> int:
+    """Add the operations needed to bring the recorded copies and hardlinks up
+    to date to plan. Those of changed objects are deployed again, as are those
+    of objects that are deployed differently now. Files with local edits are
+    left alone, return their number.
+
+    The objects taken care of are marked ManagedHere, so they are not planned
+    again."""
+    refused = 0
+    for o in inv:
+        link = o.get_linkpath()
+        d = ledger.copies.get(link)
+        # A deployed file that is gone is replaced like any missing link
+        if d is None or d.repopath != o.p or not inv.is_file(link):
+            continue
+        how = o.get_deploy()
+        if how != Deploy.Symlink and is_current(ledger, link, d, how):
+            continue
+        if is_edited(link, d):
+            err(f"{link} has local changes, not replacing it with {o.p}")
+            refused += 1
+        else:
+            verbose(f"updating {link}")
+            plan.unlink(link)
+            o.state = ObjectState.ManagedPending
+            o.plan_link(plan)
+        o.state = ObjectState.ManagedHere
+    return refused
+
+
+def stale_copies(inv: Inventory, ledger: Ledger) -> Iterator[Path]:
+    """Return the recorded copies and hardlinks whose objects are gone, like
+    Ledger.dangling() does for symlinks. Those with local edits are kept."""
+    tracked = inv.repopaths()
+    for link, d in list(ledger.copies.items()):
+        if d.repopath in tracked or d.repopath.exists():
+            continue
+        if not os.path.lexists(link):
+            debug("%s is gone", link)
+            del ledger.copies[link]
+        elif is_edited(link, d):
+            warn(f"{link} has local changes, not removing it")
+        else:
+            yield link
+
+
+def edited_copies(ledger: Ledger) -> Iterator[tuple[Path, Deployed]]:
+    """Return the copies and hardlinks that have been changed in place"""
+    for link, d in list(ledger.copies.items()):
+        if d.how == Deploy.Hardlink and is_current(ledger, link, d, d.how):
+            # The change shows in the repository
+            continue
+        if is_edited(link, d):
+            yield link, d
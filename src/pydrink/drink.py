@@ -1,26 +1,43 @@
-from collections.abc import Iterator
+from collections.abc import Iterable, Iterator
 from enum import Enum
 from pathlib import Path
+from typing import TYPE_CHECKING, Optional
 import os
+import time
 import argparse
-from collections import defaultdict
-from importlib.metadata import metadata, version
-from rich.prompt import Prompt
-from rich.markdown import Markdown
-from rich import print
-from rich_argparse import RichHelpFormatter
-
-from pydrink.config import BY_TARGET, Config, KINDS, CONFIG_FILENAME
+
+from pydrink.cache import LINK_STATE, StateCache, link_fingerprint
+from pydrink.complete import CONTEXTS, complete_main
+from pydrink.config import BY_TARGET, Config, KINDS, CONFIG_FILENAME, config_files
+from pydrink.inventory import Inventory
 import pydrink.log
-from pydrink.log import err, debug, verbose, warn, notice
+from pydrink.log import err, debug, verbose, warn, notice, console
 from pydrink.obj import (
     GLOBAL_TARGET,
-    DrinkObject,
     InvalidDrinkObject,
     InvalidKind,
     ObjectState,
+    plan_objects,
 )
 import pydrink.git as git
+from pydrink.gitbackend import session
+from pydrink.output import (
+    FORMATS,
+    Writer,
+    home_record,
+    object_record,
+    repo_record,
+)
+from pydrink.prompt import prompt_info
+from pydrink.refs import read_head
+from pydrink import timing
+from pydrink.timing import phase
+
+# Modules only some actions need are imported where they are used, so that
+# starting drink stays cheap
+if TYPE_CHECKING:
+    from pydrink.ledger import Deployed, Ledger
+    from pydrink.plan import LinkPlan
 
 
 class TrackingState(Enum):
@@ -48,72 +65,368 @@ def tracking_status(c: Config, p: Path) -> TrackingState:
     return TrackingState.Unknown
 
 
-def show_untracked_files(c: Config, selected_kind: str = ""):
+def show_untracked_files(
+    c: Config,
+    selected_kind: str = "",
+    inv: Optional[Inventory] = None,
+    depth: int = 1,
+    limit: int = 0,
+    fmt: str = "plain",
+):
     """Show untracked files / possible drink candidates"""
-    pat = defaultdict(lambda: "*")
-    pat["conf"] = ".*"
-
-    for kind, varname in KINDS.items():
-        checkdir = Path.home() / c[varname]
-        # Skip the others, if user has selected only a certain kind
-        if selected_kind and selected_kind != kind:
-            debug(f"skipping {kind}")
-            continue
-        for f in checkdir.glob(pat[kind]):
-            ts = tracking_status(c, f)
-            if ts == TrackingState.Untracked:
-                print(f"{f}")
-
-
-def get_dangling_links(c: Config, selected_kind: str) -> Iterator[Path]:
+    from pydrink.untracked import untracked_files
+
+    kinds = [selected_kind] if selected_kind else list(KINDS)
+    with Writer(fmt) as w:
+        for p in untracked_files(c, kinds, inv, depth, limit):
+            w.write(home_record(c, p, "Untracked"), p)
+
+
+def show_changed_files(
+    c: Config,
+    changed: list[str],
+    fmt: str = "plain",
+    edited: Iterable[tuple[Path, "Deployed"]] = (),
+):
+    """Show paths in DRINKDIR with uncommitted changes, and copies of objects
+    in link directories that have been edited"""
+    with Writer(fmt) as w:
+        for path in changed:
+            w.write(repo_record(c, path, "Changed"), path)
+        for link, d in edited:
+            record = home_record(c, str(link), "Edited")
+            record["repo"] = str(d.repopath)
+            w.write(record, str(link))
+
+
+def show_objects(c: Config, kind: str = "", target: str = "", fmt: str = "plain"):
+    """Show all tracked objects with their state, optionally only those of one
+    kind and target"""
+    inv = git.get_inventory(c, [kind] if kind else [])
+    with Writer(fmt) as w:
+        for o in inv:
+            if target and o.target != target:
+                continue
+            record = object_record(o)
+            w.write(record, f"{record['state']:<15} {o.p.relative_to(c.drinkdir)}")
+
+
+def show_config(c: Config, variable: str = "", fmt: str = "plain") -> int:
+    """Show all configuration variables, or the expanded value of one"""
+    if variable:
+        try:
+            value = c[variable]
+        except KeyError:
+            err(f"No such variable: {variable}")
+            return 6
+    with Writer(fmt) as w:
+        if variable:
+            w.write({"variable": variable, "value": str(value)}, str(value))
+        else:
+            for k, v in c.config.items():
+                w.write({"variable": k, "value": v}, f"{k}={v}")
+    return 0
+
+
+def get_dangling_links(
+    c: Config, selected_kind: str, inv: Optional[Inventory] = None
+) -> Iterator[Path]:
     """Return an Iterator of Paths, if those paths are:
     1. absolute
-    2. are in a valid kindDir
+    2. are in a valid kindDir, or in a directory below it that tracked
+       objects are linked into
     3. resolve to a non-existing Path in DRINKDIR
     """
+    if inv is None:
+        inv = Inventory(c)
     dir = c.kindDir(selected_kind)
-    if not dir.exists():
+    kind_repo = c.drinkdir / selected_kind
+    tracked = inv.repopaths()
+    subdirs = {
+        o.get_linkpath().parent for o in inv if o.kind == selected_kind
+    } - {dir}
+    if c.flag("FOLD"):
+        # The symlinks of folded directories can be anywhere above objects
+        subdirs.update(
+            *(
+                [d for d in o.get_linkpath().parents if d.is_relative_to(dir)]
+                for o in inv
+                if o.kind == selected_kind
+            )
+        )
+        subdirs.discard(dir)
+    for d in [dir] + sorted(subdirs):
+        debug("pruning %s", d)
+        for entry in inv.scandir(d).values():
+            if not entry.is_symlink():
+                continue
+            p = Path(entry.path)
+            dest = Path(os.readlink(p))
+            if not dest.is_relative_to(kind_repo):
+                continue
+            # Links to tracked objects are not dangling, no need to stat them
+            if dest in tracked or dest.exists():
+                continue
+            debug("%s is dangling", p)
+            yield p
+
+
+def dangling_links(
+    c: Config, inv: Inventory, ledger: Optional["Ledger"] = None
+) -> Iterator[Path]:
+    """Return all dangling links. They are taken from the ledger if possible,
+    otherwise all link directories are scanned and the ledger is rebuilt."""
+    if ledger is not None and ledger.complete:
+        yield from ledger.dangling(inv)
         return
-    debug(f"pruning {dir}")
-    for p in dir.iterdir():
-        if not p.is_symlink():
-            debug(f"{p} is not a symlink")
-            continue
-        dest = p.readlink()
-        debug(f"{p} points to {dest}")
-        if not dest.is_relative_to(c.drinkdir / selected_kind):
-            continue
-        if dest.exists():
-            continue
-        debug(f"{p} is dangling")
-        yield p
-
-
-def prune(c: Config) -> int:
+    verbose("scanning all link directories")
+    for kind in KINDS:
+        yield from get_dangling_links(c, kind, inv)
+    if ledger is not None:
+        ledger.rebuild(inv, read_head(c.drinkdir) or "")
+
+
+def prune(
+    c: Config, inv: Optional[Inventory] = None, ledger: Optional["Ledger"] = None
+) -> int:
     """Remove all dangling symlinks from $HOME that are likely to
     be leftovers from removed drink objects"""
     verbose("pruning...")
-    for kind in KINDS:
-        for dl in get_dangling_links(c, kind):
+    if inv is None:
+        inv = Inventory(c)
+    with phase("prune"):
+        for dl in list(dangling_links(c, inv, ledger)):
             verbose(f"dangling symlink {dl}")
             try:
                 dl.unlink()
             except OSError as e:
                 err(f"Could not remove dangling symlink {dl}: {e}")
                 return 4
+            if ledger is not None:
+                ledger.forget(dl)
+        if ledger is None:
+            return 0
+        from pydrink.deploy import stale_copies
+
+        for link in list(stale_copies(inv, ledger)):
+            verbose(f"stale copy {link}")
+            try:
+                link.unlink()
+            except OSError as e:
+                err(f"Could not remove stale copy {link}: {e}")
+                return 4
+            del ledger.copies[link]
     return 0
 
 
-def link_all(c: Config) -> int:
+def plan_links(
+    c: Config,
+    inv: Inventory,
+    overwrite: bool = False,
+    ledger: Optional["Ledger"] = None,
+) -> tuple["LinkPlan", int]:
+    """Return the plan for linking all objects that are not linked yet, and
+    the number of objects left out because a file is in the way. With
+    overwrite, files with the same content as their objects are replaced.
+
+    With the ledger, outdated copies and hardlinks are replaced as well."""
+    from pydrink.deploy import plan_deploys
+    from pydrink.plan import LinkPlan
+
+    plan = LinkPlan()
+    refused = plan_deploys(inv, ledger, plan) if ledger is not None else 0
+    if c.flag("FOLD"):
+        from pydrink.fold import plan_folded
+
+        plan, folded_refused = plan_folded(c, inv, overwrite, plan)
+        return plan, refused + folded_refused
+    pending = [o for o in inv if o.state == ObjectState.ManagedPending]
+    for o in pending:
+        verbose(f"linking {o.relpath}")
+    refused += plan_objects(plan, pending, overwrite)
+    return plan, refused
+
+
+def link_all(
+    c: Config,
+    inv: Optional[Inventory] = None,
+    ledger: Optional["Ledger"] = None,
+    overwrite: bool = False,
+) -> int:
     verbose("linking...")
-    for o in git.get_tracked_objects(c):
-        if o.state == ObjectState.ManagedPending:
-            verbose(f"linking {o.relpath}")
+    if inv is None:
+        inv = git.get_inventory(c)
+    try:
+        with phase("link"):
+            plan, refused = plan_links(c, inv, overwrite, ledger)
+            plan.apply()
+    except OSError as e:
+        err(f"could not link: {e}")
+        return 4
+    if ledger is not None:
+        ledger.record_plan(plan, read_head(c.drinkdir) or "")
+    return 4 if refused else 0
+
+
+def show_plan(c: Config, overwrite: bool = False) -> int:
+    """Print what "drink -l" would do, without changing anything"""
+    from pydrink.deploy import stale_copies
+    from pydrink.ledger import Ledger
+
+    inv = git.get_inventory(c)
+    ledger = Ledger.load(c)
+    for op in plan_links(c, inv, overwrite, ledger)[0]:
+        print(op)
+    for dl in dangling_links(c, inv, ledger):
+        print(f"prune {dl}")
+    for link in stale_copies(inv, ledger):
+        print(f"prune {link}")
+    return 0
+
+
+def link_changes(
+    c: Config,
+    changes: tuple[str, str],
+    ledger: "Ledger",
+    overwrite: bool = False,
+) -> int:
+    """Remove the links of removed objects and link the added ones, as
+    returned by git.changes_since()"""
+    added, removed = changes
+    with phase("prune"):
+        gone = Inventory.from_ls_files(c, removed)
+        for o in gone:
+            link = o.get_linkpath()
+            if not gone.is_symlink(link):
+                # It might have been linked as part of a folded directory
+                if (fold := gone.fold_link(o)) is None:
+                    continue
+                link = fold
+            # Only links to the removed object or its directory, if they did
+            # not come back as something else
+            dest = Path(os.readlink(link))
+            if not o.p.is_relative_to(dest) or dest.exists():
+                continue
+            verbose(f"dangling symlink {link}")
             try:
-                o.link()
+                link.unlink()
             except OSError as e:
-                err(f"could not link {o.relpath}: {e}")
+                err(f"Could not remove dangling symlink {link}: {e}")
                 return 4
+            ledger.forget(link)
+    # The new objects are classified after pruning, as a moved object can
+    # take the place of its old link.
+    return link_all(c, Inventory.from_ls_files(c, added), ledger, overwrite)
+
+
+def link_and_prune(
+    c: Config, use_cache: bool = True, overwrite: bool = False
+) -> int:
+    """Add missing symlinks and remove dangling ones. Nothing is done if
+    neither the repository, the configuration nor the link directories have
+    changed since the last run. With overwrite, files in place of links are
+    replaced if they have the same content as the object.
+
+    If only new commits came in since the last run, only the objects added
+    and removed by them are looked at."""
+    from pydrink.ledger import Ledger
+
+    state = StateCache(LINK_STATE)
+    # The fingerprint of the last successful run, including the commit that
+    # was applied then
+    applied = (state.load() if use_cache else None) or {}
+    fingerprint = link_fingerprint(c, map(Path, applied.get("linkdirs", {})))
+    # Whether the index matched that commit. Otherwise the links of staged
+    # objects are not part of the changes since then.
+    clean = applied.pop("clean", False)
+    # Without a commit, nothing tells about changes to the objects
+    if applied == fingerprint and fingerprint["head"] is not None:
+        verbose("nothing changed since last run")
+        return 0
+    ledger = Ledger.load(c)
+    if not use_cache:
+        # Do a full scan for dangling links. Copies can not be found that way,
+        # so their records are kept.
+        ledger.links.clear()
+        ledger.complete = False
+    changes = None
+    commit = applied.get("head")
+    # The ledger has to be complete already, it is not rebuilt from the changes
+    # Folding needs to see all objects, and copies of changed objects have to
+    # be replaced, which the changes do not tell about
+    incremental = ledger.complete and not c.flag("FOLD") and not ledger.copies
+    if commit and clean and incremental and same_but_commits(applied, fingerprint):
+        changes = git.changes_since(c, commit)
+    if changes is not None:
+        verbose(f"applying the changes since {commit}")
+        ret = link_changes(c, changes, ledger, overwrite)
+        # changes_since() has made sure the index matches HEAD
+        clean = True
+    else:
+        inv = git.get_inventory(c)
+        ret = link_all(c, inv, ledger, overwrite)
+        if ret == 0:
+            ret = prune(c, inv, ledger)
+        clean = ret == 0 and git.index_matches_head(c)
+    ledger.save()
+    if ret != 0:
+        return ret
+    # Linking and pruning change the link directories, so the fingerprint
+    # has to be taken afterwards.
+    state.save(dict(link_fingerprint(c, ledger.link_dirs()), clean=clean))
+    return 0
+
+
+def same_but_commits(a: dict, b: dict) -> bool:
+    """Tell if two link fingerprints differ at most in HEAD and the index"""
+    volatile = ("head", "index")
+    return {k: v for k, v in a.items() if k not in volatile} == {
+        k: v for k, v in b.items() if k not in volatile
+    }
+
+
+def show_manifest(c: Config, target: str = "") -> int:
+    """Print the link manifest of target, or of all managed targets, as JSON.
+    Return 7 if any link path is claimed by more than one object. Those are
+    listed in the manifest, as messages would spoil the JSON output."""
+    import json
+    from pydrink.manifest import render_targets
+
+    inv = git.get_inventory(c)
+    targets = [target] if target else c.managedTargets()
+    with phase("manifest"):
+        manifests = render_targets(c, inv, targets)
+    with phase("output"):
+        print(json.dumps(manifests, indent=2, sort_keys=True))
+    if any(m["conflicts"] for m in manifests.values()):
+        return 7
+    return 0
+
+
+def materialize(c: Config, dest: str, target: str = "", copy: bool = False) -> int:
+    """Deploy the objects of target into a directory or tar archive, without
+    touching $HOME"""
+    import sys
+    from pydrink.materialize import ManifestConflict, materialize_dir, materialize_tar
+
+    inv = git.get_inventory(c)
+    target = target or c.target
+    compressions = {".tar": "", ".tar.gz": "gz", ".tar.bz2": "bz2", ".tar.xz": "xz"}
+    try:
+        if dest == "-":
+            materialize_tar(c, inv, target, sys.stdout.buffer, copy)
+            return 0
+        for suffix, compression in compressions.items():
+            if dest.endswith(suffix):
+                with open(dest, "xb") as f:
+                    n = materialize_tar(c, inv, target, f, copy, compression)
+                break
+        else:
+            n = materialize_dir(c, inv, target, Path(dest), copy)
+    except (OSError, ManifestConflict) as e:
+        err(f"could not materialize {target}: {e}")
+        return 4
+    verbose(f"materialized {n} objects of {target} into {dest}")
     return 0
 
 
@@ -150,12 +463,29 @@ def begin_setup() -> int:
     return 0
 
 
+class ArgumentParser(argparse.ArgumentParser):
+    """ArgumentParser that switches to rich formatting only when help or usage
+    is actually shown, so rich_argparse is not imported on every run"""
+
+    def _use_rich(self):
+        from rich_argparse import RichHelpFormatter
+
+        self.formatter_class = RichHelpFormatter
+
+    def format_usage(self) -> str:
+        self._use_rich()
+        return super().format_usage()
+
+    def format_help(self) -> str:
+        self._use_rich()
+        return super().format_help()
+
+
 def createArgumentParser():
-    parser = argparse.ArgumentParser(
+    parser = ArgumentParser(
         prog="drink",
         description="Distributed Reusage of Invaluable Nerd Kit",
         epilog="Please consult the README for more information.",
-        formatter_class=RichHelpFormatter,
     )
     args_main = parser.add_mutually_exclusive_group(required=True)
     args_main.add_argument("-r", "--readme", action="store_true", help="show readme")
@@ -174,6 +504,13 @@ def createArgumentParser():
     args_main.add_argument(
         "-c", "--changed", action="store_true", help="show objects with changes"
     )
+    args_main.add_argument(
+        "-o",
+        "--objects",
+        action="store_true",
+        help="show tracked objects and their state, optionally only those \
+                           selected with -k and -t",
+    )
     args_main.add_argument(
         "-g", "--git", action="store_true", help="interactive git menu"
     )
@@ -187,6 +524,48 @@ def createArgumentParser():
         help="dump config. With argument, dump only that single \
                            variable's expanded value",
     )
+    args_main.add_argument(
+        "--prompt-info",
+        nargs="?",
+        const="",
+        metavar="HEADREF",
+        help="print the current head ref and the shell prompt info. With \
+                           argument, mark the repository as updated if its head \
+                           ref differs",
+    )
+    args_main.add_argument(
+        "--migrate",
+        action="store_true",
+        help="apply the git settings drink -b uses for new repositories to the \
+                           existing one, e. g. the untracked cache and fsmonitor",
+    )
+    args_main.add_argument(
+        "--manifest",
+        action="store_true",
+        help="print the links of all targets, or of the one given with -t, \
+                           as JSON",
+    )
+    args_main.add_argument(
+        "--materialize",
+        metavar="DEST",
+        help="deploy the objects of the target given with -t (default: this \
+                           one) into directory DEST instead of $HOME, or into a \
+                           tar archive if DEST ends with .tar, .tar.gz, .tar.bz2 \
+                           or .tar.xz, or is - for stdout",
+    )
+    args_main.add_argument(
+        "--daemon",
+        action="store_true",
+        help="keep the state of the repository in memory and answer --prompt-info \
+                           and -c from there, until terminated",
+    )
+    args_main.add_argument(
+        "--complete",
+        metavar="CONTEXT",
+        choices=CONTEXTS,
+        help="print completions for the shell, one of %(choices)s. For \
+                           importable, the directory of the kind given as filename",
+    )
     args_selector = parser.add_argument_group("selectors")
     args_selector.add_argument("-k", "--kind", help=f"one of {set(KINDS)}")
     args_selector.add_argument(
@@ -201,7 +580,68 @@ def createArgumentParser():
         action="store_true",
         help="print a lot of debugging information",
     )
-    parser.add_argument("filename", nargs="?")
+    args_flags.add_argument(
+        "--timings",
+        action="store_true",
+        help="print the time spent per phase to stderr",
+    )
+    args_flags.add_argument(
+        "--profile",
+        metavar="FILE",
+        help="write cProfile data of this run to FILE",
+    )
+    args_flags.add_argument(
+        "--plan",
+        action="store_true",
+        help="with -l, only show what would be done",
+    )
+    args_flags.add_argument(
+        "--format",
+        choices=FORMATS,
+        default="plain",
+        help="output format of -s, -c, -o and -u: one line per entry (plain), \
+                           a JSON array (json) or one JSON object per line \
+                           (ndjson)",
+    )
+    args_flags.add_argument(
+        "--depth",
+        type=int,
+        default=1,
+        help="with -s, descend this many directory levels (default: 1)",
+    )
+    args_flags.add_argument(
+        "--limit",
+        type=int,
+        default=0,
+        help="with -s, stop after this many results",
+    )
+    args_flags.add_argument(
+        "--copy",
+        action="store_true",
+        help="with --materialize, copy files instead of creating symlinks",
+    )
+    args_flags.add_argument(
+        "--overwrite",
+        action="store_true",
+        help="with -l, replace files in place of links if they have the same \
+                           content as the object",
+    )
+    args_flags.add_argument(
+        "--no-daemon",
+        action="store_true",
+        help="do not ask a running drink daemon",
+    )
+    args_flags.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="do not skip work based on the state of the last run",
+    )
+    parser.add_argument(
+        "filenames",
+        nargs="*",
+        metavar="filename",
+        help="with -i, files, directories or glob patterns to import",
+    )
     return parser
 
 
@@ -210,23 +650,35 @@ def handleArgs(c: Config, args: argparse.Namespace) -> int:
     debug(f"p_name: {p_name}")
     if args.dump:
         debug(args.dump)
-        if args.dump == "_ALL":
-            print(c)
-        else:
-            try:
-                print(c[args.dump])
-            except KeyError:
-                err(f"No such variable: {args.dump}")
-                return 6
+        with phase("output"):
+            return show_config(c, "" if args.dump == "_ALL" else args.dump, args.format)
+    if args.prompt_info is not None:
+        answer = None
+        if not args.no_daemon:
+            from pydrink import client
+
+            answer = client.query(c, "prompt-info", headref=args.prompt_info)
+        current, info = answer or prompt_info(c, args.prompt_info)
+        print(current)
+        print(info)
         return 0
     if args.show:
         try:
-            show_untracked_files(c, selected_kind=args.kind)
+            with phase("output"):
+                show_untracked_files(
+                    c,
+                    selected_kind=args.kind,
+                    depth=args.depth,
+                    limit=args.limit,
+                    fmt=args.format,
+                )
             return 0
         except Exception as e:
             err(str(e))
             return 1
     if args.git:
+        from rich.prompt import Prompt
+
         prompt = Prompt("" if args.quiet else "[dim][i]git action[/i][/dim]: ")
         prompt.prompt_suffix = ""
         try:
@@ -238,30 +690,72 @@ def handleArgs(c: Config, args: argparse.Namespace) -> int:
         if args.verbose:
             return git.diff(c)
         else:
-            print("\n".join(git.get_changed_files(c)))
+            changed = None
+            if not args.no_daemon:
+                from pydrink import client
+
+                changed = client.query(c, "changed")
+            if changed is None:
+                changed = git.get_changed_files(c)
+            from pydrink.deploy import edited_copies
+            from pydrink.ledger import Ledger
+
+            edited = list(edited_copies(Ledger.load(c)))
+            with phase("output"):
+                show_changed_files(c, changed, args.format, edited)
             return 0
-    if args.link:
-        if (ret := link_all(c)) != 0:
-            return ret
-        if (ret := prune(c)) != 0:
-            return ret
+    if args.objects:
+        with phase("output"):
+            show_objects(c, args.kind or "", args.target or "", args.format)
         return 0
+    if args.link:
+        if args.plan:
+            return show_plan(c, args.overwrite)
+        return link_and_prune(
+            c, use_cache=not args.no_cache, overwrite=args.overwrite
+        )
+    if args.migrate:
+        return git.configure_repository(c)
+    if args.complete:
+        return complete_main([args.complete] + args.filenames)
+    if args.daemon:
+        from pydrink.daemon import run_daemon
+
+        return run_daemon(c)
+    if args.manifest:
+        return show_manifest(c, args.target or "")
+    if args.materialize:
+        return materialize(c, args.materialize, args.target or "", args.copy)
     if args.imp:
+        from pydrink.importer import expand_sources, import_objects, link_objects
+        from pydrink.ledger import Ledger
+
         if not args.kind:
             err("no kind supplied")
             return 2
         if not args.target:
             err("no target supplied")
             return 2
-        if not args.filename:
+        if not args.filenames:
             err("no filename supplied")
             return 2
         try:
-            o = DrinkObject.import_object(
-                c, Path(args.filename), args.kind, args.target
+            objs = import_objects(
+                c,
+                expand_sources(c, args.kind, args.filenames),
+                args.kind,
+                args.target,
             )
-            git.add_object(c, o)
-            o.link(overwrite=True)
+            if not objs:
+                err("nothing to import")
+                return 2
+            if (ret := git.add_objects(c, objs)) != 0:
+                err("The imported files are in the repository, but not linked")
+                return ret
+            plan = link_objects(objs)
+            ledger = Ledger.load(c)
+            ledger.record_plan(plan, read_head(c.drinkdir) or "")
+            ledger.save()
             return 0
         except OSError as e:
             err(f"Import failed: {e}")
@@ -273,17 +767,18 @@ def handleArgs(c: Config, args: argparse.Namespace) -> int:
             err(f"Import failed: {e}")
             return 2
     if args.readme:
+        from importlib.metadata import metadata
+        from rich.markdown import Markdown
+
         if descr := metadata(p_name).get("Description"):
-            print(Markdown(descr))
+            console().print(Markdown(descr))
             return 0
         else:
             err("You need Python >= 3.10 to use this feature.")
             return 5
-    if args.readme:
-        meta = metadata(p_name)
-        print(Markdown(meta["Description"]))
-        return 0
     if args.version:
+        from importlib.metadata import version
+
         p_version = version(p_name)
         notice(f"{p_name} {p_version}")
         return 0
@@ -291,24 +786,44 @@ def handleArgs(c: Config, args: argparse.Namespace) -> int:
     return 9
 
 
-def cli() -> int:
-    parser = createArgumentParser()
-    args = parser.parse_args()
-    debug(args)
-    pydrink.log.DEBUG = args.debug
-    pydrink.log.QUIET = args.quiet
-    pydrink.log.VERBOSE = args.verbose
-
+def main(args: argparse.Namespace) -> int:
     # We probably have no config yet if this is called,
     # so handleArgs() would be too late.
     if args.begin:
         return begin_setup()
 
     try:
-        c = Config(find_drinkrc())
+        with phase("config"):
+            if not (files := config_files()):
+                raise NoConfigFound("No drinkrc could be found")
+            c = Config.load(files)
     except Exception as e:
         err(str(e))
         return 1
     debug(c)
 
-    return handleArgs(c, args)
+    with session(c):
+        return handleArgs(c, args)
+
+
+def cli() -> int:
+    start = time.perf_counter()
+    parser = createArgumentParser()
+    args = parser.parse_args()
+    pydrink.log.DEBUG = args.debug
+    pydrink.log.QUIET = args.quiet
+    pydrink.log.VERBOSE = args.verbose
+    debug(args)
+    timing.ENABLED = args.timings
+
+    if args.profile:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        ret = profiler.runcall(main, args)
+        profiler.dump_stats(args.profile)
+    else:
+        ret = main(args)
+    if args.timings:
+        timing.report(time.perf_counter() - start)
+    return ret
@@ -0,0 +1,85 @@
+from typing import TYPE_CHECKING, Optional
+import sys
+
+if TYPE_CHECKING:
+    from pydrink.config import Config
+
+# This is what the drink command runs. Shell completion and the prompt call
+# drink all the time, so those calls are answered here if possible, before
+# pydrink.drink, argparse and everything they import are loaded.
+
+PROMPT_INFO = "--prompt-info"
+# Arguments a running daemon can answer, see pydrink.daemon
+CHANGED = (["-c"], ["--changed"])
+
+
+def prompt_headref(args: list[str]) -> Optional[str]:
+    """Return the HEADREF argument if args are just --prompt-info [HEADREF],
+    None otherwise"""
+    if args[:1] != [PROMPT_INFO] or len(args) > 2:
+        return None
+    headref = "".join(args[1:])
+    return None if headref.startswith("-") else headref
+
+
+def load_config() -> Optional["Config"]:
+    from pydrink.config import Config, config_files
+
+    if not (files := config_files()):
+        return None
+    try:
+        return Config.load(files)
+    except Exception:
+        return None
+
+
+def prompt_main(headref: str) -> Optional[int]:
+    """drink --prompt-info [HEADREF], from the daemon if one is running"""
+    from pydrink import client
+    from pydrink.prompt import prompt_info
+
+    if (c := load_config()) is None:
+        # Leave the error message to the CLI
+        return None
+    answer = client.query(c, "prompt-info", headref=headref)
+    current, info = answer or prompt_info(c, headref)
+    sys.stdout.write(f"{current}\n{info}\n")
+    return 0
+
+
+def ask_daemon(args: list[str]) -> Optional[list[str]]:
+    """Return the lines to print for args if they are a query a running daemon
+    has answered, None otherwise"""
+    if args not in CHANGED:
+        return None
+    from pydrink import client
+
+    if (c := load_config()) is None:
+        return None
+    lines: list[str] = []
+    for name in ("changed", "edited"):
+        if (answer := client.query(c, name)) is None:
+            return None
+        lines.extend(answer)
+    return lines
+
+
+def main() -> int:
+    args = sys.argv[1:]
+    if args[:1] == ["--complete"]:
+        from pydrink.complete import complete_main
+
+        return complete_main(args[1:])
+    if (headref := prompt_headref(args)) is not None:
+        if (ret := prompt_main(headref)) is not None:
+            return ret
+    elif (lines := ask_daemon(args)) is not None:
+        if lines:
+            sys.stdout.write("\n".join(lines) + "\n")
+        return 0
+    elif args in CHANGED:
+        # The daemon did not answer, do not wait for it again
+        sys.argv.append("--no-daemon")
+    from pydrink.drink import cli
+
+    return cli()
@@ -0,0 +1,125 @@
+from collections import defaultdict
+from pathlib import Path
+from typing import Optional
+import os
+
+from pydrink.config import Config, Deploy, KINDS
+from pydrink.inventory import Inventory
+from pydrink.log import debug, verbose
+from pydrink.obj import (
+    DOT_PREFIX,
+    GLOBAL_TARGET,
+    DrinkObject,
+    ObjectState,
+    plan_objects,
+)
+from pydrink.plan import LinkPlan
+
+# With FOLD=yes, a directory whose objects all come from one directory in the
+# repository is linked as a whole, like GNU stow does. A deep configuration
+# tree then needs a single symlink instead of one per file. As soon as objects
+# from somewhere else have to be linked into it, it is unfolded again.
+
+
+def local_objects(c: Config, inv: Inventory) -> list[DrinkObject]:
+    """Return the objects that are linked on this host"""
+    return [o for o in inv if o.target in (c.target, GLOBAL_TARGET)]
+
+
+def only_tracked(repo: Path, tracked: set[Path]) -> bool:
+    """Tell if there is nothing below repo but tracked objects, so linking
+    the directory exposes nothing else"""
+    for root, dirs, files in os.walk(repo):
+        if any(Path(root, f) not in tracked for f in files):
+            return False
+        if any(os.path.islink(os.path.join(root, d)) for d in dirs):
+            return False
+    return True
+
+
+def fold_dirs(c: Config, inv: Inventory) -> dict[Path, Path]:
+    """Return the link directories to symlink as a whole, with the directory
+    in the repository they link to
+
+    A directory is folded if all objects linked below it come from the same
+    directory in the repository, that directory holds nothing but tracked
+    objects whose names are the same in the link directory, and nothing
+    exists at the link path yet. The topmost such directories are chosen, but
+    never the top level of a kind directory, like ~/.config, which other
+    programs write into. Directories containing a kind
+    directory are not folded either. A folded directory stays folded until
+    objects from elsewhere have to be linked into it.
+    """
+    kind_dirs = {c.kindDir(k) for k in KINDS}
+    local = local_objects(c, inv)
+    sources: dict[Path, set[Path]] = defaultdict(set)
+    for o in local:
+        root = c.kindDir(o.kind)
+        link, repo = o.get_linkpath().parent, o.p.parent
+        # A copy in a folded directory would end up in the repository
+        copied = o.get_deploy() != Deploy.Symlink
+        # Names that are undotified are wrong when seen through a folded
+        # directory, so no directory above them can be folded
+        dotted = o.p.name.startswith(DOT_PREFIX)
+        while link != root and link.is_relative_to(root):
+            sources[link].add(Path() if copied or dotted else repo)
+            dotted = dotted or repo.name.startswith(DOT_PREFIX)
+            link, repo = link.parent, repo.parent
+    existing = {link for o in local if (link := inv.fold_link(o)) is not None}
+    tracked = inv.repopaths()
+    folds: dict[Path, Path] = {}
+    for link in sorted(sources, key=lambda p: len(p.parts)):
+        if len(sources[link]) != 1 or any(p in folds for p in link.parents):
+            continue
+        if link.parent in kind_dirs or any(k.is_relative_to(link) for k in kind_dirs):
+            continue
+        (repo,) = sources[link]
+        if inv.is_symlink(link):
+            # Already folded. Files other programs put there since are kept.
+            if Path(os.readlink(link)) == repo:
+                folds[link] = repo
+            continue
+        # Below a folded directory that is unfolded, nothing will be left
+        unfolding = any(p in existing for p in link.parents)
+        if not unfolding and os.path.lexists(link):
+            continue
+        if not only_tracked(repo, tracked):
+            debug("not folding %s: untracked files in %s", link, repo)
+            continue
+        folds[link] = repo
+    return folds
+
+
+def plan_folded(
+    c: Config, inv: Inventory, overwrite: bool = False, plan: Optional[LinkPlan] = None
+) -> tuple[LinkPlan, int]:
+    """Like drink.plan_links(), but folding directories where possible and
+    unfolding those that can not stay folded"""
+    folds = fold_dirs(c, inv)
+    if plan is None:
+        plan = LinkPlan()
+    local = local_objects(c, inv)
+    existing = {link for o in local if (link := inv.fold_link(o)) is not None}
+    for link in sorted(existing - folds.keys()):
+        verbose(f"unfolding {link}")
+        plan.unfold(link)
+    for link, repo in sorted(folds.items()):
+        if link not in existing:
+            verbose(f"folding {link}")
+            plan.symlink(link, repo)
+    pending = []
+    unfolded = []
+    for o in local:
+        if any(p in folds for p in o.get_linkpath().parents):
+            continue
+        if inv.fold_link(o) is not None:
+            # Linked through a directory that is unfolded
+            o.state = ObjectState.ManagedPending
+            unfolded.append(o)
+        elif o.state == ObjectState.ManagedPending:
+            verbose(f"linking {o.relpath}")
+            pending.append(o)
+    refused = plan_objects(plan, pending, overwrite)
+    # Nothing can be in the way in a directory that is created by unfolding
+    plan_objects(plan, unfolded)
+    return plan, refused
@@ -1,15 +1,37 @@
 from collections.abc import Iterable, Iterator
-from pydrink.log import debug, err, notice, warn
-from pydrink.config import Config, KINDS
-from pydrink.obj import DrinkObject
+from pydrink.log import debug, err, notice, verbose, warn
+from pydrink.cache import stat_key
+from pydrink.config import BY_TARGET, Config, KINDS
+from pydrink.inventory import SYMLINK_MODE, Inventory
+from pydrink.obj import GLOBAL_TARGET, DrinkObject
+from pydrink.timing import phase
+from pydrink.gitbackend import backend
+from pydrink.prompt import cached_index
+from pydrink.refs import git_dir
+from pathlib import Path
+import os
 import sys
 import getpass
-from typing import Callable, Dict
-from subprocess import CalledProcessError, call, run
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, NamedTuple, Optional
+from subprocess import CalledProcessError
+
+if TYPE_CHECKING:
+    from pydrink.gitasync import AsyncGit
+
+# Name of the background fetch, which automerge joins
+FETCH = "fetch from base"
+# Menu actions on single objects that do not change the repository
+READONLY_ACTIONS = {"diff", "log"}
+# Menu number of the first action on a changed object
+MENU_FIRST_OBJECT = 10
+# Number of changed objects the menu shows at once
+PAGE_SIZE = 20
 
 
 def unclean(c: Config) -> bool:
-    ret = call(["git", "-C", str(c.drinkdir), "diff", "--quiet"])
+    cmd = ["git", "-C", str(c.drinkdir), "diff", "--quiet"]
+    ret = backend(c).call(cmd, readonly=True)
     if ret != 0:
         err("drink repository is dirty")
     return ret != 0
@@ -18,10 +40,8 @@ def unclean(c: Config) -> bool:
 def get_branches(c: Config) -> list[str]:
     """Return a list of all remote branches found in drink repository"""
     try:
-        result = run(
-            ["git", "-C", str(c.drinkdir), "branch", "-r", "--no-color"],
-            text=True,
-            capture_output=True,
+        result = backend(c).run(
+            ["git", "-C", str(c.drinkdir), "branch", "-r", "--no-color"]
         )
         result.check_returncode()
         if result.stderr:
@@ -36,66 +56,179 @@ def get_branches(c: Config) -> list[str]:
 
 def diff(c: Config) -> int:
     """Print a list of uncommitted changes"""
-    return call(["git", "-C", str(c.drinkdir), "diff"])
+    return backend(c).call(["git", "-C", str(c.drinkdir), "diff"], readonly=True)
+
+
+class StatusEntry(NamedTuple):
+    """One record of git status --porcelain=v2"""
+
+    # "1" changed, "2" renamed or copied, "u" unmerged, "?" untracked
+    kind: str
+    # Staged and unstaged state, like in git status --short
+    xy: str
+    path: str
+    # Only for renames and copies, the path before
+    orig: str = ""
+
+
+def parse_status(output: str) -> list[StatusEntry]:
+    """Parse the output of git status --porcelain=v2 -z"""
+    entries = []
+    records = iter(output.split("\0"))
+    for record in records:
+        if not record:
+            continue
+        kind = record[0]
+        if kind == "1":
+            fields = record.split(" ", 8)
+            entries.append(StatusEntry(kind, fields[1], fields[8]))
+        elif kind == "2":
+            fields = record.split(" ", 9)
+            entries.append(StatusEntry(kind, fields[1], fields[9], next(records)))
+        elif kind == "u":
+            fields = record.split(" ", 10)
+            entries.append(StatusEntry(kind, fields[1], fields[10]))
+        elif kind == "?":
+            entries.append(StatusEntry(kind, "??", record[2:]))
+    return entries
+
+
+def changed_paths(entries: list[StatusEntry]) -> list[str]:
+    """Return the paths of tracked files among status entries. Untracked files
+    are not objects yet, and are shown by "drink -s"."""
+    return [e.path for e in entries if e.kind != "?"]
+
+
+def get_status(c: Config) -> list[StatusEntry]:
+    """Return all staged, unstaged, unmerged and untracked changes"""
+    result = backend(c).run(
+        ["git", "-C", str(c.drinkdir), "status", "--porcelain=v2", "-z"]
+    )
+    if result.returncode != 0:
+        err(f"{result.returncode}\n{result.stderr}")
+        return []
+    return parse_status(result.stdout)
 
 
 def get_changed_files(c: Config) -> list[str]:
     """Return a list of all objects with uncommitted changes"""
-    try:
-        result = run(
-            [
-                "git",
-                "-C",
-                str(c.drinkdir),
-                "diff-files",
-                "--name-only",
-                "--no-color",
-            ],
-            text=True,
-            capture_output=True,
-        )
-        result.check_returncode()
-        if result.stderr:
-            err(f"{result.returncode}\n{result.stderr}")
-            return []
-        if result.stdout:
-            return [x.strip() for x in result.stdout.split("\n") if x]
-    except CalledProcessError as e:
-        err(e.returncode)
-    return []
+    return changed_paths(get_status(c))
 
 
-def get_tracked_objects(c: Config, kinds: Iterable[str] = []) -> Iterator[DrinkObject]:
-    """Return a list of DrinkObjects with all tracked objects"""
-    cmd = ["git", "-C", str(c.drinkdir), "ls-files"]
+def fsmonitor_supported(c: Config) -> bool:
+    """Tell if git comes with the built-in fsmonitor daemon"""
+    result = backend(c).run(["git", "version", "--build-options"])
+    return "feature: fsmonitor--daemon" in result.stdout
+
+
+def configure_repository(c: Config) -> int:
+    """Enable the untracked cache and, where git supports it, the built-in
+    fsmonitor, so git status stays cheap on large repositories"""
+    settings = {"core.untrackedCache": "true"}
+    if fsmonitor_supported(c):
+        settings["core.fsmonitor"] = "true"
+    else:
+        verbose("git has no built-in fsmonitor on this platform")
+    gb = backend(c)
+    ret = 0
+    for key, value in settings.items():
+        cmd = ["git", "-C", str(c.drinkdir), "config", key, value]
+        if (ret := gb.call(cmd)) != 0:
+            err(f"Could not configure {key}: {cmd}")
+            return ret
+    return ret
+
+
+def get_inventory(c: Config, kinds: Iterable[str] = []) -> Inventory:
+    """Return an Inventory of all tracked objects, optionally limited to some
+    kinds"""
+    cmd = ["git", "-C", str(c.drinkdir), "ls-files", "-z", "--stage", "--"]
     if kinds == []:
         kinds = list(KINDS)
     try:
-        result = run(cmd + list(kinds), text=True, capture_output=True)
+        result = backend(c).run(cmd + list(kinds))
         result.check_returncode()
         if result.stderr:
             err(f"{result.returncode}\n{result.stderr}")
-        if result.stdout:
-            debug("git ls-files worked")
-            for line in result.stdout.split("\n"):
-                if not line:
-                    continue
-                debug(f"next line to process: {line}")
-                yield DrinkObject(c, c.drinkdir / line.strip())
+        debug("git ls-files worked")
+        with phase("inventory"):
+            return Inventory.from_ls_files(c, result.stdout)
     except CalledProcessError as e:
         err(f"listing tracked objects: {e}")
+    return Inventory(c)
 
 
-def add_object(c: Config, obj: DrinkObject) -> int:
-    """Add and commit a drink object to the git repository after it was copied.
-    Second step of an import of a new object"""
-    cmd = ["git", "-C", str(c.drinkdir), "add", obj.get_repopath(relative=True)]
-    ret = call(cmd)
-    if ret != 0:
-        err(f"Error when adding object to repository. {cmd} failed.")
-        return ret
-    cmd = ["git", "-C", str(c.drinkdir), "commit"]
-    ret = call(cmd)
+def index_matches_head(c: Config) -> bool:
+    """Tell if the index has no changes staged against HEAD"""
+    git = ["git", "-C", str(c.drinkdir)]
+    cmd = ["diff-index", "--cached", "--quiet", "HEAD", "--"]
+    return backend(c).run(git + cmd).returncode == 0
+
+
+def changes_since(c: Config, commit: str) -> Optional[tuple[str, str]]:
+    """Return the objects added and removed between commit and HEAD, in the
+    format of git ls-files -z --stage, for Inventory.from_ls_files()
+
+    Return None if that does not describe what a full run would see: commit
+    is gone, a merge is in progress or the index differs from HEAD.
+    """
+    gb = backend(c)
+    git = ["git", "-C", str(c.drinkdir)]
+    if gb.object_info(f"{commit}^{{commit}}") is None:
+        verbose(f"last applied commit {commit} does not exist anymore")
+        return None
+    if (git_dir(c.drinkdir) / "MERGE_HEAD").exists():
+        verbose("merge in progress")
+        return None
+    if not index_matches_head(c):
+        verbose("uncommitted changes in the index")
+        return None
+    cmd = ["diff", "--raw", "-z", "--no-renames", "--no-abbrev", commit, "HEAD"]
+    result = gb.run(git + cmd + ["--"] + list(KINDS))
+    if result.returncode != 0:
+        err(f"{result.returncode}\n{result.stderr}")
+        return None
+    added: list[str] = []
+    removed: list[str] = []
+    records = iter(result.stdout.split("\0"))
+    for meta in records:
+        if not meta:
+            continue
+        name = next(records)
+        old_mode, new_mode, old_blob, new_blob, status = meta[1:].split(" ")
+        # A type change, e. g. to a symlink, is a removal and an addition
+        if status in ("D", "T") and old_mode != SYMLINK_MODE:
+            removed.append(f"{old_mode} {old_blob} 0\t{name}")
+        if status in ("A", "T"):
+            added.append(f"{new_mode} {new_blob} 0\t{name}")
+    return "\0".join(added), "\0".join(removed)
+
+
+def get_tracked_objects(c: Config, kinds: Iterable[str] = []) -> Iterator[DrinkObject]:
+    """Return a list of DrinkObjects with all tracked objects"""
+    yield from get_inventory(c, kinds)
+
+
+def add_objects(c: Config, objs: list[DrinkObject]) -> int:
+    """Stage many imported objects with a single git add and commit them with
+    a single commit, for which the user can edit the message"""
+    gb = backend(c)
+    git = ["git", "-C", str(c.drinkdir)]
+    paths = "\0".join(str(o.get_repopath(relative=True)) for o in objs)
+    cmd = git + [
+        "--literal-pathspecs",
+        "add",
+        "--pathspec-from-file=-",
+        "--pathspec-file-nul",
+    ]
+    result = gb.run(cmd, readonly=False, input=paths)
+    if result.returncode != 0:
+        err(f"Error when adding objects to repository. {cmd} failed.")
+        err(result.stderr)
+        return result.returncode
+    what = objs[0].relpath if len(objs) == 1 else f"{len(objs)} objects"
+    cmd = git + ["commit", "--edit", "-m", f"Import {what}"]
+    ret = gb.call(cmd)
     if ret != 0:
         err(f"Error when committing to repository. {cmd} failed.")
     return ret
@@ -113,32 +246,35 @@ def init_repository(c: Config) -> int:
     cf_username = getpass.getuser()
     cf_push = f"+refs/heads/*:refs/remotes/{target}/*"
     cf_fetch = f"+refs/remotes/*/{mb}:refs/remotes/*/{mb}"
+    gb = backend(c)
     git = ["git", "-C", str(repo)]
     cmd = git + ["init", "-b", mb]
-    ret = call(cmd)
+    ret = gb.call(cmd)
     if ret != 0:
         err(f"Could not initialize repository: {cmd}")
         return ret
+    if (ret := configure_repository(c)) != 0:
+        return ret
     notice("A drink repository has been created.")
     if baseurl:
         notice("Configuring git remote.")
         cmd = git + ["remote", "add", base, baseurl]
-        if (ret := call(cmd)) != 0:
+        if (ret := gb.call(cmd)) != 0:
             err(f"Could not add remote: {cmd}")
             return ret
         cmd = git + ["config", f"remote.{base}.push", cf_push]
-        if (ret := call(cmd)) != 0:
+        if (ret := gb.call(cmd)) != 0:
             err(f"Could not configure push mode: {cmd}")
             return ret
         cmd = git + ["config", f"remote.{base}.fetch", cf_fetch]
-        if (ret := call(cmd)) != 0:
+        if (ret := gb.call(cmd)) != 0:
             err(f"Could not configure fetch mode: {cmd}")
             return ret
         cmd = git + ["config", "user.name", cf_username]
-        if (ret := call(cmd)) != 0:
+        if (ret := gb.call(cmd)) != 0:
             warn(f"Could not configure username: {cmd}")
         cmd = git + ["config", "user.email", cf_email]
-        if (ret := call(cmd)) != 0:
+        if (ret := gb.call(cmd)) != 0:
             warn(f"Could not configure email: {cmd}")
         notice("""\
             Now you should be able to automerge from all remotes:
@@ -154,8 +290,121 @@ def init_repository(c: Config) -> int:
     return 0
 
 
-def git_menu_items(c: Config, git: list[str]) -> dict[str, list[str]]:
-    """Return a dictionary of user selectable git commands, indexed by a number."""
+async def _unmerged_branches(ag: "AsyncGit") -> tuple[list[str], int]:
+    import asyncio
+
+    git = ag.git + ["for-each-ref"]
+    fmt = "--format=%(refname:short) %(symref)"
+    all_refs, unmerged = await asyncio.gather(
+        ag.run(git + [fmt, "refs/remotes"]),
+        ag.run(git + [fmt, "--no-merged=HEAD", "refs/remotes"]),
+    )
+    for result in all_refs, unmerged:
+        if result.returncode != 0:
+            err(f"{result.returncode}\n{result.stderr}")
+            return [], 0
+
+    def branches(out: str) -> list[str]:
+        refs = [x.partition(" ") for x in out.split("\n")]
+        # Skip symbolic refs like base/HEAD
+        return [ref for ref, _, symref in refs if ref and not symref]
+
+    return branches(unmerged.stdout), len(branches(all_refs.stdout))
+
+
+def get_unmerged_branches(c: Config) -> tuple[list[str], int]:
+    """Return the remote branches that have commits not merged into HEAD yet,
+    and the number of all remote branches"""
+    import asyncio
+    from pydrink.gitasync import AsyncGit
+
+    return asyncio.run(_unmerged_branches(AsyncGit(c)))
+
+
+async def _merge_conflicts(ag: "AsyncGit", branch: str) -> bool:
+    result = await ag.run(ag.git + ["merge-tree", "--write-tree", "HEAD", branch])
+    return result.returncode != 0
+
+
+async def _abort_merge(ag: "AsyncGit"):
+    """Clean up after a merge that stopped with conflicts"""
+    if (git_dir(ag.config.drinkdir) / "MERGE_HEAD").exists():
+        await ag.call(ag.git + ["merge", "--abort"])
+
+
+async def _unclean(ag: "AsyncGit") -> bool:
+    ret = await ag.call(ag.git + ["diff", "--quiet"], readonly=True)
+    if ret != 0:
+        err("drink repository is dirty")
+    return ret != 0
+
+
+async def _automerge(ag: "AsyncGit") -> int:
+    import asyncio
+    from pydrink.gitasync import fetch
+
+    start = time.perf_counter()
+    # The worktree is checked while fetching. A fetch started from the menu
+    # before is joined.
+    fetching = ag.start(FETCH, fetch(ag))
+    if await _unclean(ag):
+        err("Stopping automerge")
+        return 1
+    if (ret := await fetching.task) != 0:
+        err("Stopping automerge")
+        return ret
+    branches, total = await _unmerged_branches(ag)
+    debug("unmerged branches: %s", branches)
+    conflicts = await asyncio.gather(*(_merge_conflicts(ag, b) for b in branches))
+    conflicting = [b for b, conflict in zip(branches, conflicts) if conflict]
+    clean = [b for b in branches if b not in conflicting]
+    sequential = clean + conflicting
+    git = ag.git
+    if len(clean) > 1:
+        verbose(f"merging {' '.join(clean)}")
+        if await ag.call(git + ["merge", "--no-edit"] + clean) == 0:
+            sequential = conflicting
+        else:
+            warn("octopus merge failed, merging one by one")
+            await _abort_merge(ag)
+    for branch in sequential:
+        verbose(f"merging {branch}")
+        ret = await ag.call(git + ["merge", "--no-edit", branch])
+        if ret != 0:
+            err(f"error {ret} when trying to merge {branch}")
+            err("Stopping automerge")
+            return ret
+    notice(
+        f"Merged {len(branches)} branches, skipped {total - len(branches)} "
+        f"without new commits in {time.perf_counter() - start:.1f}s"
+    )
+    return 0
+
+
+def automerge(c: Config) -> int:
+    """Fetch from base and merge all remote branches that have advanced
+
+    Branches without new commits are skipped. All branches that merge cleanly
+    are merged with a single octopus merge, the others one by one, stopping
+    at the first conflict.
+    """
+    import asyncio
+    from pydrink.gitasync import AsyncGit
+
+    return asyncio.run(_automerge(AsyncGit(c)))
+
+
+def git_menu_items(
+    c: Config,
+    git: list[str],
+    changed_files: Optional[list[str]] = None,
+    shown: Optional[Iterable[int]] = None,
+) -> dict[str, list[str]]:
+    """Return a dictionary of user selectable git commands, indexed by a number.
+
+    Only the changed objects at the positions in shown are printed, but all
+    of them get their numbers, so the numbers stay the same across pages.
+    """
     git_cmd_base: Dict[str, list[str]] = {
         "2": git + ["fetch", str(c["DRINKBASE"])],
         "3": git + ["push", str(c["DRINKBASE"])],
@@ -167,79 +416,222 @@ def git_menu_items(c: Config, git: list[str]) -> dict[str, list[str]]:
     change_actions = ["diff", "commit", "checkout", "add"]
     notice("")
     notice(" 1) [b]quit[/b]", no_dedent=True)
-    notice(" 2) [b]fetch[/b] from base", no_dedent=True)
+    notice(" 2) [b]fetch[/b] from base, in the background", no_dedent=True)
     notice(" 3) [b]push[/b] to base", no_dedent=True)
     notice(" 4) [b]automerge[/b] all remote branches", no_dedent=True)
     notice(" 5) [b]commit -a[/b]", no_dedent=True)
     notice(" 6) [b]commit[/b]", no_dedent=True)
     notice(" 7) [b]log -p[/b]", no_dedent=True)
     notice(" 8) [b]diff[/b]", no_dedent=True)
-    i: int = 10
     # If one of the individual action commands is used,
     # the corresponding menu entries are still there. So
     # we need to reset the whole menu on each loop.
     git_cmd = git_cmd_base
     # Augment the menu with changed objects
-    changed_files = get_changed_files(c)
-    for change in changed_files:
-        notice(f" [yellow]------ ({change}) ------[/yellow]")
+    if changed_files is None:
+        changed_files = get_changed_files(c)
+    show = set(range(len(changed_files)) if shown is None else shown)
+    for n, change in enumerate(changed_files):
+        i = MENU_FIRST_OBJECT + n * len(change_actions)
+        if n in show:
+            notice(f" [yellow]------ ({change}) ------[/yellow]")
         for action in change_actions:
-            notice(f"{i:>2}) {action} [dim]{change}[/dim]")
+            if n in show:
+                notice(f"{i:>2}) {action} [dim]{change}[/dim]")
             git_cmd[str(i)] = git + [action] + [change]
             i += 1
     notice("")
     return git_cmd
 
 
-def menu(c: Config, input_function: Callable) -> int:
-    """Interactive menu to run git commands on drink objects"""
+def kind_and_target(path: str) -> tuple[str, str]:
+    """Return kind and target of a path in the drink repository"""
+    parts = Path(path).parts
+    if len(parts) > 3 and parts[1] == BY_TARGET:
+        return parts[0], parts[2]
+    return parts[0], GLOBAL_TARGET
+
+
+class MenuModel:
+    """The changed objects offered by the git menu
+
+    git status only runs again when the index, HEAD, the remote refs or the
+    stat data of tracked files have changed, or when asked to with refresh().
+    The objects are shown in pages of PAGE_SIZE and can be filtered by kind
+    and target.
+    """
+
+    def __init__(self, c: Config, ag: "AsyncGit"):
+        self.config = c
+        self.ag = ag
+        self.changed: list[str] = []
+        self.page = 0
+        self.kind = ""
+        self.target = ""
+        self._key: Any = None
+
+    def _state_key(self) -> Any:
+        c = self.config
+        gitdir = git_dir(c.drinkdir)
+        remotes = []
+        for root, _, files in os.walk(gitdir / "refs" / "remotes"):
+            for f in files:
+                remotes.append([root, f, stat_key(Path(root) / f)])
+        # git status compares the tracked files with the index by their stat
+        # data, so a file edited back to what it was is noticed as well
+        worktree: list[Optional[list[int]]] = []
+        for e in cached_index(c)[0]:
+            try:
+                st = os.lstat(c.drinkdir / e.name)
+            except OSError:
+                worktree.append(None)
+                continue
+            worktree.append(
+                [st.st_mode, st.st_mtime_ns, st.st_ctime_ns, st.st_size, st.st_ino]
+            )
+        return [
+            stat_key(gitdir / "index"),
+            stat_key(gitdir / "HEAD"),
+            stat_key(gitdir / "packed-refs"),
+            remotes,
+            worktree,
+        ]
+
+    async def refresh(self, force: bool = False) -> bool:
+        """Read the changed objects again if the repository has changed. Tell
+        if they were read."""
+        key = self._state_key()
+        if key == self._key and not force:
+            debug("repository unchanged, keeping the menu")
+            return False
+        self.changed = await _changed_files(self.ag)
+        self._key = key
+        return True
+
+    def matches(self, path: str) -> bool:
+        kind, target = kind_and_target(path)
+        return self.kind in ("", kind) and self.target in ("", target)
+
+    def visible(self) -> list[int]:
+        """Return the positions of all objects that pass the filters"""
+        return [n for n, p in enumerate(self.changed) if self.matches(p)]
+
+    def num_pages(self) -> int:
+        return max(1, -(-len(self.visible()) // PAGE_SIZE))
+
+    def shown(self) -> list[int]:
+        """Return the positions of the objects on the current page"""
+        self.page = min(max(self.page, 0), self.num_pages() - 1)
+        first = self.page * PAGE_SIZE
+        return self.visible()[first:][:PAGE_SIZE]
+
+    def footer(self) -> Optional[str]:
+        if len(self.changed) <= PAGE_SIZE and not self.kind and not self.target:
+            return None
+        filters = " ".join(f for f in (self.kind, self.target) if f)
+        return (
+            f"page {self.page + 1}/{self.num_pages()} of "
+            f"{len(self.visible())} objects {filters}: [b]n[/b]ext, [b]p[/b]revious,"
+            " [b]k[/b] KIND, [b]t[/b] TARGET to filter, [b]r[/b]efresh"
+        )
+
+    def command(self, reply: str) -> bool:
+        """Handle paging and filter commands, tell if reply was one"""
+        cmd, _, arg = reply.strip().partition(" ")
+        if cmd == "n":
+            self.page += 1
+        elif cmd == "p":
+            self.page -= 1
+        elif cmd == "k":
+            self.kind = arg.strip()
+            self.page = 0
+        elif cmd == "t":
+            self.target = arg.strip()
+            self.page = 0
+        elif cmd == "r":
+            self._key = None
+        else:
+            return False
+        return True
+
+
+async def _changed_files(ag: "AsyncGit") -> list[str]:
+    result = await ag.run(ag.git + ["status", "--porcelain=v2", "-z"])
+    if result.returncode != 0:
+        err(f"{result.returncode}\n{result.stderr}")
+        return []
+    return changed_paths(parse_status(result.stdout))
+
+
+async def _menu_action(ag: "AsyncGit", git_cmd: dict[str, list[str]], reply: str) -> int:
+    from pydrink.gitasync import fetch
+
+    if reply == "2":
+        ag.start(FETCH, fetch(ag))
+        return 0
+    if reply == "4":
+        return await _automerge(ag)
+    if reply not in git_cmd:
+        err(f"Invalid menu item selected: {reply}")
+        return 99
+    cmd = git_cmd[reply]
+    debug(f"calling: {' '.join(cmd)}")
+    ret = await ag.call(cmd, readonly=cmd[3] in READONLY_ACTIONS)
+    # git will be killed with signal 13 (SIGPIPE) when there is a lot
+    # of output and 'q' is pressed early (broken pipe). We can ignore
+    # that.
+    if ret not in [-13, 0]:
+        err(f"git returned error {ret}")
+        return ret
+    return 0
+
+
+async def _menu(c: Config, input_function: Callable) -> int:
+    from pydrink.gitasync import AsyncGit, ainput
+
+    ag = AsyncGit(c)
+    model = MenuModel(c, ag)
+    ret = 0
     while True:
-        # The git base command which is the same for all menu items
-        git = ["git", "-C", str(c.drinkdir)]
-        # Populate the menu
-        git_cmd = git_menu_items(c, git)
+        # Populate the menu. The changed files are read while a fetch may be
+        # running in the background.
+        await model.refresh()
+        git_cmd = git_menu_items(c, ag.git, model.changed, model.shown())
+        if footer := model.footer():
+            notice(f" {footer}", no_dedent=True)
+        for line in ag.progress():
+            notice(f" [dim]{line}[/dim]", no_dedent=True)
         debug(f"git_cmd: {git_cmd}")
         try:
-            reply = input_function()
+            reply = await ainput(input_function)
         except EOFError:
-            return 0
+            return await ag.wait() or ret
         debug(f"reply: {reply}")
-        if reply == "1":
-            return 0
-        if reply in git_cmd:
-            debug(f"calling: {' '.join(git_cmd[reply])}")
-            ret = call(git_cmd[reply])
-            # git will be killed with signal 13 (SIGPIPE) when there is a lot
-            # of output and 'q' is pressed early (broken pipe). We can ignore
-            # that.
-            if ret not in [-13, 0]:
-                err(f"git returned error {ret}")
-            else:
-                ret = 0
-        elif reply == "4":
-            if unclean(c):
-                err("Stopping automerge")
-                continue
-            debug("git fetch from base")
-            ret = call(git_cmd["2"])
-            if ret != 0:
-                err(f"git returned error {ret} when fetching from base")
-                err("Stopping automerge")
-                continue
-            branches = get_branches(c)
-            debug(f"found branches: {branches}")
-            for branch in branches:
-                ret = call(git + ["merge", branch])
-                if ret != 0:
-                    err(f"error {ret} when trying to merge {branch}")
-                    err("Stopping automerge")
-                    continue
-        else:
-            err(f"Invalid menu item selected: {reply}")
-            ret = 99
+        if model.command(reply):
+            continue
+        # Several items can be given at once, they run one after the other
+        for item in reply.replace(",", " ").split() or [reply]:
+            if item == "1":
+                return await ag.wait() or ret
+            if (ret := await _menu_action(ag, git_cmd, item)) != 0:
+                break
         # Prevent showing the input prompt again when there is no tty.
         # Even in case of no tty we want to ask for input() above to support
         # things like "drink -g <<<7"
         if not sys.stdin.isatty():
             debug("no tty, exit from loop")
-            return ret
+            return await ag.wait() or ret
+
+
+def menu(c: Config, input_function: Callable) -> int:
+    """Interactive menu to run git commands on drink objects
+
+    git runs asynchronously: a fetch continues in the background while the
+    menu is used, read-only queries do not wait for it, and commands that
+    change the repository run one at a time.
+    """
+    # asyncio costs more to import than all of drink, so it is only loaded for
+    # the menu
+    import asyncio
+
+    return asyncio.run(_menu(c, input_function))
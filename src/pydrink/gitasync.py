@@ -0,0 +1,159 @@
+from collections.abc import Coroutine
+from subprocess import PIPE, CompletedProcess
+from typing import Any, Callable, Optional
+import asyncio
+import os
+import threading
+import time
+
+from pydrink.config import Config
+from pydrink.gitbackend import backend
+from pydrink.log import debug, err, notice
+
+
+class BackgroundTask:
+    """A git action that runs while the menu stays usable"""
+
+    def __init__(self, name: str, coro: Coroutine[Any, Any, int]):
+        self.name = name
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.task = asyncio.ensure_future(coro)
+        self.task.add_done_callback(self._done)
+
+    def _done(self, task: "asyncio.Future[int]"):
+        self.end = time.perf_counter()
+
+    def progress(self) -> str:
+        if self.end is None:
+            return f"{self.name}: running for {time.perf_counter() - self.start:.1f}s"
+        if self.task.cancelled():
+            return f"{self.name}: cancelled"
+        if (e := self.task.exception()) is not None:
+            return f"{self.name}: failed: {e}"
+        if (ret := self.task.result()) != 0:
+            return f"{self.name}: failed with error {ret}"
+        return f"{self.name}: done in {self.end - self.start:.1f}s"
+
+
+class AsyncGit:
+    """Runs git as asyncio subprocesses, for the interactive git menu
+
+    Read-only commands run concurrently, with the optional locks of git
+    disabled, so they neither wait for each other nor for a running fetch.
+    Mutating commands are serialized. Long-running actions can be started in
+    the background with start().
+    """
+
+    def __init__(self, c: Config):
+        self.config = c
+        self.git = ["git", "-C", str(c.drinkdir)]
+        self.background: list[BackgroundTask] = []
+        self._lock = asyncio.Lock()
+
+    async def _spawn(
+        self, cmd: list[str], readonly: bool, capture: bool
+    ) -> tuple[int, bytes, bytes]:
+        gb = backend(self.config)
+        env = dict(os.environ, GIT_OPTIONAL_LOCKS="0") if readonly else None
+        pipe = PIPE if capture else None
+        debug("running %s", cmd)
+        start = time.perf_counter()
+        proc = await asyncio.create_subprocess_exec(
+            *cmd, env=env, stdout=pipe, stderr=pipe
+        )
+        out, errout = await proc.communicate()
+        gb.forks += 1
+        gb.elapsed += time.perf_counter() - start
+        if not readonly:
+            gb.invalidate()
+        assert proc.returncode is not None
+        return proc.returncode, out or b"", errout or b""
+
+    async def _exec(
+        self, cmd: list[str], readonly: bool, capture: bool
+    ) -> tuple[int, bytes, bytes]:
+        if readonly:
+            return await self._spawn(cmd, readonly, capture)
+        if self._lock.locked():
+            debug("waiting for the running git command to finish")
+        async with self._lock:
+            return await self._spawn(cmd, readonly, capture)
+
+    async def run(self, cmd: list[str], readonly: bool = True) -> CompletedProcess:
+        """Run a git command and capture its output as text"""
+        ret, out, errout = await self._exec(cmd, readonly, capture=True)
+        return CompletedProcess(cmd, ret, out.decode(), errout.decode())
+
+    async def call(self, cmd: list[str], readonly: bool = False) -> int:
+        """Run a git command with inherited stdin and stdout"""
+        ret, _, _ = await self._exec(cmd, readonly, capture=False)
+        return ret
+
+    def start(self, name: str, coro: Coroutine[Any, Any, int]) -> BackgroundTask:
+        """Run coro in the background, or join the running task of the same
+        name"""
+        if (bt := self.running(name)) is not None:
+            coro.close()
+            return bt
+        bt = BackgroundTask(name, coro)
+        self.background.append(bt)
+        return bt
+
+    def running(self, name: str) -> Optional[BackgroundTask]:
+        for bt in self.background:
+            if bt.name == name and bt.end is None:
+                return bt
+        return None
+
+    def progress(self) -> list[str]:
+        """Describe the background tasks. Finished ones are reported once."""
+        lines = [bt.progress() for bt in self.background]
+        self.background = [bt for bt in self.background if bt.end is None]
+        return lines
+
+    async def wait(self) -> int:
+        """Wait for all background tasks, return the first error"""
+        ret = 0
+        for bt in list(self.background):
+            if bt.end is None:
+                notice(f"waiting for {bt.name}")
+            result = await bt.task
+            ret = ret or result
+        self.background.clear()
+        return ret
+
+
+async def ainput(input_function: Callable[[], str]) -> str:
+    """Call the blocking input_function without stopping background tasks"""
+    loop = asyncio.get_running_loop()
+    future: asyncio.Future[str] = loop.create_future()
+
+    def resolve(result: Optional[str], e: Optional[BaseException]):
+        if future.done():
+            return
+        if e is not None:
+            future.set_exception(e)
+        else:
+            future.set_result(result or "")
+
+    def read():
+        try:
+            loop.call_soon_threadsafe(resolve, input_function(), None)
+        except BaseException as e:
+            loop.call_soon_threadsafe(resolve, None, e)
+
+    # A daemon thread does not keep drink alive when the menu is interrupted
+    # while waiting for input.
+    threading.Thread(target=read, daemon=True).start()
+    return await future
+
+
+async def fetch(ag: AsyncGit) -> int:
+    """Fetch from base, quietly so it can run in the background"""
+    result = await ag.run(ag.git + ["fetch", "-q", str(ag.config["DRINKBASE"])], False)
+    if result.returncode != 0:
+        err(f"git returned error {result.returncode} when fetching from base")
+        if result.stderr:
+            err(result.stderr)
+    return result.returncode
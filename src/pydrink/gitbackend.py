@@ -0,0 +1,174 @@
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from subprocess import PIPE, CompletedProcess, Popen, call, run
+from threading import Lock
+from typing import IO, Any, Optional, cast
+import atexit
+import time
+
+from pydrink.cache import stat_key
+from pydrink.config import Config
+from pydrink.log import debug
+from pydrink.refs import git_dir
+from pydrink.timing import phase
+
+
+# Commands whose output depends on the files in the worktree
+WORKTREE_COMMANDS = {"status", "diff", "diff-files", "diff-index"}
+
+
+def subcommand(cmd: list[str]) -> str:
+    """Return the git command cmd runs, e. g. "status" for git -C dir status"""
+    args = iter(cmd[1:])
+    for arg in args:
+        if arg in ("-C", "-c"):
+            next(args, None)
+        elif not arg.startswith("-"):
+            return arg
+    return ""
+
+
+class GitBackend:
+    """The single place where drink runs git
+
+    Every git process is started through run() or call(), which count the
+    forks and the time spent. Object and ref lookups are answered by a
+    long-lived "git cat-file --batch-check" process, so they do not need a
+    fork each.
+
+    Within a session(), the output of identical read-only queries is reused
+    until a mutating command runs or the index or HEAD change. Commands that
+    look at the worktree always run, as edits there change neither.
+    """
+
+    def __init__(self, repo: Path):
+        self.repo = repo
+        self.forks = 0
+        self.elapsed = 0.0
+        self.memoize = False
+        self._memo: dict[tuple[str, ...], CompletedProcess] = {}
+        self._memo_key: Any = None
+        self._batch: Optional[Popen] = None
+        self._lock = Lock()
+
+    def _state_key(self) -> Any:
+        gitdir = git_dir(self.repo)
+        return [stat_key(gitdir / "index"), stat_key(gitdir / "HEAD")]
+
+    def invalidate(self):
+        """Forget everything that could have been changed by a mutating
+        command"""
+        self._memo.clear()
+        # Restart the batch process, so it sees new objects and refs
+        self.close()
+
+    def run(
+        self, cmd: list[str], readonly: bool = True, input: Optional[str] = None
+    ) -> CompletedProcess:
+        """Run a git command and capture its output as text, optionally
+        feeding it input"""
+        key = tuple(cmd) if input is None else (*cmd, input)
+        memoize = self.memoize and subcommand(cmd) not in WORKTREE_COMMANDS
+        if memoize and readonly:
+            state = self._state_key()
+            if state != self._memo_key:
+                self._memo.clear()
+                self._memo_key = state
+            elif key in self._memo:
+                debug("reusing result of %s", key)
+                return self._memo[key]
+        start = time.perf_counter()
+        with phase("git"):
+            result = run(cmd, text=True, capture_output=True, input=input)
+        self.forks += 1
+        self.elapsed += time.perf_counter() - start
+        if not readonly:
+            self.invalidate()
+        elif memoize:
+            self._memo[key] = result
+            # Read-only commands like git status may still refresh the
+            # index, which does not change any result.
+            self._memo_key = self._state_key()
+        return result
+
+    def call(self, cmd: list[str], readonly: bool = False) -> int:
+        """Run a git command with inherited stdin and stdout, e. g. for
+        commands the user interacts with"""
+        start = time.perf_counter()
+        with phase("git"):
+            ret = call(cmd)
+        self.forks += 1
+        self.elapsed += time.perf_counter() - start
+        if not readonly:
+            self.invalidate()
+        return ret
+
+    def object_info(self, rev: str) -> Optional[tuple[str, str, int]]:
+        """Return object id, type and size of rev, or None if it does not
+        exist"""
+        if "\n" in rev:
+            return None
+        with self._lock, phase("git"):
+            if self._batch is None or self._batch.poll() is not None:
+                debug("starting git cat-file --batch-check")
+                self._batch = Popen(
+                    ["git", "-C", str(self.repo), "cat-file", "--batch-check"],
+                    stdin=PIPE,
+                    stdout=PIPE,
+                )
+                self.forks += 1
+            stdin = cast(IO[bytes], self._batch.stdin)
+            stdout = cast(IO[bytes], self._batch.stdout)
+            stdin.write(rev.encode() + b"\n")
+            stdin.flush()
+            header = stdout.readline().decode().split()
+        if len(header) != 3 or header[1] == "missing":
+            return None
+        return header[0], header[1], int(header[2])
+
+    def rev_parse(self, rev: str) -> Optional[str]:
+        """Return the object id rev resolves to, or None"""
+        info = self.object_info(rev)
+        return info[0] if info else None
+
+    def close(self):
+        if (proc := self._batch) is None:
+            return
+        if proc.stdin:
+            proc.stdin.close()
+        proc.wait()
+        if proc.stdout:
+            proc.stdout.close()
+        self._batch = None
+
+
+_backends: dict[Path, GitBackend] = {}
+
+
+def backend(c: Config) -> GitBackend:
+    """Return the git backend of the drink repository"""
+    repo = c.drinkdir
+    if (gb := _backends.get(repo)) is None:
+        gb = _backends[repo] = GitBackend(repo)
+    return gb
+
+
+@contextmanager
+def session(c: Config) -> Iterator[GitBackend]:
+    """Reuse results of read-only queries within the with block, which is
+    usually one drink run"""
+    gb = backend(c)
+    gb.memoize = True
+    try:
+        yield gb
+    finally:
+        gb.memoize = False
+        gb.invalidate()
+        debug("%d git processes, %.1f ms", gb.forks, gb.elapsed * 1000)
+
+
+@atexit.register
+def _close_all():
+    for gb in _backends.values():
+        gb.close()
@@ -0,0 +1,197 @@
+from pathlib import Path
+from typing import NamedTuple, Optional
+import hashlib
+import os
+import stat
+import struct
+
+# Reader for the git index file (.git/index), so that the stat information git
+# keeps for every tracked file can be compared to the worktree without forking
+# git. Versions 2, 3 and 4 of the index format are supported.
+
+INDEX_SIGNATURE = b"DIRC"
+# ctime s/ns, mtime s/ns, dev, ino, mode, uid, gid, size, object id, flags
+ENTRY_FORMAT = struct.Struct(">10I20sH")
+FLAG_ASSUME_VALID = 0x8000
+FLAG_EXTENDED = 0x4000
+EXT_FLAG_SKIP_WORKTREE = 0x4000
+# git stores these fields truncated to 32 bit
+MASK32 = 0xFFFFFFFF
+# Bytes read at once when hashing files
+HASH_CHUNK = 1 << 20
+
+
+class InvalidIndex(Exception):
+    """Raised when the index file can not be parsed"""
+
+    pass
+
+
+class IndexEntry(NamedTuple):
+    name: str
+    ctime: int
+    ctime_ns: int
+    mtime: int
+    mtime_ns: int
+    ino: int
+    mode: int
+    uid: int
+    gid: int
+    size: int
+    oid: str
+    stage: int
+    # assume-valid or skip-worktree, git does not look at those files
+    ignore: bool
+
+
+def _varint(data: bytes, pos: int) -> tuple[int, int]:
+    """Decode the offset varint used in index version 4"""
+    c = data[pos]
+    pos += 1
+    val = c & 0x7F
+    while c & 0x80:
+        c = data[pos]
+        pos += 1
+        val = ((val + 1) << 7) | (c & 0x7F)
+    return val, pos
+
+
+def read_index(path: Path) -> list[IndexEntry]:
+    """Return all entries of the git index file at path"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < 12 or data[:4] != INDEX_SIGNATURE:
+        raise InvalidIndex(f"{path} is not a git index")
+    version, count = struct.unpack_from(">II", data, 4)
+    if version not in (2, 3, 4):
+        raise InvalidIndex(f"unsupported index version {version}")
+    entries = []
+    pos = 12
+    name = b""
+    for _ in range(count):
+        start = pos
+        (
+            ctime,
+            ctime_ns,
+            mtime,
+            mtime_ns,
+            _dev,
+            ino,
+            mode,
+            uid,
+            gid,
+            size,
+            oid,
+            flags,
+        ) = ENTRY_FORMAT.unpack_from(data, pos)
+        pos += ENTRY_FORMAT.size
+        ignore = bool(flags & FLAG_ASSUME_VALID)
+        if flags & FLAG_EXTENDED:
+            (ext_flags,) = struct.unpack_from(">H", data, pos)
+            ignore |= bool(ext_flags & EXT_FLAG_SKIP_WORKTREE)
+            pos += 2
+        if version == 4:
+            # The name is stored as the number of bytes to remove from the
+            # previous name, followed by the new suffix.
+            strip, pos = _varint(data, pos)
+            end = data.index(b"\0", pos)
+            name = name[: len(name) - strip] + data[pos:end]
+            pos = end + 1
+        else:
+            end = data.index(b"\0", pos)
+            name = data[pos:end]
+            # Entries are padded with NULs to a multiple of eight bytes
+            pos = start + ((end - start) // 8 + 1) * 8
+        entries.append(
+            IndexEntry(
+                name.decode(errors="surrogateescape"),
+                ctime,
+                ctime_ns,
+                mtime,
+                mtime_ns,
+                ino,
+                mode,
+                uid,
+                gid,
+                size,
+                oid.hex(),
+                (flags >> 12) & 3,
+                ignore,
+            )
+        )
+    return entries
+
+
+def blob_id(p: Path) -> str:
+    """Return the git blob id of the file at p, like git hash-object"""
+    if p.is_symlink():
+        data = os.fsencode(os.readlink(p))
+        h = hashlib.sha1(b"blob %d\0" % len(data))
+        h.update(data)
+        return h.hexdigest()
+    # Hash in chunks, so large files are not read into memory at once
+    with open(p, "rb") as f:
+        h = hashlib.sha1(b"blob %d\0" % os.fstat(f.fileno()).st_size)
+        while chunk := f.read(HASH_CHUNK):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _git_mode(st: os.stat_result) -> int:
+    if stat.S_ISLNK(st.st_mode):
+        return 0o120000
+    if stat.S_ISDIR(st.st_mode):
+        return 0o160000
+    return 0o100755 if st.st_mode & 0o100 else 0o100644
+
+
+def is_modified(worktree: Path, e: IndexEntry, index_mtime: Optional[int]) -> bool:
+    """Tell if a worktree file differs from its index entry, the way
+    git diff-files decides it: by comparing stat information.
+
+    index_mtime is the mtime of the index file in seconds. Entries that are
+    not older than the index could have been changed within the timestamp
+    granularity right after they were staged ("racily clean"). Their content
+    is compared instead.
+    """
+    if e.stage:
+        # unmerged
+        return True
+    try:
+        st = os.lstat(worktree / e.name)
+    except OSError:
+        return True
+    if _git_mode(st) != e.mode:
+        return True
+    if (
+        (st.st_mtime_ns // 1_000_000_000) & MASK32 != e.mtime
+        or (st.st_ctime_ns // 1_000_000_000) & MASK32 != e.ctime
+        or st.st_size & MASK32 != e.size
+        or st.st_ino & MASK32 != e.ino
+        or st.st_uid != e.uid
+        or st.st_gid != e.gid
+    ):
+        return True
+    # Nanoseconds are only recorded if git was built to do so
+    if e.mtime_ns and st.st_mtime_ns % 1_000_000_000 != e.mtime_ns:
+        return True
+    if e.ctime_ns and st.st_ctime_ns % 1_000_000_000 != e.ctime_ns:
+        return True
+    if index_mtime is not None and e.mtime >= index_mtime:
+        return blob_id(worktree / e.name) != e.oid
+    return False
+
+
+def changed_files(
+    worktree: Path, entries: list[IndexEntry], index_mtime: Optional[int]
+) -> list[str]:
+    """Return the names of all index entries that differ from the worktree"""
+    changed = []
+    seen = set()
+    for e in entries:
+        if e.ignore or e.name in seen:
+            continue
+        if is_modified(worktree, e, index_mtime):
+            changed.append(e.name)
+            seen.add(e.name)
+    return changed
@@ -0,0 +1,149 @@
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from glob import has_magic
+from pathlib import Path
+import os
+import shutil
+
+from pydrink.config import Config, KINDS
+from pydrink.log import debug, verbose
+from pydrink.obj import DrinkObject, InvalidDrinkObject, InvalidKind, plan_objects
+from pydrink.plan import LinkPlan
+from pydrink.untracked import IgnoreRules
+
+# Number of threads that copy files into the repository in parallel
+IMPORT_WORKERS = 8
+# ioctl request to share the data blocks of a file on Linux (btrfs, XFS, ...)
+FICLONE = 0x40049409
+
+
+def clone_file(src: Path, dest: Path):
+    """Copy src to dest like shutil.copy(), but as a reflink (copy-on-write)
+    where the filesystem supports it. Refuse to replace dest."""
+    with open(src, "rb") as fsrc, open(dest, "xb") as fdst:
+        try:
+            import fcntl
+
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            cloned = True
+        except (ImportError, OSError):
+            cloned = False
+    if not cloned:
+        shutil.copyfile(src, dest)
+    shutil.copymode(src, dest)
+
+
+def _walk(d: Path, home: Path, rules: IgnoreRules) -> Iterator[Path]:
+    for root, dirs, files in os.walk(d):
+        # Never import repositories of other tools
+        dirs[:] = [
+            x
+            for x in dirs
+            if x != ".git"
+            and not rules.ignored(os.path.relpath(Path(root, x), home), True)
+        ]
+        for name in files:
+            p = Path(root, name)
+            if p.is_symlink():
+                verbose(f"skipping symlink {p}")
+            elif rules.ignored(os.path.relpath(p, home), False):
+                debug("ignoring %s", p)
+            else:
+                yield p
+
+
+def expand_sources(c: Config, kind: str, args: Iterable[str]) -> list[Path]:
+    """Return the files to import for args, relative to the kind directory
+
+    Every argument can be a file or a directory relative to the kind
+    directory or an absolute path inside of it, or a glob pattern relative
+    to it. Directories are imported recursively, skipping symlinks, .git
+    directories and paths matched by the .drinkignore.
+    """
+    if kind not in KINDS:
+        raise InvalidKind
+    base = c.kindDir(kind)
+    rules = IgnoreRules.load(c)
+    files: dict[Path, None] = {}
+    for arg in args:
+        p = Path(arg)
+        if p.is_absolute():
+            if not p.is_relative_to(base):
+                raise InvalidDrinkObject(f"{p} is not inside {base}")
+            p = p.relative_to(base)
+        if has_magic(arg):
+            matches = sorted(base.glob(str(p)))
+            if not matches:
+                raise InvalidDrinkObject(f"{arg} does not match anything")
+        else:
+            matches = [base / p]
+        for m in matches:
+            if m.is_dir() and not m.is_symlink():
+                files.update((f, None) for f in _walk(m, c.home, rules))
+            elif m.is_symlink():
+                raise InvalidDrinkObject(f"{m} is a symlink")
+            else:
+                files[m] = None
+    return [f.relative_to(base) for f in files]
+
+
+def import_objects(
+    c: Config,
+    relpaths: Iterable[Path],
+    kind: str,
+    target: str,
+    workers: int = IMPORT_WORKERS,
+) -> list[DrinkObject]:
+    """Copy many files into the repository in parallel and return the new
+    drink objects. Everything is checked before the first file is copied, and
+    if copying fails, all copies and the directories created for them are
+    removed again."""
+    pairs = [DrinkObject.import_paths(c, r, kind, target) for r in relpaths]
+    for src, _ in pairs:
+        if not src.is_file():
+            raise InvalidDrinkObject(f"{src} is not a file")
+    # Directories created for the copies, parents before their children
+    created: list[Path] = []
+    for d in sorted({dest.parent for _, dest in pairs}):
+        missing = [p for p in [d, *d.parents] if not p.exists()]
+        for p in reversed(missing):
+            if p not in created:
+                created.append(p)
+    copied: list[Path] = []
+
+    def copy(src: Path, dest: Path):
+        debug("copying %s -> %s", src, dest)
+        try:
+            clone_file(src, dest)
+        except FileExistsError:
+            raise
+        except OSError:
+            dest.unlink(missing_ok=True)
+            raise
+        copied.append(dest)
+
+    try:
+        for d in created:
+            d.mkdir(exist_ok=True)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for future in [pool.submit(copy, src, dest) for src, dest in pairs]:
+                future.result()
+    except OSError:
+        for dest in copied:
+            dest.unlink()
+        for d in reversed(created):
+            try:
+                d.rmdir()
+            except OSError:
+                pass
+        raise
+    return [DrinkObject(c, dest) for _, dest in pairs]
+
+
+def link_objects(objects: Iterable[DrinkObject]) -> LinkPlan:
+    """Replace the imported files by symlinks in a single plan and return the
+    applied plan"""
+    plan = LinkPlan()
+    plan_objects(plan, objects, overwrite=True)
+    plan.apply()
+    return plan
@@ -0,0 +1,153 @@
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Optional
+import os
+
+from pydrink.config import BY_TARGET, Config, Deploy, KINDS
+from pydrink.log import debug
+from pydrink.obj import GLOBAL_TARGET, DrinkObject, InvalidDrinkObject, fold_link
+
+# git file mode of symbolic links
+SYMLINK_MODE = "120000"
+
+
+class Inventory:
+    """All tracked drink objects of a repository, classified in a single pass
+
+    The inventory is built from one "git ls-files -z --stage" run. Kind, target
+    and relpath are derived from the index path alone, and link states are
+    resolved by reading every link directory once with os.scandir() instead of
+    checking each link path separately.
+
+    Directory scans are kept, so that linking, pruning and the search for
+    untracked files can share them within one run.
+    """
+
+    def __init__(self, c: Config):
+        self.config = c
+        self.objects: list[DrinkObject] = []
+        self._scans: dict[Path, dict[str, os.DirEntry]] = {}
+        # Link path to repository path of the deployed copies and hardlinks
+        self._copies: Optional[dict[Path, Path]] = None
+
+    def __iter__(self) -> Iterator[DrinkObject]:
+        return iter(self.objects)
+
+    def __len__(self) -> int:
+        return len(self.objects)
+
+    @classmethod
+    def from_ls_files(cls, c: Config, output: str) -> "Inventory":
+        """Build an inventory from the NUL separated output of
+        git ls-files -z --stage
+        """
+        inv = cls(c)
+        drinkdir = c.drinkdir
+        kind_dirs = {k: c.kindDir(k) for k in KINDS}
+        # (name, repopath, kind, target, relpath, linkpath, blob)
+        entries: list[tuple[str, Path, str, str, Path, Path, str]] = []
+        seen: set[str] = set()
+        for record in output.split("\0"):
+            if not record:
+                continue
+            meta, _, name = record.partition("\t")
+            # Unmerged paths show up once per stage
+            if name in seen:
+                continue
+            seen.add(name)
+            mode, blob, _ = meta.split(" ", 2)
+            parts = name.split("/")
+            kind = parts[0]
+            if kind not in kind_dirs or len(parts) < 2:
+                debug("skipping %s: not a drink object", name)
+                continue
+            if parts[1] == BY_TARGET:
+                if len(parts) < 4:
+                    debug("skipping %s: not a drink object", name)
+                    continue
+                target = parts[2]
+                rel = parts[3:]
+            else:
+                target = GLOBAL_TARGET
+                rel = parts[1:]
+            # exception for "drink" during transition from zsh drink to pydrink
+            if mode == SYMLINK_MODE and parts[-1] != "drink":
+                raise InvalidDrinkObject(f"{drinkdir / name} is a symlink")
+            relpath = Path(*rel)
+            linkpath = kind_dirs[kind] / DrinkObject._undotify(relpath)
+            entries.append(
+                (name, drinkdir / name, kind, target, relpath, linkpath, blob)
+            )
+        for name, p, kind, target, relpath, linkpath, blob in entries:
+            if c.deploy(kind, name) != Deploy.Symlink:
+                linked = inv.is_deployed(linkpath, p)
+            else:
+                linked = inv.is_symlink(linkpath) or (
+                    fold_link(linkpath, p, kind_dirs[kind], inv.is_symlink)
+                    is not None
+                )
+            inv.objects.append(
+                DrinkObject.from_parts(c, p, kind, target, relpath, linked, blob)
+            )
+        debug(f"{len(inv.objects)} objects in inventory")
+        return inv
+
+    def scandir(self, d: Path) -> dict[str, os.DirEntry]:
+        """Return the entries of directory d, reading it only once"""
+        if (scan := self._scans.get(d)) is None:
+            try:
+                with os.scandir(d) as it:
+                    scan = {e.name: e for e in it}
+            except (FileNotFoundError, NotADirectoryError):
+                scan = {}
+            self._scans[d] = scan
+        return scan
+
+    def forget(self, d: Path):
+        """Drop the scan of directory d, so it is read again when needed.
+        Copies deployed into it are looked up in the ledger again, too."""
+        self._scans.pop(d, None)
+        self._copies = None
+
+    def is_symlink(self, p: Path) -> bool:
+        """Like Path.is_symlink(), but answered from the directory scans"""
+        entry = self.scandir(p.parent).get(p.name)
+        return entry is not None and entry.is_symlink()
+
+    def is_file(self, p: Path) -> bool:
+        """Tell if p is a regular file, from the scan of its directory"""
+        entry = self.scandir(p.parent).get(p.name)
+        return entry is not None and entry.is_file(follow_symlinks=False)
+
+    def deployed_copies(self) -> dict[Path, Path]:
+        """Return the repository paths of the copies and hardlinks recorded in
+        the ledger, by their link paths"""
+        if self._copies is None:
+            from pydrink.ledger import Ledger
+
+            ledger = Ledger.load(self.config)
+            self._copies = {link: d.repopath for link, d in ledger.copies.items()}
+        return self._copies
+
+    def is_deployed(self, linkpath: Path, repopath: Path) -> bool:
+        """Tell if a copy or hardlink of repopath, as recorded in the ledger,
+        is at linkpath"""
+        copies = self.deployed_copies()
+        return copies.get(linkpath) == repopath and self.is_file(linkpath)
+
+    def is_linked(self, o: DrinkObject) -> bool:
+        """Tell if o is in place the way it is deployed, like from_ls_files()
+        decides it"""
+        linkpath = o.get_linkpath()
+        if o.get_deploy() != Deploy.Symlink:
+            return self.is_deployed(linkpath, o.p)
+        return self.is_symlink(linkpath) or self.fold_link(o) is not None
+
+    def fold_link(self, o: DrinkObject) -> Optional[Path]:
+        """Like DrinkObject.get_fold_link(), answered from the directory
+        scans"""
+        return o.get_fold_link(self.is_symlink)
+
+    def repopaths(self) -> set[Path]:
+        """Return the repository paths of all objects in the inventory"""
+        return {o.p for o in self.objects}
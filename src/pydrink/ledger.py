@@ -0,0 +1,147 @@
+from collections.abc import Iterator
+from pathlib import Path
+from typing import NamedTuple, Optional
+import os
+
+from pydrink.cache import LEDGER, StateCache, stat_key, state_dir
+from pydrink.config import Config, Deploy
+from pydrink.gitindex import blob_id
+from pydrink.inventory import Inventory
+from pydrink.log import debug
+from pydrink.plan import LinkPlan, OpKind
+
+
+class Deployed(NamedTuple):
+    """A copy or hardlink of an object, as drink has created it"""
+
+    repopath: Path
+    commit: str
+    how: Deploy
+    # The blob id of the deployed content
+    blob: str
+    # stat_key() of the deployed file and of the object at that time
+    stat: Optional[list[int]]
+    repo_stat: Optional[list[int]]
+
+
+class Ledger:
+    """Record of every symlink drink has created
+
+    For each link path, the ledger keeps the repository path it points to and
+    the commit that was checked out when it was created. Pruning can then look
+    at the links whose objects are gone from the inventory, instead of scanning
+    every link directory.
+
+    A ledger that could not be loaded is incomplete. It has to be rebuilt from
+    a full scan before it can be used for pruning.
+
+    Copies and hardlinks are kept apart, with the blob id of what was deployed,
+    so changes on either side can be told from each other. They can not be
+    found by a scan, so they are only known from the ledger.
+    """
+
+    def __init__(self, c: Config):
+        self.config = c
+        self.links: dict[Path, tuple[Path, str]] = {}
+        self.copies: dict[Path, Deployed] = {}
+        self.complete = False
+        self._store = StateCache(LEDGER, state_dir())
+
+    @classmethod
+    def load(cls, c: Config) -> "Ledger":
+        ledger = cls(c)
+        data = ledger._store.load()
+        if data and data.get("drinkdir") == str(c.drinkdir):
+            ledger.links = {
+                Path(link): (Path(repo), commit)
+                for link, (repo, commit) in data["links"].items()
+            }
+            ledger.copies = {
+                Path(link): Deployed(Path(repo), commit, Deploy(how), *rest)
+                for link, (repo, commit, how, *rest) in data.get("copies", {}).items()
+            }
+            ledger.complete = True
+        else:
+            debug("no usable ledger")
+        return ledger
+
+    def save(self):
+        self._store.save(
+            {
+                "drinkdir": str(self.config.drinkdir),
+                "links": {
+                    str(link): [str(repo), commit]
+                    for link, (repo, commit) in self.links.items()
+                },
+                "copies": {
+                    str(link): [str(d.repopath), d.commit, d.how.value, *d[3:]]
+                    for link, d in self.copies.items()
+                },
+            }
+        )
+
+    def record(self, link: Path, repopath: Path, commit: str):
+        self.links[link] = (repopath, commit)
+
+    def record_copy(self, link: Path, repopath: Path, commit: str, how: Deploy):
+        """Record the copy or hardlink of repopath at link, as it is now"""
+        # It might have been a symlink before
+        self.links.pop(link, None)
+        self.copies[link] = Deployed(
+            repopath, commit, how, blob_id(link), stat_key(link), stat_key(repopath)
+        )
+
+    def record_plan(self, plan: LinkPlan, commit: str):
+        """Record all symlinks, copies and hardlinks created by an applied
+        plan"""
+        for op in plan.unlinks:
+            # Replaced by whatever the plan put there
+            self.copies.pop(op.path, None)
+        for op in plan.symlinks:
+            assert op.kind == OpKind.Symlink and op.dest is not None
+            self.record(op.path, op.dest, commit)
+        for op in plan.copies:
+            assert op.dest is not None
+            how = Deploy.Copy if op.kind == OpKind.Copy else Deploy.Hardlink
+            self.record_copy(op.path, op.dest, commit, how)
+
+    def link_dirs(self) -> set[Path]:
+        """Return the directories that hold recorded links and copies"""
+        return {link.parent for link in [*self.links, *self.copies]}
+
+    def forget(self, link: Path):
+        self.links.pop(link, None)
+
+    def rebuild(self, inv: Inventory, commit: str):
+        """Record all links that currently point to objects in the inventory
+        and mark the ledger complete"""
+        for o in inv:
+            linkpath = o.get_linkpath()
+            if inv.is_symlink(linkpath) and Path(os.readlink(linkpath)) == o.p:
+                self.record(linkpath, o.p, commit)
+            elif (fold := inv.fold_link(o)) is not None:
+                self.record(fold, Path(os.readlink(fold)), commit)
+        self.complete = True
+
+    def dangling(self, inv: Inventory) -> Iterator[Path]:
+        """Return the recorded links whose objects are no longer in the
+        inventory and do not exist anymore. Only those links are looked at."""
+        tracked = inv.repopaths()
+        for link, (repopath, _) in list(self.links.items()):
+            if repopath in tracked:
+                continue
+            try:
+                dest = Path(os.readlink(link))
+            except OSError:
+                # Removed or replaced by something else than a symlink
+                debug("%s is gone", link)
+                self.forget(link)
+                continue
+            if dest != repopath:
+                debug("%s does not point to %s anymore", link, repopath)
+                self.forget(link)
+                continue
+            if dest.exists():
+                continue
+            debug("%s is dangling", link)
+            yield link
@@ -1,14 +1,27 @@
-import inspect
-from pathlib import Path
-from rich import print
-from rich import console
 from textwrap import dedent
+from typing import TYPE_CHECKING, Optional
+import os
+import sys
+
+if TYPE_CHECKING:
+    from rich.console import Console
 
 DEBUG = False
 QUIET = False
 VERBOSE = False
 
-c = console.Console()
+# Importing rich is by far the most expensive part of starting drink, so the
+# console is only created once something is actually printed through it.
+_console: Optional["Console"] = None
+
+
+def console() -> "Console":
+    global _console
+    if _console is None:
+        from rich.console import Console
+
+        _console = Console()
+    return _console
 
 
 def notice(s: str, no_dedent=False):
@@ -16,30 +29,37 @@ def notice(s: str, no_dedent=False):
     # verbose should override quiet
     if (not QUIET) or VERBOSE:
         if no_dedent:
-            c.print(s)
+            console().print(s)
         else:
-            c.print(dedent(s))
+            console().print(dedent(s))
 
 
 def verbose(s: str):
     """Print additional info that is not strictly necessary"""
     if VERBOSE:
-        c.print("[dim]" + dedent(s) + "[/dim]")
+        console().print("[dim]" + dedent(s) + "[/dim]")
 
 
 def warn(s: str):
-    c.print("! [yellow]" + dedent(s) + "[/yellow]")
+    console().print("! [yellow]" + dedent(s) + "[/yellow]")
 
 
-def debug(s: str):
+def debug(s: object, *args: object):
+    """Print debugging information. In hot code, pass values as args instead
+    of formatting them into s, so no formatting happens unless debugging is
+    enabled."""
     if not DEBUG:
         return
-    caller_frame_record = inspect.stack()[1]
-    frame = caller_frame_record[0]
-    info = inspect.getframeinfo(frame)
-    file = Path(info.filename).name
-    print(f"{file}:{info.lineno} {info.function}(): {s}")
+    from rich import print
+
+    if args:
+        s = str(s) % args
+    # Looking at the caller frame directly is a lot cheaper than
+    # inspect.stack(), which reads the source of every frame.
+    frame = sys._getframe(1)
+    file = os.path.basename(frame.f_code.co_filename)
+    print(f"{file}:{frame.f_lineno} {frame.f_code.co_name}(): {s}")
 
 
 def err(s: str):
-    c.print("[bright_red]" + dedent(s) + "[/bright_red]")
+    console().print("[bright_red]" + dedent(s) + "[/bright_red]")
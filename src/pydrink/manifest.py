@@ -0,0 +1,88 @@
+from collections import defaultdict
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Optional
+
+from pydrink.config import Config
+from pydrink.inventory import Inventory
+from pydrink.obj import GLOBAL_TARGET, DrinkObject
+
+# Rendering the manifests of fewer targets than this is not worth starting
+# worker processes.
+PARALLEL_MIN_TARGETS = 16
+
+# (link path relative to $HOME, repo path relative to DRINKDIR)
+Entry = tuple[str, str]
+# link path -> repo path, plus link paths claimed by more than one object
+Manifest = dict[str, Any]
+
+# Set in every worker process, so the global entries are transferred only
+# once per worker instead of once per target.
+_global_entries: list[Entry] = []
+
+
+def manifest_entries(
+    c: Config, inv: Inventory
+) -> tuple[list[Entry], dict[str, list[Entry]]]:
+    """Return the entries of global objects and those of every target"""
+    rel_dirs = {k: c.kindDir(k, relative=True) for k in {o.kind for o in inv}}
+    global_entries: list[Entry] = []
+    by_target: dict[str, list[Entry]] = defaultdict(list)
+    for o in inv:
+        link = str(rel_dirs[o.kind] / DrinkObject._undotify(o.relpath))
+        entry = (link, str(o.get_repopath(relative=True)))
+        if o.target == GLOBAL_TARGET:
+            global_entries.append(entry)
+        else:
+            by_target[o.target].append(entry)
+    return global_entries, by_target
+
+
+def _render(global_entries: list[Entry], entries: list[Entry]) -> Manifest:
+    links: dict[str, str] = {}
+    conflicts: dict[str, list[str]] = {}
+    for link, repo in global_entries + entries:
+        if (other := links.get(link)) is not None:
+            conflicts.setdefault(link, [other]).append(repo)
+        else:
+            links[link] = repo
+    return {"links": links, "conflicts": conflicts}
+
+
+def _init_worker(global_entries: list[Entry]):
+    global _global_entries
+    _global_entries = global_entries
+
+
+def _render_in_worker(target: str, entries: list[Entry]) -> tuple[str, Manifest]:
+    return target, _render(_global_entries, entries)
+
+
+def render_targets(
+    c: Config,
+    inv: Inventory,
+    targets: Iterable[str],
+    workers: Optional[int] = None,
+) -> dict[str, Manifest]:
+    """Return the link manifest of each target, as if drink -l was run there
+
+    Link paths are relative to $HOME and repo paths relative to DRINKDIR, as
+    both can differ between hosts. It is assumed that all targets use the
+    same kind directories as the local configuration.
+    """
+    global_entries, by_target = manifest_entries(c, inv)
+    targets = sorted(set(targets))
+    if len(targets) < PARALLEL_MIN_TARGETS or workers == 1:
+        return {t: _render(global_entries, by_target.get(t, [])) for t in targets}
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(global_entries,)
+    ) as pool:
+        futures = [
+            pool.submit(_render_in_worker, t, by_target.get(t, [])) for t in targets
+        ]
+        return dict(f.result() for f in futures)
+
+
+def render(c: Config, inv: Inventory, target: str) -> Manifest:
+    """Return the link manifest of a single target"""
+    return render_targets(c, inv, [target])[target]
@@ -0,0 +1,102 @@
+from pathlib import Path
+from typing import IO, Any, Iterator, cast
+import os
+import shutil
+import tarfile
+
+from pydrink.config import Config
+from pydrink.inventory import Inventory
+from pydrink.log import debug
+from pydrink.manifest import render
+
+
+class ManifestConflict(Exception):
+    """Raised when a link path is claimed by more than one object"""
+
+    pass
+
+
+def deployment(c: Config, inv: Inventory, target: str) -> Iterator[tuple[Path, Path]]:
+    """Return (link path relative to the home directory, repo path) of every
+    object deployed on target, parents before children"""
+    m = render(c, inv, target)
+    if m["conflicts"]:
+        raise ManifestConflict(f"conflicting objects: {m['conflicts']}")
+    for link in sorted(m["links"]):
+        yield Path(link), c.drinkdir / m["links"][link]
+
+
+def link_dest(c: Config, link: Path, repopath: Path) -> Path:
+    """Return what the symlink at link (relative to the home directory) should
+    point to. If DRINKDIR is inside the home directory, the symlink is made
+    relative, so the tree works wherever the home directory ends up."""
+    home = c.home
+    if repopath.is_relative_to(home):
+        return Path(os.path.relpath(repopath, (home / link).parent))
+    return repopath
+
+
+def materialize_dir(
+    c: Config, inv: Inventory, target: str, root: Path, copy: bool = False
+) -> int:
+    """Deploy the objects of target into root as if it was the home directory,
+    as symlinks or, with copy=True, as copies. Return the number of objects."""
+    n = 0
+    for link, repopath in deployment(c, inv, target):
+        dest = root / link
+        debug("materializing %s", dest)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        if copy:
+            # Like symlink_to(), refuse to replace existing files
+            with open(repopath, "rb") as src, open(dest, "xb") as dst:
+                shutil.copyfileobj(src, dst)
+            shutil.copystat(repopath, dest)
+        else:
+            dest.symlink_to(link_dest(c, link, repopath))
+        n += 1
+    return n
+
+
+def _tarinfo(name: str, kind: bytes, mode: int, mtime: float) -> tarfile.TarInfo:
+    info = tarfile.TarInfo(name)
+    info.type = kind
+    info.mode = mode
+    info.mtime = int(mtime)
+    return info
+
+
+def materialize_tar(
+    c: Config,
+    inv: Inventory,
+    target: str,
+    out: IO[bytes],
+    copy: bool = False,
+    compression: str = "",
+) -> int:
+    """Like materialize_dir(), but write the tree as a tar stream to out,
+    optionally compressed with "gz", "bz2" or "xz". File contents are streamed
+    from the repository, nothing is staged on disk. Entries are owned by uid 0
+    and sorted, so the archive only depends on the repository."""
+    n = 0
+    dirs: set[Path] = set()
+    with tarfile.open(
+        fileobj=out, mode=cast(Any, f"w|{compression}"), format=tarfile.PAX_FORMAT
+    ) as tar:
+        for link, repopath in deployment(c, inv, target):
+            st = repopath.stat()
+            for d in reversed(list(link.parents)[:-1]):
+                if d not in dirs:
+                    tar.addfile(_tarinfo(str(d), tarfile.DIRTYPE, 0o755, st.st_mtime))
+                    dirs.add(d)
+            if copy:
+                mode = st.st_mode & 0o777
+                info = _tarinfo(str(link), tarfile.REGTYPE, mode, st.st_mtime)
+                info.size = st.st_size
+                with open(repopath, "rb") as f:
+                    tar.addfile(info, f)
+            else:
+                info = _tarinfo(str(link), tarfile.SYMTYPE, 0o777, st.st_mtime)
+                info.linkname = str(link_dest(c, link, repopath))
+                tar.addfile(info)
+            n += 1
+    return n
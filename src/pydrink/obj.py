@@ -1,12 +1,16 @@
 from enum import Enum
 from pathlib import Path
 from textwrap import dedent
-from typing import Optional
+from typing import TYPE_CHECKING, Callable, Iterable, Optional
+import os
 import shutil
-import filecmp
 
-from pydrink.config import KINDS, BY_TARGET, Config
+from pydrink.config import KINDS, BY_TARGET, Config, Deploy
 from pydrink.log import debug, err
+from pydrink.plan import LinkPlan
+
+if TYPE_CHECKING:
+    from pydrink.compare import ContentComparer
 
 GLOBAL_TARGET = "global"
 DOT_PREFIX = "dot"
@@ -52,6 +56,10 @@ class DrinkObject:
 
     Target in this context always means a context in which an object should be
     symlinked into the environment, usually but not necessarily a hostname.
+
+    Objects can be deployed as copies or hardlinks instead of symlinks (see
+    DEPLOY). Those count as linked if the ledger has recorded deploying them
+    and a regular file is in place.
     """
 
     def __init__(self, c: Config, p: Path):
@@ -73,6 +81,8 @@ class DrinkObject:
         self.state: Optional[ObjectState] = None
         self.kind: str = ""
         self.target: str = ""
+        # The git blob id, if known from the index
+        self.blob: str = ""
         self.update()
         self.check()
 
@@ -88,14 +98,14 @@ class DrinkObject:
 
     def check(self):
         if not self.is_in_drinkdir():
-            raise InvalidDrinkObject(f"{self.p} is not in {self.config['DRINKDIR']}")
+            raise InvalidDrinkObject(f"{self.p} is not in {self.config.drinkdir}")
         try:
             _ = self.relpath, self.state, self.kind, self.target
         except AttributeError as e:
             raise InvalidDrinkObject(f"DrinkObject is incomplete: {e}")
 
     def is_in_drinkdir(self) -> bool:
-        return self.p.is_relative_to(self.config["DRINKDIR"])
+        return self.p.is_relative_to(self.config.drinkdir)
 
     def detect_relpath(self) -> Path:
         """Return the part of the object path that is below the
@@ -103,12 +113,12 @@ class DrinkObject:
         """
         c = self.config
         relpath = self.p.relative_to(c.drinkdir)
-        debug(f"relpath: {relpath}")
+        debug("relpath: %s", relpath)
         if relpath.parts[1] == BY_TARGET:
-            debug(f"{relpath} has BY_TARGET")
+            debug("%s has BY_TARGET", relpath)
             return Path(*relpath.parts[3:])
         else:
-            debug(f"{relpath} is global")
+            debug("%s is global", relpath)
             return Path(*relpath.parts[1:])
 
     def detect_kind(self) -> str:
@@ -128,19 +138,35 @@ class DrinkObject:
         parts = self.p.relative_to(c.drinkdir).parts
         if parts[1] == BY_TARGET:
             target = parts[2]
-            debug(f"target is {target}")
+            debug("target is %s", target)
             return target
         else:
             return GLOBAL_TARGET
 
-    def detect_state(self) -> ObjectState:
-        if self.get_linkpath().is_symlink():
-            if self.target == self.config["TARGET"]:
+    def detect_state(self, linked: Optional[bool] = None) -> ObjectState:
+        """Return the state of the object. If it is already known whether the
+        link path is a symlink, pass it as linked to avoid another lstat."""
+        if linked is None:
+            linkpath = self.get_linkpath()
+            if self.get_deploy() != Deploy.Symlink:
+                from pydrink.ledger import Ledger
+
+                d = Ledger.load(self.config).copies.get(linkpath)
+                linked = (
+                    d is not None
+                    and d.repopath == self.p
+                    and linkpath.is_file()
+                    and not linkpath.is_symlink()
+                )
+            else:
+                linked = linkpath.is_symlink() or self.get_fold_link() is not None
+        if linked:
+            if self.target == self.config.target:
                 return ObjectState.ManagedHere
             else:
                 return ObjectState.ManagedOther
         else:
-            if self.target in (self.config["TARGET"], GLOBAL_TARGET):
+            if self.target in (self.config.target, GLOBAL_TARGET):
                 return ObjectState.ManagedPending
             else:
                 return ObjectState.ManagedOther
@@ -156,6 +182,31 @@ class DrinkObject:
         self.target = self.detect_target()
         self.state = self.detect_state()
 
+    @classmethod
+    def from_parts(
+        cls,
+        c: Config,
+        p: Path,
+        kind: str,
+        target: str,
+        relpath: Path,
+        linked: bool,
+        blob: str = "",
+    ) -> "DrinkObject":
+        """Create a drink object from an already classified repository path
+        without touching the filesystem. Used for bulk construction by the
+        inventory, where kind, target and link state are known up front.
+        """
+        o = cls.__new__(cls)
+        o.config = c
+        o.p = p
+        o.relpath = relpath
+        o.kind = kind
+        o.target = target
+        o.blob = blob
+        o.state = o.detect_state(linked)
+        return o
+
     @staticmethod
     def _dotify(p: Path) -> Path:
         """Return same path, but with all elements prefixed with DOT_PREFIX in
@@ -171,19 +222,34 @@ class DrinkObject:
         """Return the path that this objects is or should be linked to"""
         return self.config.kindDir(self.kind) / self._undotify(self.relpath)
 
+    def get_deploy(self) -> Deploy:
+        """Return how this object is deployed"""
+        return self.config.deploy(
+            self.kind, str(self.p.relative_to(self.config.drinkdir))
+        )
+
+    def get_fold_link(
+        self, is_symlink: Callable[[Path], bool] = Path.is_symlink
+    ) -> Optional[Path]:
+        """Return the symlink of the folded directory this object is linked
+        through, if any"""
+        return fold_link(
+            self.get_linkpath(), self.p, self.config.kindDir(self.kind), is_symlink
+        )
+
     def get_repopath(self, relative: bool = False) -> Path:
         """Return the path that this object has or should have inside the repo"""
         if self.target == GLOBAL_TARGET:
             if relative:
                 return Path(self.kind) / self.relpath
             else:
-                return self.config["DRINKDIR"] / self.kind / self.relpath
+                return self.config.drinkdir / self.kind / self.relpath
         else:
             if relative:
                 return Path(self.kind) / BY_TARGET / self.target / self.relpath
             else:
                 return (
-                    self.config["DRINKDIR"]
+                    self.config.drinkdir
                     / self.kind
                     / BY_TARGET
                     / self.target
@@ -198,48 +264,127 @@ class DrinkObject:
         and commit.
         The path must not be inside DRINKDIR.
         """
+        src_path, dest_path = cls.import_paths(c, relpath, kind, target)
+        if src_path.is_dir():
+            raise InvalidDrinkObject(f"{src_path} is a directory")
+        if not dest_path.parent.exists():
+            dest_path.parent.mkdir(parents=True)
+        debug(f"copying {src_path} -> {dest_path}")
+        shutil.copy(src_path, dest_path)
+        return DrinkObject(c, dest_path)
+
+    @classmethod
+    def import_paths(
+        cls, c: Config, relpath: Path, kind: str, target: str
+    ) -> tuple[Path, Path]:
+        """Return the source and repository path for importing relpath, which
+        is relative to the kind directory"""
         if relpath.is_absolute():
             raise InvalidDrinkObject(f"{relpath} is an absolute path")
         debug(f"relpath: {relpath}")
+        if kind not in KINDS:
+            raise InvalidKind
         if target == GLOBAL_TARGET:
             dest_target = Path("")
         else:
             dest_target = Path(BY_TARGET) / target
-        src_path = Path.home() / c.kindDir(kind) / relpath
+        src_path = c.kindDir(kind) / relpath
         debug(f"src_path: {src_path}")
-        if src_path.is_dir():
-            raise InvalidDrinkObject(f"{src_path} is a directory")
         dest_path = c.drinkdir / kind / dest_target / relpath
         dest_path = cls._dotify(dest_path)
         debug(f"dotified dest_path: {dest_path}")
         if dest_path.exists():
             raise InvalidDrinkObject(f"{dest_path} already exists")
-        if kind not in KINDS:
-            raise InvalidKind
-        if not dest_path.parent.exists():
-            dest_path.parent.mkdir(parents=True)
-        debug(f"copying {src_path} -> {dest_path}")
-        shutil.copy(src_path, dest_path)
-        # FIXME: here we should probably call git.add_object(newobject) before
-        # returning
-        return DrinkObject(c, dest_path)
-
-    def link(self, overwrite: bool = False):
-        if self.target != self.config["TARGET"] and self.target != GLOBAL_TARGET:
-            debug(f"Object target {self.target} is not current nor global target")
-            return
-        if self.state == ObjectState.ManagedPending:
-            fromm = self.get_linkpath().absolute()
-            debug(f"creating directory {fromm.parent}")
-            fromm.parent.mkdir(parents=True, exist_ok=True)
-            to = self.get_repopath().absolute()
-            debug(f"linking {fromm} -> {to}")
-            if fromm.exists() and overwrite:
-                if filecmp.cmp(fromm, to, shallow=False):
-                    fromm.unlink()
-                else:
-                    err(f"{fromm} exists and is different from {to}")
-                    return
-            fromm.symlink_to(to)
+        return src_path, dest_path
+
+    def plan_link(
+        self,
+        plan: LinkPlan,
+        overwrite: bool = False,
+        comparer: Optional["ContentComparer"] = None,
+    ) -> bool:
+        """Add the operations needed to link this object to plan. With
+        overwrite, a file in place of the link is replaced if it has the same
+        content as the object. Return False if a file is in the way, so
+        nothing was added."""
+        if self.target != self.config.target and self.target != GLOBAL_TARGET:
+            debug("Object target %s is not current nor global target", self.target)
+            return True
+        if self.state != ObjectState.ManagedPending:
+            return True
+        fromm = self.get_linkpath().absolute()
+        to = self.get_repopath().absolute()
+        how = self.get_deploy()
+        debug("linking %s -> %s (%s)", fromm, to, how.value)
+        if how != Deploy.Symlink and fromm.is_symlink() and fromm.readlink() == to:
+            # Deployed as a symlink so far
+            plan.unlink(fromm)
+        elif fromm.exists() and overwrite:
+            if comparer is None:
+                from pydrink.compare import ContentComparer
+
+                comparer = ContentComparer(self.config)
+            if comparer.same(fromm, to):
+                plan.unlink(fromm)
+            else:
+                err(f"{fromm} exists and is different from {to}")
+                return False
+        elif os.path.lexists(fromm) and not plan.replaces(fromm):
+            err(f"{fromm} exists, not replacing it with {to}")
+            return False
+        if how == Deploy.Copy:
+            plan.copy(fromm, to)
+        elif how == Deploy.Hardlink:
+            plan.hardlink(fromm, to)
+        else:
+            plan.symlink(fromm, to)
+        return True
+
+    def link(self, overwrite: bool = False) -> LinkPlan:
+        """Link this object and return the applied plan"""
+        plan = LinkPlan()
+        self.plan_link(plan, overwrite)
+        plan.apply()
         self.update()
         self.check()
+        return plan
+
+
+def fold_link(
+    linkpath: Path,
+    repopath: Path,
+    root: Path,
+    is_symlink: Callable[[Path], bool] = Path.is_symlink,
+) -> Optional[Path]:
+    """Return the directory above linkpath, below root, that is a symlink to
+    the matching directory above repopath"""
+    link, repo = linkpath.parent, repopath.parent
+    while link != root and link.is_relative_to(root):
+        if is_symlink(link):
+            return link if Path(os.readlink(link)) == repo else None
+        link, repo = link.parent, repo.parent
+    return None
+
+
+def plan_objects(
+    plan: LinkPlan, objects: Iterable[DrinkObject], overwrite: bool = False
+) -> int:
+    """Add the operations needed to link objects to plan. With overwrite, the
+    files in place of pending links are compared to the objects in parallel
+    first. Return the number of objects that are not linked, because a
+    different file is in the way."""
+    objects = [o for o in objects if o.state == ObjectState.ManagedPending]
+    comparer = None
+    if overwrite and objects:
+        from pydrink.compare import ContentComparer
+
+        comparer = ContentComparer(objects[0].config)
+        existing = [o for o in objects if o.get_linkpath().exists()]
+        comparer.compare_all((o.get_linkpath(), o.get_repopath()) for o in existing)
+    refused = 0
+    for o in objects:
+        if not o.plan_link(plan, overwrite, comparer):
+            refused += 1
+    if comparer is not None:
+        comparer.save()
+    return refused
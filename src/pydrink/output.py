@@ -0,0 +1,116 @@
+from pathlib import Path
+from types import TracebackType
+from typing import IO, Any, Optional
+import json
+import sys
+import time
+
+from pydrink.config import Config, KINDS
+from pydrink.obj import GLOBAL_TARGET, DrinkObject, InvalidDrinkObject, ObjectState
+
+# Listings are written without rich, so nothing is parsed for markup and
+# thousands of lines cost little more than the write itself.
+
+FORMATS = ("plain", "json", "ndjson")
+# The fields of every object record, in this order
+FIELDS = ("kind", "target", "relpath", "state", "link", "repo")
+# Seconds after which buffered records are flushed, so readers of a pipe see
+# them while a slow listing is still running
+FLUSH_INTERVAL = 0.2
+
+
+def object_record(o: DrinkObject) -> dict[str, Optional[str]]:
+    """Return the record of a tracked object"""
+    state = o.state
+    # Global objects are never ManagedOther for not being linked, so a linked
+    # one is as much in place here as one of TARGET
+    if state == ObjectState.ManagedOther and o.target == GLOBAL_TARGET:
+        state = ObjectState.ManagedHere
+    return {
+        "kind": o.kind,
+        "target": o.target,
+        "relpath": str(o.relpath),
+        "state": state.name if state else None,
+        "link": str(o.get_linkpath()),
+        "repo": str(o.p),
+    }
+
+
+def repo_record(c: Config, path: str, state: str) -> dict[str, Optional[str]]:
+    """Return the record of a path relative to DRINKDIR, which need not be a
+    valid object"""
+    parts = Path(path).parts
+    record: dict[str, Optional[str]] = dict.fromkeys(FIELDS)
+    record.update(state=state, relpath=path, repo=str(c.drinkdir / path))
+    if len(parts) < 2 or parts[0] not in KINDS:
+        return record
+    try:
+        o = DrinkObject(c, c.drinkdir / path)
+    except InvalidDrinkObject:
+        return record
+    record.update(
+        kind=o.kind,
+        target=o.target,
+        relpath=str(o.relpath),
+        link=str(o.get_linkpath()),
+    )
+    return record
+
+
+def home_record(c: Config, path: str, state: str) -> dict[str, Optional[str]]:
+    """Return the record of a path in $HOME, e. g. an untracked file"""
+    p = Path(path)
+    record: dict[str, Optional[str]] = dict.fromkeys(FIELDS)
+    record.update(state=state, relpath=path, link=path)
+    # The innermost kind directory, as ~/bin is inside ~ of conf
+    kinds = [k for k in KINDS if p.is_relative_to(c.kindDir(k))]
+    if kinds:
+        kind = max(kinds, key=lambda k: len(c.kindDir(k).parts))
+        record.update(kind=kind, relpath=str(p.relative_to(c.kindDir(kind))))
+    return record
+
+
+class Writer:
+    """Writes the records of a listing to stdout as they are produced
+
+    plain prints what drink always printed, one line per record. ndjson
+    prints one JSON object per line, json a single JSON array.
+    """
+
+    def __init__(self, fmt: str = "plain", out: Optional[IO[str]] = None):
+        if fmt not in FORMATS:
+            raise ValueError(f"unknown format {fmt}")
+        self.fmt = fmt
+        self.out = out or sys.stdout
+        self.count = 0
+        self._flushed = time.monotonic()
+
+    def write(self, record: dict[str, Any], plain: str):
+        """Write record, or plain in the plain format"""
+        if self.fmt == "plain":
+            line = plain
+        elif self.fmt == "ndjson":
+            line = json.dumps(record)
+        else:
+            line = ("[" if self.count == 0 else ",") + json.dumps(record)
+        self.out.write(line + "\n")
+        self.count += 1
+        if (now := time.monotonic()) - self._flushed > FLUSH_INTERVAL:
+            self.out.flush()
+            self._flushed = now
+
+    def close(self):
+        if self.fmt == "json":
+            self.out.write("[]\n" if self.count == 0 else "]\n")
+        self.out.flush()
+
+    def __enter__(self) -> "Writer":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc: Optional[BaseException],
+        tb: Optional[TracebackType],
+    ):
+        self.close()
@@ -0,0 +1,217 @@
+from collections.abc import Iterator
+from enum import Enum
+from pathlib import Path
+from threading import Lock
+from typing import NamedTuple, Optional
+import os
+import shutil
+
+from pydrink.log import debug, err
+
+# Number of threads that create symlinks in parallel
+LINK_WORKERS = 8
+# Files replaced by a symlink are moved aside under this name until the whole
+# plan has been applied, so they can be restored. If such a file exists
+# already, e. g. left by an interrupted run, a number is appended.
+BACKUP_SUFFIX = ".drink-backup"
+
+
+def backup_path(p: Path) -> Path:
+    """Return a name p can be moved aside to without replacing anything"""
+    backup = p.with_name(p.name + BACKUP_SUFFIX)
+    n = 0
+    while os.path.lexists(backup):
+        n += 1
+        backup = p.with_name(f"{p.name}{BACKUP_SUFFIX}.{n}")
+    return backup
+
+
+class OpKind(Enum):
+    Mkdir = 1
+    Unlink = 2
+    Symlink = 3
+    Copy = 4
+    Hardlink = 5
+
+
+class LinkOp(NamedTuple):
+    kind: OpKind
+    path: Path
+    # The path a symlink points to, or the file a copy or hardlink is made of
+    dest: Optional[Path] = None
+
+    def __str__(self) -> str:
+        if self.kind == OpKind.Symlink:
+            return f"symlink {self.path} -> {self.dest}"
+        if self.dest is not None:
+            return f"{self.kind.name.lower()} {self.path} from {self.dest}"
+        return f"{self.kind.name.lower()} {self.path}"
+
+
+class LinkPlan:
+    """All filesystem operations needed to link a set of drink objects
+
+    The plan is computed without changing anything, so it can be shown to the
+    user before it is applied. Directories are created only once, no matter
+    how many objects are linked into them.
+
+    Applying the plan first removes the symlinks of folded directories that
+    are unfolded, creates the directories in order and then runs unlink
+    operations, followed by symlink, copy and hardlink operations, in
+    parallel. Every operation is recorded in a
+    journal, and if one of them fails, everything done so far is rolled back.
+    """
+
+    def __init__(self):
+        self.mkdirs: set[Path] = set()
+        # Symlinks to directories that are replaced by real directories
+        self.unfolds: list[LinkOp] = []
+        self.unlinks: list[LinkOp] = []
+        self.symlinks: list[LinkOp] = []
+        # Copies and hardlinks
+        self.copies: list[LinkOp] = []
+        # Directories known to exist
+        self._existing: set[Path] = set()
+        self._journal: list[tuple[LinkOp, Optional[Path]]] = []
+        self._lock = Lock()
+
+    def __iter__(self) -> Iterator[LinkOp]:
+        yield from self.unfolds
+        # Parents sort before their children
+        for d in sorted(self.mkdirs):
+            yield LinkOp(OpKind.Mkdir, d)
+        yield from self.unlinks
+        yield from self.symlinks
+        yield from self.copies
+
+    def __len__(self) -> int:
+        ops = self.unfolds + self.unlinks + self.symlinks + self.copies
+        return len(self.mkdirs) + len(ops)
+
+    def _unfolded(self, d: Path) -> bool:
+        return any(d.is_relative_to(op.path) for op in self.unfolds)
+
+    def need_dir(self, d: Path):
+        """Make sure directory d exists before any symlink is created"""
+        missing = []
+        while d not in self._existing and d not in self.mkdirs:
+            if d.is_dir() and not self._unfolded(d):
+                self._existing.add(d)
+                break
+            missing.append(d)
+            d = d.parent
+        self.mkdirs.update(missing)
+
+    def replaces(self, p: Path) -> bool:
+        """Tell if whatever is at p now is removed by the plan before links
+        are created"""
+        return self._unfolded(p) or any(op.path == p for op in self.unlinks)
+
+    def unlink(self, p: Path):
+        self.unlinks.append(LinkOp(OpKind.Unlink, p))
+
+    def unfold(self, p: Path):
+        """Remove the symlink p to a directory before any directory is
+        created, so a real directory can take its place"""
+        self.unfolds.append(LinkOp(OpKind.Unlink, p))
+        self._existing = {d for d in self._existing if not d.is_relative_to(p)}
+
+    def symlink(self, p: Path, dest: Path):
+        self.need_dir(p.parent)
+        self.symlinks.append(LinkOp(OpKind.Symlink, p, dest))
+
+    def copy(self, p: Path, src: Path):
+        self.need_dir(p.parent)
+        self.copies.append(LinkOp(OpKind.Copy, p, src))
+
+    def hardlink(self, p: Path, src: Path):
+        self.need_dir(p.parent)
+        self.copies.append(LinkOp(OpKind.Hardlink, p, src))
+
+    def _run(self, op: LinkOp):
+        backup = None
+        if op.kind == OpKind.Mkdir:
+            try:
+                op.path.mkdir()
+            except FileExistsError:
+                if not op.path.is_dir():
+                    raise
+                # Somebody else was faster, nothing to roll back
+                return
+        elif op.kind == OpKind.Unlink:
+            backup = backup_path(op.path)
+            os.replace(op.path, backup)
+        elif op.kind == OpKind.Symlink:
+            assert op.dest is not None
+            op.path.symlink_to(op.dest)
+        elif op.kind == OpKind.Copy:
+            assert op.dest is not None
+            # Like symlink_to(), refuse to replace existing files
+            with open(op.dest, "rb") as src, open(op.path, "xb") as dst:
+                try:
+                    shutil.copyfileobj(src, dst)
+                    shutil.copymode(op.dest, op.path)
+                except OSError:
+                    # Not in the journal yet, so nothing else removes it
+                    op.path.unlink()
+                    raise
+        elif op.kind == OpKind.Hardlink:
+            assert op.dest is not None
+            os.link(op.dest, op.path)
+        with self._lock:
+            self._journal.append((op, backup))
+
+    def _rollback(self):
+        for op, backup in reversed(self._journal):
+            debug("rolling back: %s", op)
+            try:
+                if op.kind == OpKind.Mkdir:
+                    op.path.rmdir()
+                elif op.kind == OpKind.Unlink:
+                    assert backup is not None
+                    os.replace(backup, op.path)
+                else:
+                    op.path.unlink()
+            except OSError as e:
+                err(f"Could not roll back {op}: {e}")
+        self._journal.clear()
+
+    def _run_parallel(self, ops: list[LinkOp], workers: int):
+        if not ops:
+            return
+        errors: list[OSError] = []
+
+        def run(op: LinkOp):
+            try:
+                self._run(op)
+            except OSError as e:
+                errors.append(e)
+
+        # concurrent.futures is slow to import and often not needed at all
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(run, ops))
+        if errors:
+            raise errors[0]
+
+    def apply(self, workers: int = LINK_WORKERS):
+        """Apply all operations of the plan. Raises OSError after rolling
+        back if any of them fails."""
+        try:
+            for op in self.unfolds:
+                debug("unfolding %s", op.path)
+                self._run(op)
+            for d in sorted(self.mkdirs):
+                debug("creating directory %s", d)
+                self._run(LinkOp(OpKind.Mkdir, d))
+            self._run_parallel(self.unlinks, workers)
+            self._run_parallel(self.symlinks + self.copies, workers)
+        except OSError:
+            self._rollback()
+            raise
+        # Everything went fine, the replaced files are not needed anymore
+        for op, backup in self._journal:
+            if backup is not None:
+                backup.unlink()
+        self._journal.clear()
@@ -0,0 +1,59 @@
+from typing import Optional
+
+from pydrink.cache import PROMPT_INDEX, StateCache, stat_key
+from pydrink.config import Config
+from pydrink.gitindex import IndexEntry, InvalidIndex, changed_files, read_index
+from pydrink.log import debug, warn
+from pydrink.refs import git_dir, resolve_ref
+
+# Everything in here runs on every shell prompt, so it must not fork git and
+# should not read more than necessary.
+
+
+def cached_index(c: Config) -> tuple[list[IndexEntry], Optional[int]]:
+    """Return the entries of the git index and its mtime in seconds
+
+    The parsed index is cached and only read again if the index or HEAD have
+    changed.
+    """
+    gitdir = git_dir(c.drinkdir)
+    key = [stat_key(gitdir / "index"), stat_key(gitdir / "HEAD")]
+    state = StateCache(PROMPT_INDEX)
+    cached = state.load()
+    if cached and cached["key"] == key:
+        debug("using cached index")
+        return [IndexEntry(*e) for e in cached["entries"]], cached["mtime"]
+    try:
+        entries = read_index(gitdir / "index")
+    except FileNotFoundError:
+        # A repository without any commit or staged file
+        entries = []
+    except InvalidIndex as e:
+        warn(str(e))
+        entries = []
+    mtime = key[0][0] // 1_000_000_000 if key[0] else None
+    state.save({"key": key, "mtime": mtime, "entries": entries})
+    return entries, mtime
+
+
+def prompt_info(c: Config, headref: str = "") -> tuple[str, str]:
+    """Return the current head ref of MASTERBRANCH and the drink prompt info
+
+    The prompt info contains the number of changed objects and a "!" if the
+    repository has moved on from headref, e. g. " 3! ". It is empty if there
+    is nothing to report.
+    """
+    gitdir = git_dir(c.drinkdir)
+    current = resolve_ref(gitdir, f"refs/heads/{c['MASTERBRANCH']}") or ""
+    entries, mtime = cached_index(c)
+    num_changed = len(changed_files(c.drinkdir, entries, mtime))
+    return current, format_prompt_info(current, num_changed, headref)
+
+
+def format_prompt_info(current: str, num_changed: int, headref: str = "") -> str:
+    """Return the prompt info for the given state, see prompt_info()"""
+    di_changed = f" {num_changed}" if num_changed else ""
+    di_update = "!" if headref and headref != current else ""
+    if di_changed or di_update:
+        return f"{di_changed}{di_update} "
+    return ""
@@ -0,0 +1,43 @@
+from pathlib import Path
+from typing import Optional
+
+# Reading refs directly from the git directory is a lot cheaper than forking
+# git for it, which matters for things that run very often, like prompt hooks.
+
+
+def git_dir(drinkdir: Path) -> Path:
+    return drinkdir / ".git"
+
+
+def resolve_ref(gitdir: Path, ref: str) -> Optional[str]:
+    """Return the object id a ref like "refs/heads/main" points to, looking
+    first at the loose ref and then at packed-refs"""
+    try:
+        with open(gitdir / ref) as f:
+            return f.read().strip()
+    except OSError:
+        pass
+    try:
+        with open(gitdir / "packed-refs") as f:
+            for line in f:
+                if line.startswith(("#", "^")):
+                    continue
+                oid, _, name = line.rstrip("\n").partition(" ")
+                if name == ref:
+                    return oid
+    except OSError:
+        pass
+    return None
+
+
+def read_head(drinkdir: Path) -> Optional[str]:
+    """Return the commit HEAD points to, or None if it can not be found"""
+    gitdir = git_dir(drinkdir)
+    try:
+        with open(gitdir / "HEAD") as f:
+            head = f.read().strip()
+    except OSError:
+        return None
+    if head.startswith("ref: "):
+        return resolve_ref(gitdir, head.removeprefix("ref: "))
+    return head
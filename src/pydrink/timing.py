@@ -0,0 +1,72 @@
+from collections.abc import Iterator
+from contextlib import contextmanager
+import sys
+import threading
+import time
+
+# Per-phase timing for --timings. Phases can be nested, the time is always
+# accounted to the innermost phase, so the phases add up to the total. Each
+# thread has its own nesting, e. g. for the workers of a LinkPlan.
+
+ENABLED = False
+clock = time.perf_counter
+
+_totals: dict[str, float] = {}
+_counts: dict[str, int] = {}
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def _stack() -> list[list]:
+    """Return [name, start of the currently running slice] of the phases
+    the current thread is in"""
+    if (stack := getattr(_local, "stack", None)) is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _account(name: str, t: float):
+    with _lock:
+        _totals[name] = _totals.get(name, 0.0) + t
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Account the time spent in the with block to the phase name"""
+    if not ENABLED:
+        yield
+        return
+    stack = _stack()
+    now = clock()
+    if stack:
+        parent = stack[-1]
+        _account(parent[0], now - parent[1])
+    stack.append([name, now])
+    try:
+        yield
+    finally:
+        now = clock()
+        _, start = stack.pop()
+        _account(name, now - start)
+        with _lock:
+            _counts[name] = _counts.get(name, 0) + 1
+        if stack:
+            stack[-1][1] = now
+
+
+def reset():
+    with _lock:
+        _totals.clear()
+        _counts.clear()
+    _stack().clear()
+
+
+def report(total: float):
+    """Print the time spent per phase to stderr"""
+    lines = []
+    for name, t in _totals.items():
+        lines.append(f"{name:<12} {t * 1000:9.1f} ms  {_counts[name]:>5}x")
+    rest = total - sum(_totals.values())
+    lines.append(f"{'other':<12} {rest * 1000:9.1f} ms")
+    lines.append(f"{'total':<12} {total * 1000:9.1f} ms")
+    print("\n".join(lines), file=sys.stderr)
@@ -0,0 +1,172 @@
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from queue import Queue
+from threading import Event, Thread
+from typing import Optional
+import os
+import re
+
+from pydrink.config import Config, KINDS
+from pydrink.inventory import Inventory
+from pydrink.log import debug
+
+IGNORE_FILENAME = ".drinkignore"
+
+
+class IgnoreRules:
+    """gitignore-style patterns, matched against paths relative to $HOME
+
+    Blank lines and lines starting with # are skipped, a leading ! negates a
+    pattern and a trailing / limits it to directories. Patterns containing a
+    slash are anchored at $HOME, all others match the name at any depth.
+    "*" and "?" do not match "/", "**" matches any number of directories.
+    The last matching pattern wins.
+    """
+
+    def __init__(self, lines: Iterable[str] = ()):
+        self.rules: list[tuple[re.Pattern, bool, bool]] = []
+        for line in lines:
+            line = line.rstrip("\n")
+            if not line.strip() or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if "/" not in line:
+                line = "**/" + line
+            self.rules.append((self._compile(line.lstrip("/")), negate, dir_only))
+
+    @classmethod
+    def load(cls, c: Config) -> "IgnoreRules":
+        try:
+            with open(c.drinkdir / IGNORE_FILENAME) as f:
+                return cls(f)
+        except FileNotFoundError:
+            return cls()
+
+    @staticmethod
+    def _compile(pattern: str) -> re.Pattern:
+        regex = ""
+        i = 0
+        while i < len(pattern):
+            if pattern.startswith("**/", i):
+                regex += "(?:.*/)?"
+                i += 3
+            elif pattern.startswith("**", i):
+                regex += ".*"
+                i += 2
+            elif pattern[i] == "*":
+                regex += "[^/]*"
+                i += 1
+            elif pattern[i] == "?":
+                regex += "[^/]"
+                i += 1
+            elif m := re.match(r"\[!?([^]]+)\]", pattern[i:]):
+                negate = "^" if pattern.startswith("[!", i) else ""
+                regex += f"[{negate}{m[1]}]"
+                i += m.end()
+            else:
+                regex += re.escape(pattern[i])
+                i += 1
+        return re.compile(regex + r"\Z")
+
+    def ignored(self, relpath: str, is_dir: bool) -> bool:
+        ignored = False
+        for regex, negate, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(relpath):
+                ignored = not negate
+        return ignored
+
+
+class Scanner:
+    """Finds untracked entries below kind directories, see untracked_files()"""
+
+    def __init__(self, c: Config, inv: Inventory):
+        self.inv = inv
+        self.home = c.home
+        # Never descend into the repository or into the directory of another
+        # kind, e. g. ~/bin when scanning conf in ~
+        self.skip = {str(c.drinkdir)} | {str(c.kindDir(k)) for k in KINDS}
+        # Copies and hardlinks drink has deployed are regular files, only the
+        # ledger tells them apart
+        self.deployed = {str(p) for p in inv.deployed_copies()}
+        self.rules = IgnoreRules.load(c)
+        self.stop = Event()
+
+    def walk(self, d: Path, want_dot: Optional[bool], depth: int) -> Iterator[str]:
+        """Yield the untracked entries below d. want_dot filters the entries
+        of d by a leading dot, depth is the number of levels still to be
+        scanned."""
+        try:
+            entries = self.inv.scandir(d)
+        except PermissionError:
+            debug("cannot read %s", d)
+            return
+        for entry in entries.values():
+            if self.stop.is_set():
+                return
+            if want_dot is not None and entry.name.startswith(".") != want_dot:
+                continue
+            # DirEntry answers this from d_type, without another stat()
+            if entry.is_symlink() or entry.path in self.deployed:
+                continue
+            is_dir = entry.is_dir(follow_symlinks=False)
+            if is_dir and entry.path in self.skip:
+                continue
+            if self.rules.ignored(os.path.relpath(entry.path, self.home), is_dir):
+                debug("ignoring %s", entry.path)
+                continue
+            if is_dir and depth > 1:
+                yield from self.walk(Path(entry.path), None, depth - 1)
+            else:
+                yield entry.path
+
+
+def untracked_files(
+    c: Config,
+    kinds: Iterable[str],
+    inv: Optional[Inventory] = None,
+    depth: int = 1,
+    limit: int = 0,
+) -> Iterator[str]:
+    """Yield untracked files / possible drink candidates as they are found
+
+    Every kind is scanned in its own thread. Directories are descended into
+    down to depth levels below the kind directory, deeper ones are reported as
+    a whole. DRINKDIR, the directories of other kinds and paths matched by the
+    .drinkignore in DRINKDIR are skipped. At most limit results are returned,
+    if limit is not 0.
+    """
+    scanner = Scanner(c, inv if inv is not None else Inventory(c))
+    results: Queue[Optional[str]] = Queue()
+
+    def scan(kind: str):
+        # Only dotfiles are candidates for conf, for all other kinds the
+        # dotfiles are not.
+        want_dot = kind == "conf"
+        try:
+            for p in scanner.walk(c.kindDir(kind), want_dot, depth):
+                results.put(p)
+        finally:
+            results.put(None)
+
+    threads = [Thread(target=scan, args=(kind,), daemon=True) for kind in kinds]
+    for t in threads:
+        t.start()
+    running = len(threads)
+    found = 0
+    try:
+        while running:
+            if (p := results.get()) is None:
+                running -= 1
+                continue
+            yield p
+            found += 1
+            if found == limit:
+                return
+    finally:
+        scanner.stop.set()
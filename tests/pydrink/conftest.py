@@ -7,6 +7,13 @@ import tempfile
 from shutil import rmtree
 
 
+@pytest.fixture(autouse=True)
+def xdg_dirs(monkeypatch, tmp_path):
+    """Keep caches and state written by tests away from the real home"""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.setenv("XDG_STATE_HOME", str(tmp_path / "state"))
+
+
 @pytest.fixture
 def tmppath():
     p = Path(tempfile.TemporaryDirectory().name)
@@ -114,3 +121,27 @@ def tracked_drinkrc_and_drinkdir(drinkrc_and_drinkdir, git_base_repo):
         ]
     )
     return drinkrc_and_drinkdir
+
+
+@pytest.fixture
+def home(fake_home, monkeypatch):
+    """fake_home as $HOME, for Config and everything else"""
+    monkeypatch.setattr(Path, "home", lambda: fake_home)
+    return fake_home
+
+
+@pytest.fixture
+def config(home, tracked_drinkrc_and_drinkdir):
+    """The configuration of the tracked drinkdir, living in fake_home"""
+    return Config(tracked_drinkrc_and_drinkdir)
+
+
+@pytest.fixture
+def commit():
+    """Return a function that commits all changes in DRINKDIR"""
+
+    def commit(c: Config, msg: str):
+        call(["git", "-C", str(c.drinkdir), "add", "-A"])
+        call(["git", "-C", str(c.drinkdir), "commit", "-q", "-m", msg])
+
+    return commit
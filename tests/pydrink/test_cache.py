@@ -0,0 +1,103 @@
+from pathlib import Path
+from subprocess import check_output
+from pydrink.cache import LINK_STATE, StateCache, link_fingerprint
+from pydrink.config import Config
+from pydrink.drink import link_and_prune
+from pydrink.ledger import Ledger
+from pydrink.refs import read_head
+import pydrink.drink
+
+
+def test_state_cache_roundtrip(monkeypatch, tmppath):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmppath))
+    state = StateCache("test.json")
+    assert state.load() is None
+    state.save({"a": [1, 2]})
+    assert state.load() == {"a": [1, 2]}
+    state.clear()
+    assert state.load() is None
+
+
+def test_state_cache_corrupt(monkeypatch, tmppath):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmppath))
+    state = StateCache("test.json")
+    state.save({"a": 1})
+    content = state.path.read_text()
+    state.path.write_text(content.replace('"a": 1', '"a": 2'))
+    assert state.load() is None
+    state.path.write_text(content[:10])
+    assert state.load() is None
+
+
+def test_read_head(tracked_drinkrc_and_drinkdir):
+    c = Config(tracked_drinkrc_and_drinkdir)
+    head = check_output(["git", "-C", str(c.drinkdir), "rev-parse", "HEAD"], text=True)
+    assert read_head(c.drinkdir) == head.strip()
+    # Same after moving the ref into packed-refs
+    check_output(["git", "-C", str(c.drinkdir), "pack-refs", "--all"])
+    assert read_head(c.drinkdir) == head.strip()
+
+
+def test_link_and_prune_noop(fake_home, monkeypatch, tracked_drinkrc_and_drinkdir):
+    def mock_home():
+        return fake_home
+
+    monkeypatch.setattr(Path, "home", mock_home)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(fake_home / ".cache"))
+    # Creating the cache directory would change the mtime of $HOME
+    (fake_home / ".cache").mkdir()
+    c = Config(tracked_drinkrc_and_drinkdir)
+    assert link_and_prune(c) == 0
+    assert (fake_home / "bin" / "obj3").is_symlink()
+    dirs = Ledger.load(c).link_dirs()
+    assert StateCache(LINK_STATE).load() == dict(link_fingerprint(c, dirs), clean=True)
+
+    calls = []
+    monkeypatch.setattr(
+        pydrink.drink.git, "get_inventory", lambda *a: calls.append(a)
+    )
+    assert link_and_prune(c) == 0
+    assert calls == []
+    # A changed link directory invalidates the fingerprint
+    (fake_home / "bin" / "obj3").unlink()
+    assert StateCache(LINK_STATE).load() != link_fingerprint(c)
+
+
+def test_link_and_prune_subdirectory(
+    fake_home, monkeypatch, tracked_drinkrc_and_drinkdir
+):
+    monkeypatch.setattr(Path, "home", lambda: fake_home)
+    c = Config(tracked_drinkrc_and_drinkdir)
+    git = ["git", "-C", str(c.drinkdir)]
+    (c.drinkdir / "conf" / "dot.config" / "app").mkdir(parents=True)
+    (c.drinkdir / "conf" / "dot.config" / "app" / "rc").touch()
+    check_output(git + ["add", "conf"])
+    check_output(git + ["commit", "-q", "-m", "app"])
+    assert link_and_prune(c) == 0
+    rc = fake_home / ".config" / "app" / "rc"
+    assert rc.is_symlink()
+    # Nothing but the directory of the link tells it is gone
+    rc.unlink()
+    assert link_and_prune(c) == 0
+    assert rc.is_symlink()
+
+
+def test_link_and_prune_without_head(
+    fake_home, monkeypatch, drinkrc_and_drinkdir
+):
+    monkeypatch.setattr(Path, "home", lambda: fake_home)
+    c = Config(drinkrc_and_drinkdir)
+    check_output(["git", "init", "-q", str(c.drinkdir)])
+    check_output(["git", "-C", str(c.drinkdir), "add", "bin"])
+    assert link_and_prune(c) == 0
+    assert (fake_home / "bin" / "objx").is_symlink()
+    calls = []
+    get_inventory = pydrink.drink.git.get_inventory
+    monkeypatch.setattr(
+        pydrink.drink.git,
+        "get_inventory",
+        lambda *a: calls.append(a) or get_inventory(*a),
+    )
+    # Nothing tells what the objects were, so the cache is not used
+    assert link_and_prune(c) == 0
+    assert calls == [(c,)]
@@ -0,0 +1,59 @@
+from pathlib import Path
+
+import pydrink.compare
+from pydrink.cache import COMPARE, StateCache
+from pydrink.compare import ContentComparer, same_bytes
+from pydrink.config import Config
+from pydrink.drink import link_and_prune
+
+
+def test_same_bytes_mmap(monkeypatch, tmp_path):
+    monkeypatch.setattr(pydrink.compare, "MMAP_THRESHOLD", 16)
+    monkeypatch.setattr(pydrink.compare, "MMAP_CHUNK", 7)
+    a, b = tmp_path / "a", tmp_path / "b"
+    a.write_bytes(b"x" * 100)
+    b.write_bytes(b"x" * 100)
+    assert same_bytes(a, b, 100)
+    b.write_bytes(b"x" * 99 + b"y")
+    assert not same_bytes(a, b, 100)
+
+
+def test_comparer(fake_home, monkeypatch, tracked_drinkrc_and_drinkdir):
+    monkeypatch.setattr(Path, "home", lambda: fake_home)
+    c = Config(tracked_drinkrc_and_drinkdir)
+    repopath = c.drinkdir / "bin" / "obj3"
+    path = fake_home / "bin" / "obj3"
+    calls = []
+    monkeypatch.setattr(
+        pydrink.compare, "same_bytes", lambda *args: calls.append(args) or True
+    )
+    comparer = ContentComparer(c)
+    path.write_text("differs in size")
+    assert not comparer.same(path, repopath)
+    path.write_text("")
+    # The object is unchanged, so its blob id is used
+    assert comparer.same(path, repopath)
+    assert calls == []
+    repopath.write_text("changed")
+    path.write_text("changed")
+    assert comparer.compare_all([(path, repopath)]) == [True]
+    assert len(calls) == 1
+    comparer.save()
+    # Answered from the cache
+    assert ContentComparer(c).same(path, repopath)
+    assert len(calls) == 1
+    assert len(StateCache(COMPARE).load()) == 2
+
+
+def test_link_overwrite(fake_home, monkeypatch, tracked_drinkrc_and_drinkdir):
+    monkeypatch.setattr(Path, "home", lambda: fake_home)
+    c = Config(tracked_drinkrc_and_drinkdir)
+    (fake_home / "bin" / "obj3").touch()
+    (fake_home / "bin" / "objx").write_text("local change")
+    assert link_and_prune(c) == 4
+    assert link_and_prune(c, overwrite=True) == 4
+    assert (fake_home / "bin" / "obj3").is_symlink()
+    assert not (fake_home / "bin" / "objx").is_symlink()
+    (fake_home / "bin" / "objx").write_text("")
+    assert link_and_prune(c, overwrite=True) == 0
+    assert (fake_home / "bin" / "objx").is_symlink()
@@ -0,0 +1,62 @@
+from pathlib import Path
+import subprocess
+import sys
+
+import pydrink.complete
+from pydrink.config import BY_TARGET, CONFIG_FILENAME, Config
+from pydrink.complete import complete_main, completions
+
+
+def test_completions(fake_home, monkeypatch, drinkrc_and_drinkdir):
+    monkeypatch.setattr(Path, "home", lambda: fake_home)
+    c = Config(drinkrc_and_drinkdir)
+    assert completions(c, "kinds") == ["bin", "zfunc", "conf"]
+    assert completions(c, "targets") == ["bapf", "bar", "foo", "global"]
+    assert "DRINKDIR" in completions(c, "variables")
+    assert completions(c, "importable", "bin") == [str(fake_home / "bin")]
+    # Answered from the cache until a target is added
+    completion_data = pydrink.complete.completion_data
+    monkeypatch.setattr(pydrink.complete, "completion_data", None)
+    assert completions(c, "targets") == ["bapf", "bar", "foo", "global"]
+    monkeypatch.setattr(pydrink.complete, "completion_data", completion_data)
+    (c.drinkdir / "zfunc" / BY_TARGET / "new").mkdir(parents=True)
+    assert "new" in completions(c, "targets")
+
+
+def test_complete_main(capsys, fake_home, monkeypatch, drinkrc_and_drinkdir):
+    monkeypatch.setattr(Path, "home", lambda: fake_home)
+    (fake_home / ".drinkrc").write_text(drinkrc_and_drinkdir.read_text())
+    assert complete_main(["kinds"]) == 0
+    assert capsys.readouterr().out == "bin\nzfunc\nconf\n"
+    assert complete_main(["nonsense"]) == 1
+    assert complete_main([]) == 2
+
+
+def test_environment_invalidates(fake_home, monkeypatch, drinkrc_and_drinkdir):
+    monkeypatch.setattr(Path, "home", lambda: fake_home)
+    c = Config(drinkrc_and_drinkdir)
+    assert completions(c, "importable", "bin") == [str(fake_home / "bin")]
+    c = Config(drinkrc_and_drinkdir, env={"DRINK_BINDIR": "sbin"})
+    assert completions(c, "importable", "bin") == [str(fake_home / "sbin")]
+
+
+def test_complete_skips_drink(tmppath, drinkrc_and_drinkdir):
+    """Completion must not load the CLI"""
+    xdg = tmppath / "xdg"
+    xdg.mkdir()
+    (xdg / CONFIG_FILENAME).write_text(drinkrc_and_drinkdir.read_text())
+    code = (
+        "import sys; from pydrink.entry import main;"
+        "sys.argv = ['drink', '--complete', 'kinds']; ret = main();"
+        "print('pydrink.drink' in sys.modules or 'argparse' in sys.modules);"
+        "sys.exit(ret)"
+    )
+    src = Path(__file__).parents[2] / "src"
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        env={"XDG_CONFIG_HOME": str(xdg), "PYTHONPATH": str(src)},
+    )
+    assert out.returncode == 0
+    assert out.stdout.split("\n") == ["bin", "zfunc", "conf", "False", ""]
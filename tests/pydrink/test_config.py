@@ -1,5 +1,9 @@
 from pathlib import Path
-from pydrink.config import Config
+
+import pytest
+
+import pydrink.config
+from pydrink.config import BY_TARGET, Config, Deploy, config_files
 
 
 def test_drinkrc_can_be_parsed(drinkrc_and_drinkdir):
@@ -24,9 +28,11 @@ def test_dump_config(drinkrc):
     wanted_str_list = [
         "BINDIR=bin",
         "CONFDIR=.",
+        "DEPLOY=symlink",
         "DRINKBASE=base",
         "DRINKBASEURL=",
         "DRINKDIR=relative/path",
+        "FOLD=no",
         "MASTERBRANCH=main",
         "SUPPORTED_KINDS='bin conf zfunc'",
         "TARGET=somehost",
@@ -39,3 +45,58 @@ def test_kindDir(drinkrc):
     c = Config(drinkrc)
     assert c.kindDir("conf") == Path.home()
     assert c.kindDir("bin") == Path.home() / "bin"
+
+
+def test_config_is_immutable(drinkrc):
+    c = Config(drinkrc)
+    with pytest.raises(AttributeError):
+        c.drinkdir = Path("/elsewhere")
+    with pytest.raises(TypeError):
+        c.config["BINDIR"] = "elsewhere"
+
+
+def test_layered_config_and_env(tmp_path, drinkrc):
+    user = tmp_path / "drinkrc"
+    user.write_text('TARGET="userhost"\nBINDIR=.local/bin\n')
+    c = Config(drinkrc, user, env={"DRINK_BINDIR": "sbin", "DRINKBASE": "origin"})
+    assert c["TARGET"] == c.target == "userhost"
+    assert c["DRINKDIR"] == Path.home() / "relative/path"
+    assert c.kindDir("bin") == Path.home() / "sbin"
+    assert c["DRINKBASE"] == "origin"
+    assert c.by_target_roots["conf"] == c.drinkdir / "conf" / BY_TARGET
+
+
+def test_config_files(monkeypatch, fake_home):
+    monkeypatch.setattr(Path, "home", lambda: fake_home)
+    xdg = fake_home / "xdg"
+    xdg.mkdir()
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(xdg))
+    (fake_home / ".drinkrc").touch()
+    (xdg / "drinkrc").touch()
+    assert config_files()[-2:] == [fake_home / ".drinkrc", xdg / "drinkrc"]
+
+
+def test_config_parse_cache(monkeypatch, drinkrc):
+    c = Config.load([drinkrc])
+    assert c["TARGET"] == "somehost"
+
+    def fail(files):
+        raise AssertionError("parsed again")
+
+    monkeypatch.setattr(pydrink.config, "parse_files", fail)
+    assert Config.load([drinkrc])["TARGET"] == "somehost"
+    drinkrc.write_text("TARGET=otherhost\n")
+    monkeypatch.undo()
+    assert Config.load([drinkrc])["TARGET"] == "otherhost"
+
+
+def test_deploy_strategies(drinkrc):
+    c = Config(drinkrc, env={"DRINK_DEPLOY": "zfunc=copy dot.zshrc=hardlink"})
+    assert c.deploy("bin", "bin/obj") == Deploy.Symlink
+    assert c.deploy("zfunc", "zfunc/_foo") == Deploy.Copy
+    assert c.deploy("conf", f"conf/{BY_TARGET}/somehost/dot.zshrc") == Deploy.Hardlink
+    assert Config(drinkrc, env={"DRINK_DEPLOY": "copy"}).deploy("bin", "x") == (
+        Deploy.Copy
+    )
+    with pytest.raises(ValueError):
+        Config(drinkrc, env={"DRINK_DEPLOY": "zfunc=move"})
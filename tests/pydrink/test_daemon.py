@@ -0,0 +1,90 @@
+import threading
+import time
+
+import pytest
+
+from pydrink import git
+from pydrink.client import query, socket_path
+from pydrink.config import CONFIG_FILENAME, Config
+from pydrink.daemon import Daemon
+from pydrink.drink import link_and_prune
+from pydrink.entry import ask_daemon, prompt_main
+from pydrink.prompt import prompt_info
+
+
+def wait_for(fn, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while (result := fn()) is None or result is False:
+        if time.monotonic() > deadline:
+            break
+        time.sleep(0.05)
+    return result
+
+
+@pytest.fixture
+def config(config, monkeypatch, tmp_path):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path / "run"))
+    return config
+
+
+@pytest.fixture
+def daemon(config):
+    d = Daemon(config)
+    t = threading.Thread(target=d.serve)
+    t.start()
+    assert wait_for(lambda: query(config, "ping")) == "pong"
+    yield d
+    d.stop()
+    t.join()
+    assert not socket_path(config).exists()
+
+
+def test_no_daemon(config):
+    assert query(config, "ping") is None
+
+
+def test_queries(config, daemon):
+    assert query(config, "changed") == []
+    assert query(config, "branches") == git.get_branches(config)
+    assert query(config, "prompt-info", headref="") == list(prompt_info(config, ""))
+    assert query(config, "nonsense") is None
+    assert daemon.serve() == 1
+
+
+def test_changes_are_noticed(config, daemon, fake_home):
+    pending = query(config, "pending")
+    (config.drinkdir / "bin" / "objx").write_text("changed")
+    assert wait_for(lambda: query(config, "changed") == ["bin/objx"])
+    assert query(config, "prompt-info")[1] != ""
+    (fake_home / "bin" / "objx").symlink_to(config.drinkdir / "bin" / "objx")
+    assert wait_for(lambda: len(query(config, "pending")) == len(pending) - 1)
+
+
+def test_without_inotify(config):
+    d = Daemon(config)
+    assert d.answer({"query": "changed"}) == {"ok": True, "result": []}
+    (config.drinkdir / "bin" / "objx").write_text("changed")
+    assert d.answer({"query": "changed"})["result"] == ["bin/objx"]
+
+
+def test_entry_asks_daemon(config, daemon, tmp_path, monkeypatch, capsys):
+    xdg = tmp_path / "xdg"
+    xdg.mkdir()
+    (xdg / CONFIG_FILENAME).write_text(config.files[-1].read_text())
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(xdg))
+    monkeypatch.setattr("pydrink.prompt.prompt_info", None)
+    assert prompt_main("") == 0
+    assert capsys.readouterr().out.split("\n")[:2] == list(prompt_info(config, ""))
+    assert ask_daemon(["-c"]) == []
+    assert ask_daemon(["-c", "-v"]) is None
+
+
+def test_copies_are_not_pending(config, fake_home, tracked_drinkrc_and_drinkdir):
+    copied = Config(tracked_drinkrc_and_drinkdir, env={"DRINK_DEPLOY": "bin=copy"})
+    assert link_and_prune(copied) == 0
+    d = Daemon(copied)
+    pending = d.answer({"query": "pending"})["result"]
+    assert not any(p.startswith(str(copied.drinkdir / "bin")) for p in pending)
+    # As after an event in ~/bin
+    d.state.invalidate_links(fake_home / "bin")
+    assert d.answer({"query": "pending"})["result"] == pending
@@ -0,0 +1,93 @@
+from subprocess import call
+import os
+
+import pytest
+
+from pydrink.config import Config
+from pydrink.daemon import Daemon
+from pydrink.deploy import edited_copies
+from pydrink.drink import link_and_prune, show_changed_files
+from pydrink.git import get_inventory
+from pydrink.ledger import Ledger
+from pydrink.obj import ObjectState
+from pydrink.untracked import untracked_files
+
+
+@pytest.fixture
+def config(home, tracked_drinkrc_and_drinkdir):
+    return Config(tracked_drinkrc_and_drinkdir, env={"DRINK_DEPLOY": "bin=copy"})
+
+
+def test_copy(config, fake_home):
+    assert link_and_prune(config) == 0
+    obj3 = fake_home / "bin" / "obj3"
+    assert obj3.is_file() and not obj3.is_symlink()
+    assert obj3 in Ledger.load(config).copies
+    inv = get_inventory(config)
+    assert all(o.state != ObjectState.ManagedPending for o in inv if o.kind == "bin")
+
+
+def test_refresh_only_changed(config, fake_home, commit):
+    assert link_and_prune(config) == 0
+    objx = fake_home / "bin" / "objx"
+    before = os.stat(objx)
+    (config.drinkdir / "bin" / "obj3").write_text("new")
+    commit(config, "change obj3")
+    assert link_and_prune(config) == 0
+    assert (fake_home / "bin" / "obj3").read_text() == "new"
+    assert os.stat(objx).st_ino == before.st_ino
+
+
+def test_local_edits(config, fake_home, capsys, commit):
+    assert link_and_prune(config) == 0
+    objx = fake_home / "bin" / "objx"
+    objx.write_text("mine")
+    edited = list(edited_copies(Ledger.load(config)))
+    assert [link for link, _ in edited] == [objx]
+    show_changed_files(config, [], edited=edited)
+    assert capsys.readouterr().out == f"{objx}\n"
+    assert Daemon(config).answer({"query": "edited"})["result"] == [str(objx)]
+    (config.drinkdir / "bin" / "objx").write_text("theirs")
+    commit(config, "change objx")
+    assert link_and_prune(config) == 4
+    assert objx.read_text() == "mine"
+    # Pruning keeps it as well
+    call(["git", "-C", str(config.drinkdir), "rm", "-q", "bin/objx", "bin/obj3"])
+    commit(config, "remove objx and obj3")
+    assert link_and_prune(config) == 0
+    assert objx.read_text() == "mine"
+    assert not (fake_home / "bin" / "obj3").exists()
+
+
+def test_switch_strategy(config, fake_home, tracked_drinkrc_and_drinkdir):
+    obj3 = fake_home / "bin" / "obj3"
+    symlinked = Config(tracked_drinkrc_and_drinkdir)
+    assert link_and_prune(symlinked) == 0
+    assert obj3.is_symlink()
+    assert link_and_prune(config) == 0
+    assert obj3.is_file() and not obj3.is_symlink()
+    hardlinked = Config(
+        tracked_drinkrc_and_drinkdir, env={"DRINK_DEPLOY": "bin=hardlink"}
+    )
+    assert link_and_prune(hardlinked) == 0
+    assert os.path.samefile(obj3, config.drinkdir / "bin" / "obj3")
+    assert link_and_prune(symlinked) == 0
+    assert obj3.is_symlink()
+    assert obj3 not in Ledger.load(symlinked).copies
+
+
+def test_foreign_file(config, fake_home):
+    obj3 = fake_home / "bin" / "obj3"
+    obj3.write_text("foreign")
+    assert link_and_prune(config) == 4
+    assert obj3.read_text() == "foreign"
+    obj3.write_text("")
+    assert link_and_prune(config, overwrite=True) == 0
+    assert obj3 in Ledger.load(config).copies
+
+
+def test_copies_are_not_untracked(config, fake_home):
+    assert link_and_prune(config) == 0
+    (fake_home / "bin" / "tool").touch()
+    found = set(untracked_files(config, ["bin"]))
+    assert found == {str(fake_home / "bin" / "tool")}
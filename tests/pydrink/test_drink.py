@@ -3,6 +3,8 @@ from pydrink.drink import find_drinkrc, get_dangling_links
 from pydrink.git import get_tracked_objects
 from pathlib import Path
 import pytest
+import subprocess
+import sys
 
 
 def test_get_dangling_links(monkeypatch, tracked_drinkrc_and_drinkdir, fake_home):
@@ -28,16 +30,13 @@ def test_get_dangling_links(monkeypatch, tracked_drinkrc_and_drinkdir, fake_home
 
 
 def test_get_dangling_links_not_existing_dir(drinkrc):
-    c = Config(drinkrc)
     # reconfigure BINDIR to be in some not existing location
     # This tests the case where somebody has no e. g. zfunc
     # items, so .zfunc was never created.
-    c.config["BINDIR"] = "notexisting"
+    c = Config(drinkrc, env={"DRINK_BINDIR": "notexisting"})
     dangle_notexisting = list(get_dangling_links(c, "bin"))
     # Expected outcome is an empty list and no exception or error
     assert dangle_notexisting == []
-    # HACK: WHY has this influence on other tests!?
-    c.config["BINDIR"] = "bin"
 
 
 @pytest.mark.parametrize(
@@ -69,6 +68,28 @@ def test_find_drinkrc(monkeypatch, fake_home, present_rcs, found_rc):
     assert find_drinkrc() == Path.home() / found_rc
 
 
+def test_lazy_imports(tmppath, drinkrc_and_drinkdir):
+    """Plain output commands must not pay for importing rich"""
+    xdg = tmppath / "xdg"
+    xdg.mkdir()
+    (xdg / CONFIG_FILENAME).write_text(drinkrc_and_drinkdir.read_text())
+    code = (
+        "import sys; from pydrink.drink import cli;"
+        "sys.argv = ['drink', '-u', 'DRINKDIR']; ret = cli();"
+        "heavy = ['rich', 'rich_argparse', 'importlib.metadata'];"
+        "print([m for m in heavy if m in sys.modules]); sys.exit(ret)"
+    )
+    src = Path(__file__).parents[2] / "src"
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        env={"XDG_CONFIG_HOME": str(xdg), "PYTHONPATH": str(src)},
+    )
+    assert out.returncode == 0
+    assert out.stdout.split("\n")[:2] == [str(tmppath), "[]"]
+
+
 # def test_tracking_status():
 #     pass
 
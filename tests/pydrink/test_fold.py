@@ -0,0 +1,77 @@
+from pathlib import Path
+from subprocess import call
+import os
+
+import pytest
+
+from pydrink.config import Config, BY_TARGET
+from pydrink.drink import link_and_prune
+from pydrink.git import get_inventory
+from pydrink.obj import ObjectState
+
+
+@pytest.fixture
+def config(home, commit, tracked_drinkrc_and_drinkdir):
+    c = Config(tracked_drinkrc_and_drinkdir, env={"DRINK_FOLD": "yes"})
+    app = c.drinkdir / "conf" / "dot.config" / "app"
+    (app / "sub").mkdir(parents=True)
+    (app / "rc").touch()
+    (app / "sub" / "x").touch()
+    commit(c, "app")
+    return c
+
+
+def test_fold(config, fake_home):
+    assert link_and_prune(config) == 0
+    app = fake_home / ".config" / "app"
+    # ~/.config itself is never folded
+    assert not (fake_home / ".config").is_symlink()
+    assert Path(os.readlink(app)) == config.drinkdir / "conf" / "dot.config" / "app"
+    inv = get_inventory(config)
+    rc = next(o for o in inv if o.get_linkpath() == app / "rc")
+    assert rc.state != ObjectState.ManagedPending
+
+
+def test_unfold(config, fake_home, commit):
+    assert link_and_prune(config) == 0
+    local = Path("conf") / BY_TARGET / "singold" / "dot.config" / "app" / "local"
+    (config.drinkdir / local).parent.mkdir(parents=True)
+    (config.drinkdir / local).touch()
+    commit(config, "local")
+    assert link_and_prune(config) == 0
+    app = fake_home / ".config" / "app"
+    assert app.is_dir() and not app.is_symlink()
+    assert (app / "rc").is_symlink()
+    assert (app / "local").is_symlink()
+    # Still from one directory only
+    assert (app / "sub").is_symlink()
+    inv = get_inventory(config)
+    assert all(o.state != ObjectState.ManagedPending for o in inv if o.kind == "conf")
+
+
+def test_prune_fold(config, fake_home, commit):
+    assert link_and_prune(config) == 0
+    call(["git", "-C", str(config.drinkdir), "rm", "-rq", "conf/dot.config"])
+    commit(config, "remove app")
+    assert link_and_prune(config) == 0
+    assert not os.path.lexists(fake_home / ".config" / "app")
+
+
+def test_no_fold_with_untracked_files(config, fake_home):
+    (config.drinkdir / "conf" / "dot.config" / "app" / "secret").touch()
+    assert link_and_prune(config) == 0
+    app = fake_home / ".config" / "app"
+    assert not app.is_symlink()
+    assert (app / "rc").is_symlink()
+    assert not (app / "secret").exists()
+
+
+def test_no_fold_with_dotted_names(config, fake_home, commit):
+    (config.drinkdir / "conf" / "dot.config" / "app" / "dot.hidden").touch()
+    commit(config, "hidden")
+    assert link_and_prune(config) == 0
+    app = fake_home / ".config" / "app"
+    assert not app.is_symlink()
+    assert (app / ".hidden").is_symlink()
+    # The directory without dotted names below it is still folded
+    assert (app / "sub").is_symlink()
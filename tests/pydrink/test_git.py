@@ -1,14 +1,25 @@
+import asyncio
 import sys
 from pydrink.config import Config, BY_TARGET
+import pydrink.git
+from pydrink.gitasync import AsyncGit
 from pydrink.git import (
+    automerge,
+    configure_repository,
     get_branches,
     get_changed_files,
+    get_status,
     get_tracked_objects,
+    get_unmerged_branches,
+    kind_and_target,
     menu,
+    MenuModel,
     unclean,
 )
 import pytest
 from pathlib import Path
+from shutil import rmtree
+from subprocess import call, check_output
 
 
 def test_unclean_repo(tracked_drinkrc_and_drinkdir):
@@ -42,8 +53,32 @@ def test_get_changed_files(tracked_drinkrc_and_drinkdir):
     assert changes_post == sorted(map(str, changed_objects))
 
 
+def test_get_status(tracked_drinkrc_and_drinkdir):
+    c = Config(tracked_drinkrc_and_drinkdir)
+    git = ["git", "-C", str(c.drinkdir)]
+    (c.drinkdir / "bin" / "obj3").write_text("staged")
+    call(git + ["add", "bin/obj3"])
+    call(git + ["mv", "bin/objx", "bin/objy"])
+    (c.drinkdir / "bin" / "new obj").touch()
+    status = {e.path: e for e in get_status(c)}
+    assert status["bin/obj3"].xy == "M."
+    assert status["bin/objy"].kind == "2"
+    assert status["bin/objy"].orig == "bin/objx"
+    assert status["bin/new obj"].xy == "??"
+    # Untracked files are no objects
+    assert sorted(get_changed_files(c)) == ["bin/obj3", "bin/objy"]
+
+
+def test_configure_repository(tracked_drinkrc_and_drinkdir):
+    c = Config(tracked_drinkrc_and_drinkdir)
+    assert configure_repository(c) == 0
+    git = ["git", "-C", str(c.drinkdir), "config"]
+    assert check_output(git + ["core.untrackedCache"], text=True) == "true\n"
+
+
 @pytest.mark.parametrize(
-    "test_input,expected", [("1", 0), ("2", 0), ("3", 0), ("99", 99)]
+    "test_input,expected",
+    [("1", 0), ("2", 0), ("3", 0), ("99", 99), ("2 8", 0), ("8,99", 99)],
 )
 def test_git_menu_items(tracked_drinkrc_and_drinkdir, test_input, expected):
     # We will get a busy loop if we replace input() and are on a tty.
@@ -80,6 +115,45 @@ def test_menu_with_changed_files(capsys, tracked_drinkrc_and_drinkdir):
     # assert line10 == "10) diff bin/obj3"
 
 
+def test_kind_and_target():
+    assert kind_and_target("bin/obj3") == ("bin", "global")
+    assert kind_and_target(f"conf/{BY_TARGET}/bapf/.obj4") == ("conf", "bapf")
+
+
+def test_menu_model(monkeypatch, tracked_drinkrc_and_drinkdir):
+    monkeypatch.setattr(pydrink.git, "PAGE_SIZE", 2)
+    c = Config(tracked_drinkrc_and_drinkdir)
+
+    async def check():
+        model = MenuModel(c, AsyncGit(c))
+        assert await model.refresh()
+        assert model.changed == []
+        assert not await model.refresh()
+        assert model.footer() is None
+        for p in ["bin/obj3", "bin/objx", f"bin/{BY_TARGET}/foo/obj1"]:
+            (c.drinkdir / p).write_text("something")
+        assert await model.refresh()
+        assert len(model.changed) == 3
+        assert model.shown() == [0, 1]
+        assert model.command("n")
+        assert model.shown() == [2]
+        assert model.command("n")
+        assert model.shown() == [2]
+        assert model.command("t foo")
+        assert [model.changed[n] for n in model.shown()] == [
+            f"bin/{BY_TARGET}/foo/obj1"
+        ]
+        assert "1/1 of 1 objects foo" in (model.footer() or "")
+        assert not model.command("10")
+        # Undoing a change shows as well
+        for p in ["bin/obj3", "bin/objx", f"bin/{BY_TARGET}/foo/obj1"]:
+            (c.drinkdir / p).write_text("")
+        assert await model.refresh()
+        assert model.changed == []
+
+    asyncio.run(check())
+
+
 def test_get_tracked_objects_all(tracked_drinkrc_and_drinkdir):
     c = Config(tracked_drinkrc_and_drinkdir)
     objs = get_tracked_objects(c)
@@ -100,3 +174,51 @@ def test_get_tracked_objects_by_kind_conf(tracked_drinkrc_and_drinkdir):
     assert o.kind == "conf"
     assert o.target == "bapf"
     assert next(objs, "stop") == "stop"
+
+
+def test_automerge(capsys, tracked_drinkrc_and_drinkdir):
+    c = Config(tracked_drinkrc_and_drinkdir)
+    git = ["git", "-C", str(c.drinkdir)]
+    mb = c["MASTERBRANCH"]
+    # Replace the fake remote branches with real ones
+    rmtree(c.drinkdir / ".git" / "refs" / "remotes")
+
+    def remote_branch(name: str, file: str, content: str):
+        call(git + ["checkout", "-q", "-b", name, mb])
+        if file:
+            (c.drinkdir / file).write_text(content)
+            call(git + ["commit", "-q", "-a", "-m", name])
+        call(git + ["update-ref", f"refs/remotes/{name}/{mb}", name])
+        call(git + ["checkout", "-q", mb])
+        call(git + ["branch", "-q", "-D", name])
+
+    (c.drinkdir / "bin" / "new1").touch()
+    (c.drinkdir / "bin" / "new2").touch()
+    call(git + ["add", "."])
+    call(git + ["commit", "-q", "-m", "new files"])
+    remote_branch("hostA", "bin/new1", "from hostA\n")
+    remote_branch("hostB", "", "")
+    remote_branch("hostC", "bin/new2", "from hostC\n")
+    remote_branch("hostD", "bin/obj3", "from hostD\n")
+    (c.drinkdir / "bin" / "obj3").write_text("local change\n")
+    call(git + ["commit", "-q", "-a", "-m", "local"])
+
+    assert sorted(get_unmerged_branches(c)[0]) == [
+        f"hostA/{mb}",
+        f"hostC/{mb}",
+        f"hostD/{mb}",
+    ]
+    assert get_unmerged_branches(c)[1] == 4
+    assert automerge(c) != 0
+    # hostA and hostC were merged with one commit, hostD conflicts
+    parents = check_output(git + ["log", "-1", "--format=%P", "HEAD"], text=True)
+    assert len(parents.split()) == 3
+    assert (c.drinkdir / "bin" / "new2").read_text() == "from hostC\n"
+    assert (c.drinkdir / ".git" / "MERGE_HEAD").exists()
+    call(git + ["merge", "--abort"])
+
+    capsys.readouterr()
+    (c.drinkdir / "bin" / "obj3").write_text("from hostD\n")
+    call(git + ["commit", "-q", "-a", "-m", "resolve"])
+    assert automerge(c) == 0
+    assert "Merged 1 branches, skipped 3" in capsys.readouterr().out
@@ -0,0 +1,37 @@
+import asyncio
+
+from pydrink.config import Config
+from pydrink.gitasync import AsyncGit, ainput
+
+
+def test_readonly_does_not_wait(tracked_drinkrc_and_drinkdir):
+    c = Config(tracked_drinkrc_and_drinkdir)
+
+    async def check():
+        ag = AsyncGit(c)
+        # Pretend a mutating command is running
+        async with ag._lock:
+            result = await asyncio.wait_for(ag.run(ag.git + ["status"]), 10)
+            assert result.returncode == 0
+            mutating = asyncio.ensure_future(ag.run(ag.git + ["gc", "--auto"], False))
+            await asyncio.sleep(0.1)
+            assert not mutating.done()
+        assert (await mutating).returncode == 0
+
+    asyncio.run(check())
+
+
+def test_background(tracked_drinkrc_and_drinkdir):
+    c = Config(tracked_drinkrc_and_drinkdir)
+
+    async def check():
+        ag = AsyncGit(c)
+        bt = ag.start("status", ag.call(ag.git + ["status", "-s"], readonly=True))
+        # A running task of the same name is joined
+        assert ag.start("status", ag.call(ag.git + ["status"])) is bt
+        assert ag.progress()[0].startswith("status: running")
+        assert await ag.wait() == 0
+        assert ag.progress() == []
+        assert await ainput(lambda: "7") == "7"
+
+    asyncio.run(check())
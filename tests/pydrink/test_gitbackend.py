@@ -0,0 +1,48 @@
+from subprocess import check_output
+from pydrink.config import Config
+from pydrink.gitbackend import GitBackend, session, subcommand
+from pydrink.git import get_changed_files
+
+
+def test_batch_queries_fork_once(tracked_drinkrc_and_drinkdir):
+    c = Config(tracked_drinkrc_and_drinkdir)
+    gb = GitBackend(c.drinkdir)
+    head = check_output(["git", "-C", str(c.drinkdir), "rev-parse", "HEAD"], text=True)
+    for _ in range(5):
+        assert gb.rev_parse("HEAD") == head.strip()
+    info = gb.object_info("HEAD:bin/obj3")
+    assert info is not None and info[1:] == ("blob", 0)
+    assert gb.rev_parse("doesnotexist") is None
+    assert gb.forks == 1
+    gb.close()
+
+
+def test_session_memoizes_queries(tracked_drinkrc_and_drinkdir):
+    c = Config(tracked_drinkrc_and_drinkdir)
+    git = ["git", "-C", str(c.drinkdir)]
+    ls_files = git + ["ls-files", "-z"]
+    with session(c) as gb:
+        forks = gb.forks
+        files = gb.run(ls_files).stdout
+        assert gb.run(ls_files).stdout == files
+        assert gb.forks == forks + 1
+        gb.call(git + ["rm", "-q", "--cached", "bin/obj3"])
+        assert gb.run(ls_files).stdout != files
+        assert gb.forks == forks + 3
+    # Outside of a session, every query runs git
+    gb.run(ls_files)
+    assert gb.forks == forks + 4
+
+
+def test_session_sees_worktree_changes(tracked_drinkrc_and_drinkdir):
+    c = Config(tracked_drinkrc_and_drinkdir)
+    with session(c):
+        assert get_changed_files(c) == []
+        (c.drinkdir / "bin" / "obj3").write_text("changed")
+        assert get_changed_files(c) == ["bin/obj3"]
+
+
+def test_subcommand():
+    assert subcommand(["git", "-C", "dir", "-c", "a=b", "status", "-z"]) == "status"
+    assert subcommand(["git", "--no-pager", "diff"]) == "diff"
+    assert subcommand(["git"]) == ""
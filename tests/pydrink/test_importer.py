@@ -0,0 +1,114 @@
+from pathlib import Path
+from subprocess import check_output
+import os
+
+import pytest
+
+import pydrink.importer
+from pydrink.drink import createArgumentParser, handleArgs
+from pydrink.git import add_objects
+from pydrink.importer import (
+    clone_file,
+    expand_sources,
+    import_objects,
+    link_objects,
+)
+from pydrink.obj import InvalidDrinkObject
+from pydrink.untracked import IGNORE_FILENAME
+
+
+@pytest.fixture
+def config(config, fake_home):
+    c = config
+    nvim = fake_home / ".config" / "nvim"
+    (nvim / "lua" / "plugins").mkdir(parents=True)
+    (nvim / ".git").mkdir()
+    (nvim / ".git" / "HEAD").touch()
+    (nvim / "init.lua").write_text("require('plugins')\n")
+    for i in range(20):
+        (nvim / "lua" / "plugins" / f"p{i}.lua").write_text(f"-- {i}\n")
+    (nvim / "lua" / "link.lua").symlink_to(nvim / "init.lua")
+    (fake_home / ".zshrc").write_text("bindkey -v\n")
+    (fake_home / ".zshenv").write_text("export EDITOR=nvim\n")
+    return c
+
+
+def test_clone_file(tmp_path):
+    src = tmp_path / "src"
+    src.write_text("data")
+    os.chmod(src, 0o751)
+    clone_file(src, tmp_path / "dest")
+    assert (tmp_path / "dest").read_text() == "data"
+    assert (tmp_path / "dest").stat().st_mode & 0o777 == 0o751
+    with pytest.raises(FileExistsError):
+        clone_file(src, tmp_path / "dest")
+
+
+def test_expand_sources(config, fake_home):
+    (config.drinkdir / IGNORE_FILENAME).write_text("p1*.lua\n")
+    files = expand_sources(
+        config, "conf", [".config/nvim", str(fake_home / ".zsh*"), ".zshrc"]
+    )
+    assert Path(".config/nvim/init.lua") in files
+    assert Path(".config/nvim/lua/plugins/p2.lua") in files
+    assert Path(".config/nvim/lua/plugins/p12.lua") not in files
+    assert Path(".config/nvim/lua/link.lua") not in files
+    assert Path(".config/nvim/.git/HEAD") not in files
+    assert files[-2:] == [Path(".zshenv"), Path(".zshrc")]
+    assert len(files) == 1 + 9 + 2
+    with pytest.raises(InvalidDrinkObject):
+        expand_sources(config, "conf", ["/elsewhere/file"])
+    with pytest.raises(InvalidDrinkObject):
+        expand_sources(config, "conf", [".nothing*"])
+
+
+def test_bulk_import(config, fake_home, monkeypatch):
+    monkeypatch.setenv("GIT_EDITOR", "true")
+    c = config
+    git = ["git", "-C", str(c.drinkdir)]
+    head = check_output(git + ["rev-parse", "HEAD"], text=True)
+    objs = import_objects(c, expand_sources(c, "conf", [".config/nvim"]), "conf", "foo")
+    assert len(objs) == 21
+    assert (c.drinkdir / "conf/by-target/foo/dot.config/nvim/init.lua").is_file()
+    assert add_objects(c, objs) == 0
+    log = check_output(git + ["log", "--format=%s", f"{head.strip()}.."], text=True)
+    assert log == "Import 21 objects\n"
+    assert check_output(git + ["status", "--porcelain"], text=True) == ""
+    # Only objects of the current target are linked
+    assert len(link_objects(objs)) == 0
+    objs = import_objects(c, [Path(".zshrc")], "conf", "global")
+    plan = link_objects(objs)
+    assert len(plan.symlinks) == 1
+    assert (fake_home / ".zshrc").is_symlink()
+    assert (fake_home / ".zshrc").read_text() == "bindkey -v\n"
+
+
+def test_bulk_import_checks_first(config):
+    c = config
+    relpaths = [Path(".zshrc"), Path(".config")]
+    with pytest.raises(InvalidDrinkObject):
+        import_objects(c, relpaths, "conf", "global")
+    assert not (c.drinkdir / "conf" / "dot.zshrc").exists()
+
+
+def test_bulk_import_cleans_up(config, monkeypatch):
+    c = config
+
+    def fail(src: Path, dest: Path):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(pydrink.importer, "clone_file", fail)
+    with pytest.raises(OSError):
+        import_objects(c, [Path(".config/nvim/init.lua")], "conf", "foo")
+    assert not (c.drinkdir / "conf" / "by-target" / "foo").exists()
+    assert (c.drinkdir / "conf" / "by-target").is_dir()
+
+
+def test_import_stops_if_commit_fails(config, fake_home, monkeypatch):
+    monkeypatch.setenv("GIT_EDITOR", "false")
+    args = createArgumentParser().parse_args(
+        ["-i", "-k", "conf", "-t", "global", ".zshrc"]
+    )
+    assert handleArgs(config, args) != 0
+    assert not (fake_home / ".zshrc").is_symlink()
+    assert (config.drinkdir / "conf" / "dot.zshrc").is_file()
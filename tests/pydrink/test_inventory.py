@@ -0,0 +1,72 @@
+from pathlib import Path
+from pydrink.config import Config, BY_TARGET
+from pydrink.git import get_inventory
+from pydrink.inventory import Inventory
+from pydrink.obj import GLOBAL_TARGET, DrinkObject, InvalidDrinkObject
+import pytest
+
+
+def test_inventory_matches_single_objects(
+    fake_home, monkeypatch, tracked_drinkrc_and_drinkdir
+):
+    def mock_home():
+        return fake_home
+
+    monkeypatch.setattr(Path, "home", mock_home)
+    c = Config(tracked_drinkrc_and_drinkdir)
+    (fake_home / "bin" / "obj3").symlink_to(c.drinkdir / "bin" / "obj3")
+    inv = get_inventory(c)
+    assert len(inv) == 5
+    for o in inv:
+        single = DrinkObject(c, o.p)
+        assert (o.kind, o.target, o.relpath, o.state) == (
+            single.kind,
+            single.target,
+            single.relpath,
+            single.state,
+        )
+        assert o.get_linkpath() == single.get_linkpath()
+        assert len(o.blob) == 40
+
+
+def test_inventory_classification(drinkrc):
+    c = Config(drinkrc)
+    blob = "e69de29bb2d1d6434b8b29ae775ad8c2e48c5391"
+    output = "".join(
+        f"100644 {blob} 0\t{name}\0"
+        for name in [
+            "bin/objx",
+            f"conf/{BY_TARGET}/bapf/dot.config/nvim/init.lua",
+            "README.md",
+            f"bin/{BY_TARGET}/incomplete",
+        ]
+    )
+    objs = list(Inventory.from_ls_files(c, output))
+    assert [(o.kind, o.target, o.relpath) for o in objs] == [
+        ("bin", GLOBAL_TARGET, Path("objx")),
+        ("conf", "bapf", Path("dot.config/nvim/init.lua")),
+    ]
+    assert objs[1].get_linkpath() == Path.home() / ".config" / "nvim" / "init.lua"
+
+
+def test_inventory_rejects_symlinks(drinkrc):
+    c = Config(drinkrc)
+    blob = "e69de29bb2d1d6434b8b29ae775ad8c2e48c5391"
+    Inventory.from_ls_files(c, f"120000 {blob} 0\tbin/drink\0")
+    with pytest.raises(InvalidDrinkObject):
+        Inventory.from_ls_files(c, f"120000 {blob} 0\tbin/other\0")
+
+
+def test_inventory_scans_once(fake_home, monkeypatch, drinkrc):
+    def mock_home():
+        return fake_home
+
+    monkeypatch.setattr(Path, "home", mock_home)
+    c = Config(drinkrc)
+    inv = Inventory(c)
+    (fake_home / "bin" / "a").symlink_to(fake_home / "nowhere")
+    assert inv.is_symlink(fake_home / "bin" / "a")
+    (fake_home / "bin" / "b").symlink_to(fake_home / "nowhere")
+    # The directory was already read, so b is not known
+    assert not inv.is_symlink(fake_home / "bin" / "b")
+    assert not inv.is_symlink(fake_home / "notexisting" / "c")
@@ -0,0 +1,108 @@
+from pathlib import Path
+from subprocess import call
+import pydrink.drink
+from pydrink.config import Config, BY_TARGET
+from pydrink.drink import link_and_prune
+from pydrink.git import get_inventory
+from pydrink.ledger import Ledger
+
+
+def remove_object(c: Config, relpath: Path):
+    git = ["git", "-C", str(c.drinkdir)]
+    call(git + ["rm", "-q", str(relpath)])
+    call(git + ["commit", "-q", "-m", f"remove {relpath}"])
+
+
+def test_ledger_records_links(fake_home, monkeypatch, tracked_drinkrc_and_drinkdir):
+    def mock_home():
+        return fake_home
+
+    monkeypatch.setattr(Path, "home", mock_home)
+    c = Config(tracked_drinkrc_and_drinkdir)
+    assert link_and_prune(c) == 0
+    ledger = Ledger.load(c)
+    assert ledger.complete
+    assert ledger.links[fake_home / "bin" / "obj3"][0] == c.drinkdir / "bin" / "obj3"
+    assert fake_home / "bin" / "obj1" not in ledger.links
+
+
+def test_ledger_prunes_nested_links(
+    fake_home, monkeypatch, tracked_drinkrc_and_drinkdir
+):
+    def mock_home():
+        return fake_home
+
+    monkeypatch.setattr(Path, "home", mock_home)
+    c = Config(tracked_drinkrc_and_drinkdir)
+    nested = Path("conf") / BY_TARGET / "singold" / "dot.config" / "app" / "rc"
+    (c.drinkdir / nested).parent.mkdir(parents=True)
+    (c.drinkdir / nested).touch()
+    call(["git", "-C", str(c.drinkdir), "add", str(nested)])
+    call(["git", "-C", str(c.drinkdir), "commit", "-q", "-m", "nested"])
+    assert link_and_prune(c) == 0
+    link = fake_home / ".config" / "app" / "rc"
+    assert link.is_symlink()
+    remove_object(c, nested)
+    assert link_and_prune(c) == 0
+    assert not link.is_symlink()
+    assert link not in Ledger.load(c).links
+
+
+def test_ledger_only_touches_recorded_links(
+    fake_home, monkeypatch, tracked_drinkrc_and_drinkdir
+):
+    def mock_home():
+        return fake_home
+
+    monkeypatch.setattr(Path, "home", mock_home)
+    c = Config(tracked_drinkrc_and_drinkdir)
+    assert link_and_prune(c) == 0
+    foreign = fake_home / "bin" / "dangle1"
+    foreign.symlink_to(c.drinkdir / "bin" / "dangle1")
+    remove_object(c, Path("bin") / "obj3")
+    ledger = Ledger.load(c)
+    assert list(ledger.dangling(get_inventory(c))) == [fake_home / "bin" / "obj3"]
+    assert link_and_prune(c) == 0
+    assert foreign.is_symlink()
+    # A full scan finds it and rebuilds the ledger
+    assert link_and_prune(c, use_cache=False) == 0
+    assert not foreign.is_symlink()
+    assert Ledger.load(c).complete
+
+
+def test_link_only_changes(fake_home, monkeypatch, tracked_drinkrc_and_drinkdir):
+    monkeypatch.setattr(Path, "home", lambda: fake_home)
+    c = Config(tracked_drinkrc_and_drinkdir)
+    git = ["git", "-C", str(c.drinkdir)]
+    assert link_and_prune(c) == 0
+    (c.drinkdir / "bin" / "new").touch()
+    moved = Path("bin") / BY_TARGET / "singold" / "obj3"
+    (c.drinkdir / moved).parent.mkdir()
+    call(git + ["add", "bin/new"])
+    call(git + ["mv", "bin/obj3", str(moved)])
+    call(git + ["commit", "-q", "-m", "new and moved"])
+    inventories = []
+    get_inventory_orig = pydrink.drink.git.get_inventory
+    monkeypatch.setattr(
+        pydrink.drink.git,
+        "get_inventory",
+        lambda *a: inventories.append(a) or get_inventory_orig(*a),
+    )
+    assert link_and_prune(c) == 0
+    assert inventories == []
+    assert (fake_home / "bin" / "new").readlink() == c.drinkdir / "bin" / "new"
+    assert (fake_home / "bin" / "obj3").readlink() == c.drinkdir / moved
+    assert Ledger.load(c).links[fake_home / "bin" / "obj3"][0] == c.drinkdir / moved
+    # Staged changes are only seen by a full run
+    remove_object(c, Path("bin") / "new")
+    (c.drinkdir / "bin" / "staged").touch()
+    call(git + ["add", "bin/staged"])
+    assert link_and_prune(c) == 0
+    assert len(inventories) == 1
+    assert (fake_home / "bin" / "staged").is_symlink()
+    assert not (fake_home / "bin" / "new").is_symlink()
+    # The staged object was linked, but it is not part of the next changes
+    call(git + ["rm", "-qf", "bin/staged"])
+    assert link_and_prune(c) == 0
+    assert len(inventories) == 2
+    assert not (fake_home / "bin" / "staged").is_symlink()
@@ -0,0 +1,51 @@
+from pathlib import Path
+from subprocess import call
+import json
+
+import pydrink.manifest
+from pydrink.config import Config, BY_TARGET
+from pydrink.drink import show_manifest
+from pydrink.git import get_inventory
+from pydrink.manifest import render, render_targets
+
+
+def test_render(fake_home, monkeypatch, tracked_drinkrc_and_drinkdir):
+    monkeypatch.setattr(Path, "home", lambda: fake_home)
+    c = Config(tracked_drinkrc_and_drinkdir)
+    inv = get_inventory(c)
+    m = render(c, inv, "foo")
+    assert m["links"] == {
+        "bin/obj1": f"bin/{BY_TARGET}/foo/obj1",
+        "bin/objx": "bin/objx",
+        "bin/obj3": "bin/obj3",
+    }
+    assert m["conflicts"] == {}
+    # Targets without own objects still get the global ones
+    assert render(c, inv, "nowhere")["links"].keys() == {"bin/objx", "bin/obj3"}
+
+
+def test_render_targets_parallel(fake_home, monkeypatch, tracked_drinkrc_and_drinkdir):
+    monkeypatch.setattr(Path, "home", lambda: fake_home)
+    c = Config(tracked_drinkrc_and_drinkdir)
+    inv = get_inventory(c)
+    targets = c.managedTargets()
+    assert targets == {"foo", "bar", "bapf"}
+    serial = render_targets(c, inv, targets, workers=1)
+    monkeypatch.setattr(pydrink.manifest, "PARALLEL_MIN_TARGETS", 0)
+    assert render_targets(c, inv, targets, workers=2) == serial
+    assert serial["bapf"]["links"][".obj4"] == f"conf/{BY_TARGET}/bapf/.obj4"
+
+
+def test_manifest_conflicts(
+    fake_home, monkeypatch, capsys, tracked_drinkrc_and_drinkdir
+):
+    monkeypatch.setattr(Path, "home", lambda: fake_home)
+    c = Config(tracked_drinkrc_and_drinkdir)
+    clash = Path("bin") / BY_TARGET / "bar" / "objx"
+    (c.drinkdir / clash).touch()
+    call(["git", "-C", str(c.drinkdir), "add", str(clash)])
+    assert show_manifest(c) == 7
+    manifests = json.loads(capsys.readouterr().out)
+    assert manifests["bar"]["conflicts"] == {"bin/objx": ["bin/objx", str(clash)]}
+    assert manifests["foo"]["conflicts"] == {}
+    assert show_manifest(c, "foo") == 0
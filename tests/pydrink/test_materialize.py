@@ -0,0 +1,77 @@
+from io import BytesIO
+from pathlib import Path
+import os
+import tarfile
+
+import pytest
+
+from pydrink.config import BY_TARGET
+from pydrink.drink import materialize
+from pydrink.git import get_inventory
+from pydrink.materialize import link_dest, materialize_dir, materialize_tar
+
+
+@pytest.fixture
+def config(config):
+    (config.drinkdir / "bin" / "objx").write_text("objx\n")
+    return config
+
+
+def test_materialize_dir_symlinks(config, fake_home, tmp_path):
+    c = config
+    root = tmp_path / "root"
+    assert materialize_dir(c, get_inventory(c), "foo", root) == 3
+    link = root / "bin" / "obj1"
+    assert link.is_symlink()
+    assert link.resolve() == c.drinkdir / "bin" / BY_TARGET / "foo" / "obj1"
+    # $HOME is left alone
+    assert not (fake_home / "bin" / "obj1").exists()
+
+
+def test_materialize_dir_copies(config, tmp_path):
+    c = config
+    root = tmp_path / "root"
+    os.chmod(c.drinkdir / "bin" / "objx", 0o750)
+    assert materialize_dir(c, get_inventory(c), "bapf", root, copy=True) == 3
+    copied = root / "bin" / "objx"
+    assert not copied.is_symlink()
+    assert copied.read_text() == "objx\n"
+    assert copied.stat().st_mode & 0o777 == 0o750
+    assert (root / ".obj4").is_file()
+    with pytest.raises(FileExistsError):
+        materialize_dir(c, get_inventory(c), "bapf", root, copy=True)
+
+
+def test_materialize_tar(config):
+    c = config
+    inv = get_inventory(c)
+    out = BytesIO()
+    assert materialize_tar(c, inv, "foo", out, copy=True, compression="gz") == 3
+    out.seek(0)
+    with tarfile.open(fileobj=out) as tar:
+        assert tar.getnames() == ["bin", "bin/obj1", "bin/obj3", "bin/objx"]
+        f = tar.extractfile("bin/objx")
+        assert f is not None and f.read() == b"objx\n"
+        assert tar.getmember("bin/objx").uid == 0
+    out = BytesIO()
+    materialize_tar(c, inv, "foo", out)
+    out.seek(0)
+    with tarfile.open(fileobj=out) as tar:
+        member = tar.getmember("bin/obj1")
+        assert member.issym()
+        assert Path(member.linkname) == c.drinkdir / "bin" / BY_TARGET / "foo" / "obj1"
+
+
+def test_materialize_cli(config, tmp_path):
+    archive = tmp_path / "home.tar.xz"
+    assert materialize(config, str(archive), "bar", copy=True) == 0
+    with tarfile.open(archive) as tar:
+        assert "bin/obj2" in tar.getnames()
+    # Existing archives are not overwritten
+    assert materialize(config, str(archive), "bar") == 4
+
+
+def test_link_dest_relative_in_home(config, fake_home):
+    repopath = fake_home / "git" / "drink" / "conf" / "dot.config" / "rc"
+    dest = link_dest(config, Path(".config") / "rc", repopath)
+    assert dest == Path("..") / "git" / "drink" / "conf" / "dot.config" / "rc"
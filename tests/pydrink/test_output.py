@@ -0,0 +1,84 @@
+from io import StringIO
+from pathlib import Path
+import json
+
+import pytest
+
+from pydrink.config import BY_TARGET, Config
+from pydrink.drink import link_and_prune, show_config, show_objects
+from pydrink.output import FIELDS, Writer, home_record, repo_record
+
+
+@pytest.mark.parametrize(
+    "fmt,expected",
+    [
+        ("plain", "a\nb\n"),
+        ("ndjson", '{"n": 1}\n{"n": 2}\n'),
+        ("json", '[{"n": 1}\n,{"n": 2}\n]\n'),
+    ],
+)
+def test_writer(fmt, expected):
+    out = StringIO()
+    with Writer(fmt, out) as w:
+        w.write({"n": 1}, "a")
+        w.write({"n": 2}, "b")
+    assert out.getvalue() == expected
+
+
+def test_writer_empty_json():
+    out = StringIO()
+    with Writer("json", out):
+        pass
+    assert json.loads(out.getvalue()) == []
+
+
+def test_records(fake_home, monkeypatch, drinkrc_and_drinkdir):
+    monkeypatch.setattr(Path, "home", lambda: fake_home)
+    c = Config(drinkrc_and_drinkdir)
+    r = repo_record(c, f"bin/{BY_TARGET}/foo/obj1", "Changed")
+    assert tuple(r) == FIELDS
+    assert r["kind"] == "bin"
+    assert r["target"] == "foo"
+    assert r["relpath"] == "obj1"
+    assert r["link"] == str(fake_home / "bin" / "obj1")
+    assert repo_record(c, ".drinkrc", "Changed")["kind"] is None
+    r = home_record(c, str(fake_home / "bin" / "tool"), "Untracked")
+    assert (r["kind"], r["relpath"]) == ("bin", "tool")
+    assert home_record(c, str(fake_home / ".vimrc"), "Untracked")["kind"] == "conf"
+
+
+def test_show_objects(capsys, fake_home, monkeypatch, tracked_drinkrc_and_drinkdir):
+    monkeypatch.setattr(Path, "home", lambda: fake_home)
+    c = Config(tracked_drinkrc_and_drinkdir)
+    show_objects(c, "bin", fmt="ndjson")
+    records = [json.loads(x) for x in capsys.readouterr().out.splitlines()]
+    assert len(records) == 4
+    assert {r["kind"] for r in records} == {"bin"}
+    show_objects(c, target="foo")
+    assert capsys.readouterr().out == f"ManagedOther    bin/{BY_TARGET}/foo/obj1\n"
+
+
+def test_linked_global_object(
+    capsys, fake_home, monkeypatch, tracked_drinkrc_and_drinkdir
+):
+    monkeypatch.setattr(Path, "home", lambda: fake_home)
+    c = Config(tracked_drinkrc_and_drinkdir)
+
+    def state(relpath: str) -> str:
+        show_objects(c, "bin", target="global", fmt="ndjson")
+        records = [json.loads(x) for x in capsys.readouterr().out.splitlines()]
+        return next(r["state"] for r in records if r["relpath"] == relpath)
+
+    assert state("obj3") == "ManagedPending"
+    assert link_and_prune(c) == 0
+    assert state("obj3") == "ManagedHere"
+
+
+def test_show_config(capsys, fake_home, monkeypatch, drinkrc_and_drinkdir):
+    monkeypatch.setattr(Path, "home", lambda: fake_home)
+    c = Config(drinkrc_and_drinkdir)
+    assert show_config(c, "TARGET", "json") == 0
+    assert json.loads(capsys.readouterr().out) == [
+        {"variable": "TARGET", "value": "singold"}
+    ]
+    assert show_config(c, "NOTHING") == 6
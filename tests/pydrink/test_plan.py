@@ -0,0 +1,91 @@
+from pathlib import Path
+from pydrink.config import Config
+from pydrink.drink import link_all, show_plan
+from pydrink.plan import BACKUP_SUFFIX, LinkPlan, OpKind
+import pytest
+
+
+def test_plan_creates_directories_once(tmppath):
+    tmppath.mkdir()
+    plan = LinkPlan()
+    for name in ["a", "b", "c"]:
+        plan.symlink(tmppath / "x" / "y" / name, tmppath / name)
+    plan.symlink(tmppath / "x" / "z", tmppath / "z")
+    assert [op.kind for op in plan] == [OpKind.Mkdir] * 2 + [OpKind.Symlink] * 4
+    assert sorted(plan.mkdirs) == [tmppath / "x", tmppath / "x" / "y"]
+    plan.apply()
+    assert (tmppath / "x" / "y" / "b").readlink() == tmppath / "b"
+    assert (tmppath / "x" / "z").is_symlink()
+
+
+def test_plan_rollback(tmppath):
+    tmppath.mkdir()
+    (tmppath / "replaced").write_text("same")
+    (tmppath / "x").mkdir()
+    (tmppath / "x" / "conflict").touch()
+    plan = LinkPlan()
+    plan.unlink(tmppath / "replaced")
+    plan.symlink(tmppath / "replaced", tmppath / "a")
+    plan.symlink(tmppath / "new" / "b", tmppath / "b")
+    plan.symlink(tmppath / "x" / "conflict", tmppath / "c")
+    with pytest.raises(FileExistsError):
+        plan.apply()
+    # Everything is back to how it was before
+    assert (tmppath / "replaced").read_text() == "same"
+    assert not (tmppath / "replaced").is_symlink()
+    assert not (tmppath / "new").exists()
+    assert sorted(p.name for p in tmppath.iterdir()) == ["replaced", "x"]
+
+
+def test_plan_removes_backups(tmppath):
+    tmppath.mkdir()
+    (tmppath / "replaced").write_text("same")
+    plan = LinkPlan()
+    plan.unlink(tmppath / "replaced")
+    plan.symlink(tmppath / "replaced", tmppath / "a")
+    plan.apply()
+    assert (tmppath / "replaced").is_symlink()
+    assert not (tmppath / ("replaced" + BACKUP_SUFFIX)).exists()
+
+
+def test_plan_keeps_existing_backups(tmppath):
+    tmppath.mkdir()
+    (tmppath / "replaced").write_text("same")
+    old_backup = tmppath / ("replaced" + BACKUP_SUFFIX)
+    old_backup.write_text("old")
+    plan = LinkPlan()
+    plan.unlink(tmppath / "replaced")
+    plan.symlink(tmppath / "replaced", tmppath / "a")
+    plan.symlink(tmppath / "replaced", tmppath / "b")
+    with pytest.raises(FileExistsError):
+        plan.apply()
+    assert (tmppath / "replaced").read_text() == "same"
+    assert old_backup.read_text() == "old"
+    plan = LinkPlan()
+    plan.unlink(tmppath / "replaced")
+    plan.symlink(tmppath / "replaced", tmppath / "a")
+    plan.apply()
+    assert (tmppath / "replaced").is_symlink()
+    assert sorted(p.name for p in tmppath.iterdir()) == ["replaced", old_backup.name]
+
+
+def test_link_all_refuses_files_in_the_way(
+    fake_home, monkeypatch, capsys, tracked_drinkrc_and_drinkdir
+):
+    def mock_home():
+        return fake_home
+
+    monkeypatch.setattr(Path, "home", mock_home)
+    c = Config(tracked_drinkrc_and_drinkdir)
+    (fake_home / "bin" / "objx").touch()
+    assert show_plan(c) == 0
+    out = capsys.readouterr().out.split("\n")
+    assert f"symlink {fake_home}/bin/obj3 -> {c.drinkdir}/bin/obj3" in out
+    assert f"symlink {fake_home}/bin/objx -> {c.drinkdir}/bin/objx" not in out
+    # Only the object in the way of the file is left out
+    assert link_all(c) == 4
+    assert (fake_home / "bin" / "obj3").is_symlink()
+    assert not (fake_home / "bin" / "objx").is_symlink()
+    (fake_home / "bin" / "objx").unlink()
+    assert link_all(c) == 0
+    assert (fake_home / "bin" / "objx").is_symlink()
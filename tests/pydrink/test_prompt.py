@@ -0,0 +1,78 @@
+from pathlib import Path
+from subprocess import call, check_output, run
+import sys
+from pydrink.config import Config, BY_TARGET, CONFIG_FILENAME
+from pydrink.gitindex import blob_id, changed_files, read_index
+from pydrink.prompt import format_prompt_info, prompt_info
+import pytest
+
+
+def git_lines(c: Config, *args: str) -> list[str]:
+    out = check_output(["git", "-C", str(c.drinkdir), *args], text=True)
+    return [x for x in out.split("\n") if x]
+
+
+@pytest.mark.parametrize("version", ["2", "3", "4"])
+def test_read_index(tracked_drinkrc_and_drinkdir, version):
+    c = Config(tracked_drinkrc_and_drinkdir)
+    call(["git", "-C", str(c.drinkdir), "update-index", "--index-version", version])
+    entries = read_index(c.drinkdir / ".git" / "index")
+    assert [e.name for e in entries] == git_lines(c, "ls-files")
+    for e in entries:
+        assert blob_id(c.drinkdir / e.name) == e.oid
+
+
+def test_changed_files(tracked_drinkrc_and_drinkdir):
+    c = Config(tracked_drinkrc_and_drinkdir)
+    index = c.drinkdir / ".git" / "index"
+    mtime = index.stat().st_mtime_ns // 1_000_000_000
+    assert changed_files(c.drinkdir, read_index(index), mtime) == []
+    with open(c.drinkdir / "bin" / BY_TARGET / "bar" / "obj2", "a") as f:
+        f.write("newly added line\n")
+    (c.drinkdir / "bin" / "obj3").unlink()
+    changed = changed_files(c.drinkdir, read_index(index), mtime)
+    assert changed == git_lines(c, "diff-files", "--name-only")
+    assert len(changed) == 2
+
+
+def test_prompt_info(monkeypatch, fake_home, tracked_drinkrc_and_drinkdir):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(fake_home / ".cache"))
+    c = Config(tracked_drinkrc_and_drinkdir)
+    head = git_lines(c, "rev-parse", "HEAD")[0]
+    assert prompt_info(c) == (head, "")
+    assert prompt_info(c, head) == (head, "")
+    assert prompt_info(c, "0" * 40) == (head, "! ")
+    # The second call is answered from the cached index
+    (c.drinkdir / "bin" / "obj3").write_text("changed")
+    assert prompt_info(c, head) == (head, " 1 ")
+    assert prompt_info(c, "0" * 40) == (head, " 1! ")
+    assert (Path(fake_home) / ".cache" / "pydrink").is_dir()
+
+
+def test_prompt_info_skips_drink(tmppath, tracked_drinkrc_and_drinkdir):
+    """The prompt must not load the CLI, even without a daemon"""
+    xdg = tmppath / "xdg"
+    xdg.mkdir(parents=True)
+    (xdg / CONFIG_FILENAME).write_text(tracked_drinkrc_and_drinkdir.read_text())
+    c = Config(tracked_drinkrc_and_drinkdir)
+    head = git_lines(c, "rev-parse", "HEAD")[0]
+    code = (
+        "import sys; from pydrink.entry import main;"
+        "sys.argv = ['drink', '--prompt-info', 'other']; ret = main();"
+        "print('pydrink.drink' in sys.modules or 'argparse' in sys.modules);"
+        "sys.exit(ret)"
+    )
+    out = run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        env={
+            "HOME": str(tmppath),
+            "XDG_CONFIG_HOME": str(xdg),
+            "XDG_RUNTIME_DIR": str(tmppath),
+            "PYTHONPATH": str(Path(__file__).parents[2] / "src"),
+        },
+    )
+    assert out.returncode == 0
+    info = format_prompt_info(head, 0, "other")
+    assert out.stdout.split("\n") == [head, info, "False", ""]
@@ -0,0 +1,70 @@
+import threading
+from pydrink import log, timing
+from pydrink.timing import phase
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_phases_are_exclusive(monkeypatch, capsys):
+    clock = FakeClock()
+    monkeypatch.setattr(timing, "ENABLED", True)
+    monkeypatch.setattr(timing, "clock", clock)
+    timing.reset()
+    with phase("outer"):
+        clock.now += 2
+        with phase("inner"):
+            clock.now += 5
+        clock.now += 1
+    assert timing._totals == {"outer": 3, "inner": 5}
+    timing.report(10)
+    lines = capsys.readouterr().err.split("\n")
+    assert lines[0].startswith("outer")
+    assert lines[-3].split() == ["other", "2000.0", "ms"]
+    assert lines[-2].startswith("total")
+    timing.reset()
+
+
+def test_phases_per_thread(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(timing, "ENABLED", True)
+    monkeypatch.setattr(timing, "clock", clock)
+    timing.reset()
+
+    def worker():
+        with phase("worker"):
+            clock.now += 1
+
+    with phase("main"):
+        t = threading.Thread(target=worker)
+        t.start()
+        t.join()
+    # The worker's phase is not nested in the main thread's
+    assert timing._totals == {"main": 1, "worker": 1}
+    assert timing._stack() == []
+    timing.reset()
+
+
+def test_phases_disabled():
+    timing.reset()
+    with phase("nothing"):
+        pass
+    assert timing._totals == {}
+
+
+def test_debug_is_lazy(monkeypatch, capsys):
+    class Explosive:
+        def __str__(self):
+            raise AssertionError("formatted although debug is off")
+
+    log.debug("value: %s", Explosive())
+    monkeypatch.setattr(log, "DEBUG", True)
+    log.debug("value: %s", 42)
+    out = capsys.readouterr().out
+    assert out.startswith("test_timing.py:")
+    assert "test_debug_is_lazy(): value: 42" in out
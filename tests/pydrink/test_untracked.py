@@ -0,0 +1,64 @@
+from pathlib import Path
+
+import pytest
+
+from pydrink.config import Config, KINDS
+from pydrink.untracked import IGNORE_FILENAME, IgnoreRules, untracked_files
+
+
+@pytest.fixture
+def config(home, drinkrc_and_drinkdir):
+    c = Config(drinkrc_and_drinkdir)
+    (home / ".zshrc").touch()
+    (home / "notes.txt").touch()
+    (home / ".config" / "app" / "deep").mkdir(parents=True)
+    (home / ".config" / "app" / "rc").touch()
+    (home / ".config" / "app" / "deep" / "state").touch()
+    (home / ".cache" / "junk").mkdir(parents=True)
+    (home / "bin" / "tool").touch()
+    (home / "bin" / "linked").symlink_to(c.drinkdir / "bin" / "obj3")
+    (home / ".zfunc" / "_comp").touch()
+    return c
+
+
+def found(c: Config, **kwargs) -> set[str]:
+    home = Path.home()
+    return {str(Path(p).relative_to(home)) for p in untracked_files(c, KINDS, **kwargs)}
+
+
+def test_untracked_top_level(config):
+    assert found(config) == {".zshrc", ".config", ".cache", "bin/tool", ".zfunc/_comp"}
+    assert found(config, depth=2) >= {".config/app", ".cache/junk"}
+
+
+def test_untracked_depth(config):
+    assert found(config, depth=3) == {
+        ".zshrc",
+        ".config/app/rc",
+        ".config/app/deep",
+        "bin/tool",
+        ".zfunc/_comp",
+    }
+
+
+def test_untracked_ignore(config):
+    (config.drinkdir / IGNORE_FILENAME).write_text(
+        "# caches\n.cache/\ndeep/\n.z*\n!.zfunc/_comp\n"
+    )
+    assert found(config, depth=4) == {".config/app/rc", "bin/tool", ".zfunc/_comp"}
+
+
+def test_untracked_limit(config):
+    assert len(found(config, depth=3, limit=2)) == 2
+
+
+def test_ignore_rules():
+    rules = IgnoreRules(["*.bak", "/bin/tmp*", "**/cache/", "!keep.bak", "[!a]x"])
+    assert rules.ignored("bin/old.bak", False)
+    assert not rules.ignored("bin/keep.bak", False)
+    assert rules.ignored("bin/tmp1", False)
+    assert not rules.ignored("sub/bin/tmp1", False)
+    assert rules.ignored(".local/cache", True)
+    assert not rules.ignored(".local/cache", False)
+    assert rules.ignored("bx", False)
+    assert not rules.ignored("ax", False)